@@ -3,7 +3,25 @@ import os
 
 from PyQt6 import QtWidgets, QtCore
 
-from threads.file_deduplication_thread import FileScanThread, FileDeduplicateThread
+from core.archive_members import is_virtual_path
+from core.common import format_file_size
+from core.config_manager import config_manager
+from core.hash_algorithms import (DEFAULT_FILTER_ALGORITHM, DEFAULT_HASH_ALGORITHM, get_filter_algorithms,
+                                  get_strong_algorithms)
+from core.perceptual_hash import DEFAULT_SIMILARITY_THRESHOLD
+from app.pages.file_deduplication_models import CheckBoxDelegate, DuplicateFileTableModel, DuplicateGroupListModel
+from core.file_links import reflink_supported
+from core.keep_policy import KEEP_PRESETS
+from core.fingerprint_manifest import MANIFEST_FILE_FILTER, read_manifest_header
+from core.quarantine import Quarantine
+from core.reference_library import ReferenceLibrary
+from threads.file_deduplication_thread import (DEDUP_ACTION_DELETE, DEDUP_ACTION_HARDLINK, DEDUP_ACTION_NAMES,
+                                               DEDUP_ACTION_REFLINK, FileDeduplicateThread, FileScanThread,
+                                               GroupVerifyThread, KeepPolicyThread, ManifestExportThread,
+                                               QuarantinePurgeThread, QuarantineRestoreThread,
+                                               ReferenceLibraryThread, SCAN_MODE_EXACT,
+                                               SCAN_MODE_MANIFEST, SCAN_MODE_PAYLOAD, SCAN_MODE_QUICK,
+                                               SCAN_MODE_REFERENCE, SCAN_MODE_SIMILAR)
 
 logger = logging.getLogger(__name__)
 
@@ -18,44 +36,410 @@ class FileDeduplicationManager(QtWidgets.QWidget):
         self.folder_page = folder_page
         self.scan_thread = None
         self.deduplicate_thread = None
-        self.duplicate_groups = []
+        self.reference_thread = None
+        self.export_thread = None
+        self.keep_policy_thread = None
+        self.verify_thread = None
+        self.restore_thread = None
+        self.purge_thread = None
+        self.group_model = DuplicateGroupListModel(self)
+        self.file_model = DuplicateFileTableModel(self)
+        self.result_scan_mode = SCAN_MODE_EXACT
         self.current_group_index = -1
-        self.selected_files = set()
         
         self._setup_ui()
         self._connect_signals()
     
+    @property
+    def duplicate_groups(self):
+        return self.group_model.groups
+    
+    @property
+    def selected_files(self):
+        return self.file_model.selected_paths
+    
     def _setup_ui(self):
-        self.parent.duplicateItemsListWidget.clear()
+        self.parent.duplicateGroupsListView.setModel(self.group_model)
+        self.parent.duplicateGroupsListView.setUniformItemSizes(True)
+        self.parent.duplicateGroupsListView.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+        self.parent.duplicateGroupsListView.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
         
-        self.parent.duplicateFilesTableWidget.setRowCount(0)
-        self.parent.duplicateFilesTableWidget.setColumnCount(3)
-        headers = ["选择", "文件名", "文件路径"]
-        self.parent.duplicateFilesTableWidget.setHorizontalHeaderLabels(headers)
+        self.parent.duplicateFilesTableView.setModel(self.file_model)
+        self.parent.duplicateFilesTableView.setItemDelegateForColumn(DuplicateFileTableModel.COLUMN_CHECK,
+                                                                     CheckBoxDelegate(self.parent.duplicateFilesTableView))
+        self.parent.duplicateFilesTableView.verticalHeader().setVisible(False)
         
-        header = self.parent.duplicateFilesTableWidget.horizontalHeader()
+        header = self.parent.duplicateFilesTableView.horizontalHeader()
         
         header.setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.Fixed)
         header.setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeMode.Stretch)
         
-        self.parent.duplicateFilesTableWidget.setColumnWidth(0, 65)
-        self.parent.duplicateFilesTableWidget.setColumnWidth(1, 250)
+        self.parent.duplicateFilesTableView.setColumnWidth(0, 65)
+        self.parent.duplicateFilesTableView.setColumnWidth(1, 250)
         
-        self.parent.duplicateFilesTableWidget.setAlternatingRowColors(True)
-        self.parent.duplicateFilesTableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
-        self.parent.duplicateFilesTableWidget.setSortingEnabled(True)
+        self.parent.duplicateFilesTableView.setAlternatingRowColors(True)
+        self.parent.duplicateFilesTableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.parent.duplicateFilesTableView.setSortingEnabled(True)
         
         self.parent.contrastProgressBar.setValue(0)
+        
+        self._setup_algorithm_selectors()
+        self._setup_link_button()
+    
+    def _setup_link_button(self):
+        self.link_replace_button = QtWidgets.QToolButton(self.parent)
+        self.link_replace_button.setText("链接替换")
+        self.link_replace_button.setToolTip("把选中的重复文件替换为指向同组保留文件的链接，立即释放空间且所有路径仍然有效")
+        self.link_replace_button.setMinimumSize(self.parent.btnMoveToRecycleBin.minimumSize())
+        self.link_replace_button.setStyleSheet(self.parent.btnMoveToRecycleBin.styleSheet())
+        self.link_replace_button.setPopupMode(QtWidgets.QToolButton.ToolButtonPopupMode.InstantPopup)
+        
+        link_menu = QtWidgets.QMenu(self.link_replace_button)
+        hardlink_action = link_menu.addAction("替换为硬链接")
+        hardlink_action.triggered.connect(lambda: self.replace_with_links(DEDUP_ACTION_HARDLINK))
+        reflink_action = link_menu.addAction("替换为reflink（写时复制）")
+        reflink_action.setEnabled(reflink_supported())
+        reflink_action.triggered.connect(lambda: self.replace_with_links(DEDUP_ACTION_REFLINK))
+        self.link_replace_button.setMenu(link_menu)
+        
+        actions_layout = self.parent.deduplicationActionsLayout
+        actions_layout.insertWidget(actions_layout.indexOf(self.parent.btnMoveToRecycleBin), self.link_replace_button)
+        
+        self.undo_trash_button = QtWidgets.QToolButton(self.parent)
+        self.undo_trash_button.setText("撤销删除")
+        self.undo_trash_button.setMinimumSize(self.parent.btnMoveToRecycleBin.minimumSize())
+        self.undo_trash_button.setStyleSheet(self.parent.btnMoveToRecycleBin.styleSheet())
+        self.undo_trash_button.clicked.connect(self.undo_last_trash)
+        self.undo_trash_button.setPopupMode(QtWidgets.QToolButton.ToolButtonPopupMode.MenuButtonPopup)
+        undo_menu = QtWidgets.QMenu(self.undo_trash_button)
+        undo_menu.addAction("永久删除已移除的文件").triggered.connect(self.purge_quarantine)
+        self.undo_trash_button.setMenu(undo_menu)
+        actions_layout.insertWidget(actions_layout.indexOf(self.parent.btnMoveToRecycleBin) + 1, self.undo_trash_button)
+        self._update_undo_trash_button()
+        
+        self.keep_policy_button = QtWidgets.QToolButton(self.parent)
+        self.keep_policy_button.setText("按规则选择")
+        self.keep_policy_button.setToolTip("按规则为每组保留一个文件，选中其余所有副本")
+        self.keep_policy_button.setMinimumSize(self.parent.btnRandomSelect.minimumSize())
+        self.keep_policy_button.setStyleSheet(self.parent.btnRandomSelect.styleSheet())
+        self.keep_policy_button.setPopupMode(QtWidgets.QToolButton.ToolButtonPopupMode.InstantPopup)
+        keep_menu = QtWidgets.QMenu(self.keep_policy_button)
+        for preset in KEEP_PRESETS:
+            keep_menu.addAction(preset.label).triggered.connect(
+                lambda checked=False, rules=preset.rules: self.select_by_policy(rules))
+        self.keep_policy_button.setMenu(keep_menu)
+        actions_layout.insertWidget(actions_layout.indexOf(self.parent.btnRandomSelect) + 1, self.keep_policy_button)
+        
+        self.verify_groups_button = QtWidgets.QToolButton(self.parent)
+        self.verify_groups_button.setText("验证所选组")
+        self.verify_groups_button.setToolTip("对左侧选中的快速指纹结果计算完整哈希，只保留内容确实相同的文件")
+        self.verify_groups_button.setMinimumSize(self.parent.btnRandomSelect.minimumSize())
+        self.verify_groups_button.setStyleSheet(self.parent.btnRandomSelect.styleSheet())
+        self.verify_groups_button.setEnabled(False)
+        self.verify_groups_button.clicked.connect(self.verify_selected_groups)
+        actions_layout.insertWidget(actions_layout.indexOf(self.keep_policy_button) + 1, self.verify_groups_button)
+    
+    def _update_undo_trash_button(self):
+        batches = Quarantine().list_batches()
+        self.undo_trash_button.setEnabled(bool(batches))
+        if batches:
+            self.undo_trash_button.setToolTip(f"把上次移到回收站的 {batches[0].file_count} 个文件恢复到原位置")
+        else:
+            self.undo_trash_button.setToolTip("没有可以撤销的删除")
+        return batches
+    
+    def undo_last_trash(self):
+        batches = self._update_undo_trash_button()
+        if not batches:
+            return
+        
+        reply = QtWidgets.QMessageBox.question(self.parent, "撤销删除",
+                                             f"确定要把上次移到回收站的 {batches[0].file_count} 个文件恢复到原位置吗？",
+                                             QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+        if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+        
+        self.undo_trash_button.setEnabled(False)
+        self.restore_thread = QuarantineRestoreThread(batches[0].batch_id)
+        self.restore_thread.progress_updated.connect(self.on_deduplicate_progress)
+        self.restore_thread.restore_completed.connect(self.on_restore_completed)
+        self.restore_thread.error_occurred.connect(self.on_deduplicate_error)
+        self.restore_thread.finished.connect(self._update_undo_trash_button)
+        self.restore_thread.start()
+    
+    def purge_quarantine(self):
+        batches = self._update_undo_trash_button()
+        if not batches:
+            return
+        
+        file_count = sum(batch.file_count for batch in batches)
+        reply = QtWidgets.QMessageBox.question(self.parent, "永久删除",
+                                             f"确定要永久删除之前移除的 {file_count} 个文件吗？删除后将无法撤销。",
+                                             QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+        if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+        
+        self.undo_trash_button.setEnabled(False)
+        self.purge_thread = QuarantinePurgeThread()
+        self.purge_thread.progress_updated.connect(self.on_deduplicate_progress)
+        self.purge_thread.purge_completed.connect(self.on_purge_completed)
+        self.purge_thread.error_occurred.connect(self.on_deduplicate_error)
+        self.purge_thread.finished.connect(self._update_undo_trash_button)
+        self.purge_thread.start()
+    
+    def on_purge_completed(self, purged_count, failed_paths):
+        message = f"已永久删除 {purged_count} 个文件"
+        if failed_paths:
+            message += f"，{len(failed_paths)} 个文件删除失败"
+        QtWidgets.QMessageBox.information(self.parent, "永久删除", message)
+    
+    def on_restore_completed(self, restored_paths, failed_paths):
+        message = f"已恢复 {len(restored_paths)} 个文件"
+        if failed_paths:
+            message += f"，{len(failed_paths)} 个文件因原位置已被占用或回收站中已不存在而未能恢复"
+        QtWidgets.QMessageBox.information(self.parent, "撤销删除", message)
+        
+        if restored_paths and self.scan_thread is not None:
+            self.start_scan()
+    
+    def _setup_algorithm_selectors(self):
+        header_layout = self.parent.deduplicationHeaderLayout
+        
+        self.scan_mode_combo = QtWidgets.QComboBox(self.parent.deduplicationHeaderFrame)
+        self.scan_mode_combo.setToolTip("查重模式：精确重复比较文件内容，相似图片比较感知哈希，对照参考库只检查哪些文件已在参考库中")
+        self.scan_mode_combo.addItem("精确重复", SCAN_MODE_EXACT)
+        self.scan_mode_combo.addItem("快速指纹（抽样，未验证）", SCAN_MODE_QUICK)
+        self.scan_mode_combo.addItem("图片内容（忽略元数据）", SCAN_MODE_PAYLOAD)
+        self.scan_mode_combo.addItem("相似图片", SCAN_MODE_SIMILAR)
+        self.scan_mode_combo.addItem("对照参考库", SCAN_MODE_REFERENCE)
+        self.scan_mode_combo.addItem("对照指纹清单", SCAN_MODE_MANIFEST)
+        self._select_combo_data(self.scan_mode_combo, config_manager.get_setting("dedup_scan_mode", SCAN_MODE_EXACT))
+        
+        self.filter_algorithm_combo = QtWidgets.QComboBox(self.parent.deduplicationHeaderFrame)
+        self.filter_algorithm_combo.setToolTip("预筛选算法：用于头/中/尾部分哈希的快速算法")
+        for algorithm in get_filter_algorithms():
+            self.filter_algorithm_combo.addItem(algorithm.label, algorithm.name)
+        self._select_combo_data(self.filter_algorithm_combo,
+                                config_manager.get_setting("dedup_filter_algorithm", DEFAULT_FILTER_ALGORITHM))
+        
+        self.hash_algorithm_combo = QtWidgets.QComboBox(self.parent.deduplicationHeaderFrame)
+        self.hash_algorithm_combo.setToolTip("校验算法：用于最终确认重复文件的强哈希算法")
+        for algorithm in get_strong_algorithms():
+            self.hash_algorithm_combo.addItem(algorithm.label, algorithm.name)
+        self._select_combo_data(self.hash_algorithm_combo,
+                                config_manager.get_setting("dedup_hash_algorithm", DEFAULT_HASH_ALGORITHM))
+        
+        self.incremental_scan_check = QtWidgets.QCheckBox("增量扫描", self.parent.deduplicationHeaderFrame)
+        self.incremental_scan_check.setToolTip("只重新列出修改过的目录，未变化的目录沿用上次扫描的快照")
+        self.incremental_scan_check.setChecked(config_manager.get_setting("dedup_incremental_scan", True))
+        
+        self.spill_to_disk_check = QtWidgets.QCheckBox("低内存模式", self.parent.deduplicationHeaderFrame)
+        self.spill_to_disk_check.setToolTip("把文件列表和哈希分段排序后写入临时文件再归并，适合内存放不下的超大文件库；"
+                                            "仅用于精确重复扫描，不使用增量快照")
+        self.spill_to_disk_check.setChecked(config_manager.get_setting("dedup_spill_to_disk", False))
+        
+        self.scan_archives_check = QtWidgets.QCheckBox("包含压缩包内文件", self.parent.deduplicationHeaderFrame)
+        self.scan_archives_check.setToolTip("把 zip/tar 压缩包里的文件也拿来比较，不解压到磁盘；压缩包内的文件只作为保留项，"
+                                            "仅用于精确重复扫描，低内存模式下不可用")
+        self.scan_archives_check.setChecked(config_manager.get_setting("dedup_scan_archives", False))
+        
+        self.reference_library_button = QtWidgets.QToolButton(self.parent.deduplicationHeaderFrame)
+        self.reference_library_button.setText("参考库")
+        self.reference_library_button.setPopupMode(QtWidgets.QToolButton.ToolButtonPopupMode.InstantPopup)
+        reference_menu = QtWidgets.QMenu(self.reference_library_button)
+        reference_menu.addAction("添加参考库文件夹...").triggered.connect(self.add_reference_folder)
+        reference_menu.addAction("更新参考库索引").triggered.connect(self.rebuild_reference_library)
+        reference_menu.addAction("清空参考库").triggered.connect(self.clear_reference_library)
+        self.reference_library_button.setMenu(reference_menu)
+        self._update_reference_library_tooltip()
+        
+        self.manifest_button = QtWidgets.QToolButton(self.parent.deduplicationHeaderFrame)
+        self.manifest_button.setText("指纹清单")
+        self.manifest_button.setPopupMode(QtWidgets.QToolButton.ToolButtonPopupMode.InstantPopup)
+        manifest_menu = QtWidgets.QMenu(self.manifest_button)
+        manifest_menu.addAction("导出文件夹清单...").triggered.connect(self.export_manifest)
+        manifest_menu.addAction("导入清单...").triggered.connect(self.import_manifests)
+        manifest_menu.addAction("清除已导入清单").triggered.connect(self.clear_manifests)
+        self.manifest_button.setMenu(manifest_menu)
+        self._update_manifest_tooltip()
+        
+        button_index = header_layout.indexOf(self.parent.btnStartDeduplication)
+        header_layout.insertWidget(button_index, self.manifest_button)
+        header_layout.insertWidget(button_index, self.reference_library_button)
+        header_layout.insertWidget(button_index, self.scan_archives_check)
+        header_layout.insertWidget(button_index, self.spill_to_disk_check)
+        header_layout.insertWidget(button_index, self.incremental_scan_check)
+        header_layout.insertWidget(button_index, self.hash_algorithm_combo)
+        header_layout.insertWidget(button_index, self.filter_algorithm_combo)
+        header_layout.insertWidget(button_index, self.scan_mode_combo)
+        
+        self.scan_mode_combo.currentIndexChanged.connect(self._on_scan_mode_changed)
+        self._update_algorithm_combos()
+        self.filter_algorithm_combo.currentIndexChanged.connect(
+            lambda: config_manager.update_setting("dedup_filter_algorithm", self.filter_algorithm_combo.currentData()))
+        self.hash_algorithm_combo.currentIndexChanged.connect(
+            lambda: config_manager.update_setting("dedup_hash_algorithm", self.hash_algorithm_combo.currentData()))
+        self.incremental_scan_check.toggled.connect(
+            lambda checked: config_manager.update_setting("dedup_incremental_scan", checked))
+        self.spill_to_disk_check.toggled.connect(
+            lambda checked: config_manager.update_setting("dedup_spill_to_disk", checked))
+        self.scan_archives_check.toggled.connect(
+            lambda checked: config_manager.update_setting("dedup_scan_archives", checked))
+    
+    def _update_reference_library_tooltip(self):
+        reference_library = ReferenceLibrary()
+        try:
+            library_roots = reference_library.get_roots()
+        finally:
+            reference_library.close()
+        
+        if library_roots:
+            lines = [f"{root} ({count} 个文件)" for root, count in library_roots.items()]
+            self.reference_library_button.setToolTip("参考库：\n" + "\n".join(lines))
+        else:
+            self.reference_library_button.setToolTip("尚未设置参考库")
+        return library_roots
+    
+    def add_reference_folder(self):
+        default_folder = self.folder_page.get_target_folder() if self.folder_page else None
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self.parent, "选择参考库文件夹", default_folder or "")
+        if folder:
+            self._start_reference_build([os.path.normpath(folder)])
+    
+    def rebuild_reference_library(self):
+        library_roots = self._update_reference_library_tooltip()
+        if not library_roots:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "尚未设置参考库")
+            return
+        self._start_reference_build(list(library_roots))
+    
+    def clear_reference_library(self):
+        reply = QtWidgets.QMessageBox.question(self.parent, "确认清空", "确定要清空参考库索引吗？参考库中的文件不会被删除。",
+                                             QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+        if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+        
+        reference_library = ReferenceLibrary()
+        try:
+            for root in reference_library.get_roots():
+                reference_library.remove_root(root)
+        finally:
+            reference_library.close()
+        self._update_reference_library_tooltip()
+    
+    def _start_reference_build(self, folders):
+        if self.reference_thread and self.reference_thread.isRunning():
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "参考库索引正在建立中")
+            return
+        
+        self.reference_library_button.setEnabled(False)
+        self.reference_thread = ReferenceLibraryThread(folders)
+        self.reference_thread.progress_updated.connect(self.on_scan_progress)
+        self.reference_thread.build_completed.connect(self.on_reference_build_completed)
+        self.reference_thread.error_occurred.connect(self.on_reference_build_error)
+        self.reference_thread.finished.connect(lambda: self.reference_library_button.setEnabled(True))
+        self.reference_thread.start()
+        
+        logger.info(f"开始建立参考库索引: {folders}")
+    
+    def on_reference_build_completed(self, file_count):
+        self._update_reference_library_tooltip()
+        QtWidgets.QMessageBox.information(self.parent, "参考库", f"参考库索引已更新，共 {file_count} 个文件")
+    
+    def on_reference_build_error(self, error_message):
+        QtWidgets.QMessageBox.critical(self.parent, "参考库错误", error_message)
+        logger.error(f"参考库错误: {error_message}")
+    
+    def _update_manifest_tooltip(self):
+        manifest_paths = config_manager.get_setting("dedup_manifest_paths", [])
+        if manifest_paths:
+            self.manifest_button.setToolTip("已导入的指纹清单:\n" + "\n".join(manifest_paths))
+        else:
+            self.manifest_button.setToolTip("导出文件夹的指纹清单，或导入其他设备上的清单进行离线对照")
+        return manifest_paths
+    
+    def export_manifest(self):
+        if self.export_thread and self.export_thread.isRunning():
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "指纹清单正在导出中")
+            return
+        
+        default_folder = self.folder_page.get_target_folder() if self.folder_page else None
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self.parent, "选择要导出清单的文件夹", default_folder or "")
+        if not folder:
+            return
+        folder = os.path.normpath(folder)
+        default_name = os.path.join(folder, f"{os.path.basename(folder) or 'fingerprints'}.ndjson.gz")
+        manifest_path, _ = QtWidgets.QFileDialog.getSaveFileName(self.parent, "保存指纹清单", default_name,
+                                                                 MANIFEST_FILE_FILTER)
+        if not manifest_path:
+            return
+        
+        self.manifest_button.setEnabled(False)
+        self.export_thread = ManifestExportThread(folder, manifest_path,
+                                                  hash_algorithm=self.hash_algorithm_combo.currentData(),
+                                                  filter_algorithm=self.filter_algorithm_combo.currentData(),
+                                                  incremental=self.incremental_scan_check.isChecked())
+        self.export_thread.progress_updated.connect(self.on_scan_progress)
+        self.export_thread.export_completed.connect(
+            lambda file_count: QtWidgets.QMessageBox.information(
+                self.parent, "指纹清单", f"已导出 {file_count} 个文件的指纹到\n{manifest_path}"))
+        self.export_thread.error_occurred.connect(
+            lambda error_message: QtWidgets.QMessageBox.warning(self.parent, "指纹清单", error_message))
+        self.export_thread.finished.connect(lambda: self.manifest_button.setEnabled(True))
+        self.export_thread.start()
+        
+        logger.info(f"开始导出指纹清单: {folder} -> {manifest_path}")
+    
+    def import_manifests(self):
+        file_paths, _ = QtWidgets.QFileDialog.getOpenFileNames(self.parent, "导入指纹清单", "", MANIFEST_FILE_FILTER)
+        if not file_paths:
+            return
+        
+        manifest_paths = list(config_manager.get_setting("dedup_manifest_paths", []))
+        for file_path in file_paths:
+            try:
+                header = read_manifest_header(file_path)
+            except (OSError, EOFError, ValueError, KeyError) as e:
+                QtWidgets.QMessageBox.warning(self.parent, "警告", f"无法导入 {os.path.basename(file_path)}: {str(e)}")
+                continue
+            if file_path not in manifest_paths:
+                manifest_paths.append(file_path)
+            logger.info(f"已导入指纹清单 {file_path}: {header.label} ({header.root}, {header.hash_algorithm})")
+        
+        config_manager.update_setting("dedup_manifest_paths", manifest_paths)
+        self._update_manifest_tooltip()
+        self._select_combo_data(self.scan_mode_combo, SCAN_MODE_MANIFEST)
+    
+    def clear_manifests(self):
+        config_manager.update_setting("dedup_manifest_paths", [])
+        self._update_manifest_tooltip()
+    
+    def _on_scan_mode_changed(self):
+        config_manager.update_setting("dedup_scan_mode", self.scan_mode_combo.currentData())
+        self._update_algorithm_combos()
+    
+    def _update_algorithm_combos(self):
+        scan_mode = self.scan_mode_combo.currentData()
+        # 图片内容模式按图像数据大小分组，不做部分哈希预筛选
+        self.filter_algorithm_combo.setEnabled(scan_mode not in (SCAN_MODE_SIMILAR, SCAN_MODE_PAYLOAD))
+        self.hash_algorithm_combo.setEnabled(scan_mode != SCAN_MODE_SIMILAR)
+        self.spill_to_disk_check.setEnabled(scan_mode == SCAN_MODE_EXACT)
+        self.scan_archives_check.setEnabled(scan_mode == SCAN_MODE_EXACT)
+    
+    @staticmethod
+    def _select_combo_data(combo, data):
+        index = combo.findData(data)
+        if index >= 0:
+            combo.setCurrentIndex(index)
     
     def _connect_signals(self):
         self.parent.btnStartDeduplication.clicked.connect(self.start_scan)
         self.parent.btnRandomSelect.clicked.connect(self.random_select)
         self.parent.btnMoveToRecycleBin.clicked.connect(self.move_to_recycle_bin)
         
-        self.parent.duplicateItemsListWidget.currentRowChanged.connect(self.on_group_selected)
-        
-        self.parent.duplicateFilesTableWidget.cellChanged.connect(self.on_file_selection_changed)
+        self.parent.duplicateGroupsListView.selectionModel().currentRowChanged.connect(
+            lambda current, previous: self.on_group_selected(current.row()))
     
     def start_scan(self):
         if not self.folder_page:
@@ -67,18 +451,41 @@ class FileDeduplicationManager(QtWidgets.QWidget):
             QtWidgets.QMessageBox.warning(self.parent, "警告", "请先选择要扫描的文件夹")
             return
         
-        self.duplicate_groups = []
+        manifest_paths = config_manager.get_setting("dedup_manifest_paths", [])
+        if self.scan_mode_combo.currentData() == SCAN_MODE_MANIFEST and not manifest_paths:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "请先导入指纹清单")
+            return
+        
         self.current_group_index = -1
-        self.selected_files.clear()
-        self.parent.duplicateItemsListWidget.clear()
-        self.parent.duplicateFilesTableWidget.setRowCount(0)
+        self.group_model.clear()
+        self.group_model.set_unverified(self.scan_mode_combo.currentData() == SCAN_MODE_QUICK)
+        self.group_model.set_keep_first(self.scan_mode_combo.currentData() == SCAN_MODE_REFERENCE)
+        self.verify_groups_button.setEnabled(False)
+        self.file_model.set_group([])
+        self.file_model.clear_selection()
         self.parent.contrastProgressBar.setValue(0)
         
         self.parent.btnStartDeduplication.setEnabled(False)
         self.parent.btnStartDeduplication.setText("扫描中...")
         
-        self.scan_thread = FileScanThread(folders)
+        self.result_scan_mode = self.scan_mode_combo.currentData()
+        self.scan_thread = FileScanThread(folders,
+                                          hash_algorithm=self.hash_algorithm_combo.currentData(),
+                                          filter_algorithm=self.filter_algorithm_combo.currentData(),
+                                          buffer_size=config_manager.get_setting("dedup_buffer_size_kb", 1024) * 1024,
+                                          memory_limit=config_manager.get_setting("dedup_memory_limit_mb", 256) * 1024 * 1024,
+                                          scan_mode=self.scan_mode_combo.currentData(),
+                                          similarity_threshold=config_manager.get_setting("dedup_similarity_threshold",
+                                                                                          DEFAULT_SIMILARITY_THRESHOLD),
+                                          incremental=self.incremental_scan_check.isChecked(),
+                                          spill_to_disk=self.spill_to_disk_check.isChecked(),
+                                          spill_memory_budget=config_manager.get_setting("dedup_spill_budget_mb", 256) * 1024 * 1024,
+                                          scan_archives=self.scan_archives_check.isChecked(),
+                                          manifest_paths=manifest_paths)
         self.scan_thread.progress_updated.connect(self.on_scan_progress)
+        self.scan_thread.group_found.connect(self.on_group_found)
+        self.scan_thread.directory_groups_found.connect(self.group_model.set_directory_groups)
+        self.scan_thread.scan_summary.connect(self.on_scan_summary)
         self.scan_thread.scan_completed.connect(self.on_scan_completed)
         self.scan_thread.error_occurred.connect(self.on_scan_error)
         self.scan_thread.start()
@@ -89,13 +496,18 @@ class FileDeduplicationManager(QtWidgets.QWidget):
     def on_scan_progress(self, progress, status_text):
         self.parent.contrastProgressBar.setValue(progress)
     
+    def on_group_found(self, group, wasted):
+        self.group_model.append_group(group, wasted)
+    
+    def on_scan_summary(self, summary):
+        logger.info(f"扫描汇总: 共 {summary['total_files']} 个文件, {summary['group_count']} 组重复, "
+                    f"可释放 {format_file_size(summary['wasted_bytes'])}")
+    
     def on_scan_completed(self, duplicate_groups):
-        self.duplicate_groups = duplicate_groups
-        
-        self.parent.duplicateItemsListWidget.clear()
-        for i, group in enumerate(duplicate_groups):
-            item = QtWidgets.QListWidgetItem(f"重复文件组 {i+1} ({len(group)}个文件)")
-            self.parent.duplicateItemsListWidget.addItem(item)
+        self.current_group_index = -1
+        self.file_model.set_group([])
+        self.group_model.set_groups(duplicate_groups)
+        self.verify_groups_button.setEnabled(self.result_scan_mode == SCAN_MODE_QUICK and bool(duplicate_groups))
         
         self.parent.btnStartDeduplication.setEnabled(True)
         self.parent.btnStartDeduplication.setText("开始查重")
@@ -103,6 +515,11 @@ class FileDeduplicationManager(QtWidgets.QWidget):
         
         if duplicate_groups:
             message = f"找到 {len(duplicate_groups)} 组重复文件"
+            directory_count = self.group_model.directory_group_count()
+            if directory_count:
+                message += f"，其中前 {directory_count} 组是整个文件夹重复"
+            if self.result_scan_mode == SCAN_MODE_QUICK:
+                message += "（快速指纹结果未经验证，处理前请先验证所选组）"
             QtWidgets.QMessageBox.information(self.parent, "扫描完成", 
                                             f"{message}，您可以在左侧列表中查看详情")
             if hasattr(self.parent, 'show_tray_notification'):
@@ -119,8 +536,6 @@ class FileDeduplicationManager(QtWidgets.QWidget):
                     QtWidgets.QSystemTrayIcon.MessageIcon.Information
                 )
             
-            self.parent.duplicateItemsListWidget.setCurrentRow(0)
-            self.on_group_selected(0)
             QtWidgets.QMessageBox.information(self.parent, "扫描完成", "未找到重复文件，每一个文件都是独一无二的")
     
     def on_scan_error(self, error_message):
@@ -130,103 +545,197 @@ class FileDeduplicationManager(QtWidgets.QWidget):
         logger.error(f"扫描错误: {error_message}")
     
     def on_group_selected(self, row):
-        if row < 0 or row >= len(self.duplicate_groups):
+        file_group = self.group_model.group_at(row)
+        if file_group is None:
             return
         
         self.current_group_index = row
-        self._display_group_files(self.duplicate_groups[row])
-    
-    def _display_group_files(self, file_group):
-        self.parent.duplicateFilesTableWidget.setRowCount(0)
-        
-        for i, file_path in enumerate(file_group):
-            self.parent.duplicateFilesTableWidget.insertRow(i)
-            
-            checkbox = QtWidgets.QCheckBox()
-            checkbox.setChecked(file_path in self.selected_files)
-            checkbox.stateChanged.connect(lambda state, path=file_path: self._on_checkbox_changed(state, path))
-            checkbox_widget = QtWidgets.QWidget()
-            layout = QtWidgets.QHBoxLayout(checkbox_widget)
-            layout.addWidget(checkbox)
-            layout.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-            layout.setContentsMargins(5, 3, 5, 3)
-            self.parent.duplicateFilesTableWidget.setCellWidget(i, 0, checkbox_widget)
-            
-            file_name = os.path.basename(file_path)
-            self.parent.duplicateFilesTableWidget.setItem(i, 1, QtWidgets.QTableWidgetItem(file_name))
-            
-            path_item = QtWidgets.QTableWidgetItem(file_path)
-            path_item.setToolTip(file_path)
-            self.parent.duplicateFilesTableWidget.setItem(i, 2, path_item)
-    
-    def _on_checkbox_changed(self, state, file_path):
-        if state == QtCore.Qt.CheckState.Checked.value:
-            self.selected_files.add(file_path)
-        else:
-            self.selected_files.discard(file_path)
-    
-    def on_file_selection_changed(self, row, column):
-        if column != 0 or self.current_group_index < 0:
-            return
-        
-        file_group = self.duplicate_groups[self.current_group_index]
-        if row < len(file_group):
-            file_path = file_group[row]
-            checkbox_widget = self.parent.duplicateFilesTableWidget.cellWidget(row, 0)
-            checkbox = checkbox_widget.findChild(QtWidgets.QCheckBox)
-            
-            if checkbox.isChecked():
-                self.selected_files.add(file_path)
-            else:
-                self.selected_files.discard(file_path)
+        self.file_model.set_group(file_group, keep_first=self.group_model.keeps_first(file_group))
     
     def random_select(self):
         if not self.duplicate_groups:
             QtWidgets.QMessageBox.warning(self.parent, "警告", "请先扫描重复文件")
             return
         
-        self.selected_files.clear()
-        selected_count = 0
+        import random
+        selected = []
         
         for group in self.duplicate_groups:
             if len(group) > 1:
-                import random
-                keep_file = random.choice(group)
-                
-                for file_path in group:
-                    if file_path != keep_file:
-                        self.selected_files.add(file_path)
-                        selected_count += 1
+                # 参考库文件只作对照、清单中的文件不在本机、压缩包成员无法单独删除，这些组保留组首、选择全部本地副本
+                keep_index = 0 if self.group_model.keeps_first(group) else random.randrange(len(group))
+                selected.extend(file_path for i, file_path in enumerate(group) if i != keep_index)
         
-        if self.current_group_index >= 0:
-            self._display_group_files(self.duplicate_groups[self.current_group_index])
+        self.file_model.set_selection(selected)
+        selected_count = len(self.selected_files)
         
         QtWidgets.QMessageBox.information(self.parent, "随机选择", 
                                         f"已随机保留每组中一个文件，共选择 {selected_count} 个重复文件")
     
+    def select_by_policy(self, rules):
+        if not self.duplicate_groups:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "请先扫描重复文件")
+            return
+        if self.keep_policy_thread and self.keep_policy_thread.isRunning():
+            return
+        
+        reference_folders = list(self._update_reference_library_tooltip() or [])
+        target_folder = self.folder_page.get_target_folder() if self.folder_page else None
+        if target_folder:
+            reference_folders.append(target_folder)
+        
+        self.keep_policy_button.setEnabled(False)
+        self.keep_policy_thread = KeepPolicyThread(list(self.duplicate_groups), rules, reference_folders,
+                                                   keep_first=self.result_scan_mode == SCAN_MODE_REFERENCE)
+        self.keep_policy_thread.progress_updated.connect(self.on_scan_progress)
+        self.keep_policy_thread.selection_ready.connect(self.on_policy_selection_ready)
+        self.keep_policy_thread.error_occurred.connect(
+            lambda error_message: QtWidgets.QMessageBox.critical(self.parent, "错误", error_message))
+        self.keep_policy_thread.finished.connect(lambda: self.keep_policy_button.setEnabled(True))
+        self.keep_policy_thread.start()
+    
+    def on_policy_selection_ready(self, selected_paths):
+        self.file_model.set_selection(selected_paths)
+        QtWidgets.QMessageBox.information(self.parent, "按规则选择",
+                                        f"已为每组保留一个文件，共选择 {len(selected_paths)} 个重复文件")
+    
+    def verify_selected_groups(self):
+        if self.verify_thread and self.verify_thread.isRunning():
+            return
+        
+        rows = sorted({index.row() for index in self.parent.duplicateGroupsListView.selectionModel().selectedIndexes()})
+        groups = self.group_model.unverified_groups([self.group_model.group_at(row) for row in rows
+                                                     if self.group_model.group_at(row) is not None])
+        if not groups:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "请先在左侧列表中选择未验证的重复文件组")
+            return
+        
+        self.verify_groups_button.setEnabled(False)
+        self.verify_thread = GroupVerifyThread(groups,
+                                               hash_algorithm=self.hash_algorithm_combo.currentData(),
+                                               filter_algorithm=self.filter_algorithm_combo.currentData(),
+                                               buffer_size=config_manager.get_setting("dedup_buffer_size_kb", 1024) * 1024,
+                                               memory_limit=config_manager.get_setting("dedup_memory_limit_mb", 256) * 1024 * 1024)
+        self.verify_thread.progress_updated.connect(self.on_scan_progress)
+        self.verify_thread.verify_completed.connect(self.on_verify_completed)
+        self.verify_thread.error_occurred.connect(
+            lambda error_message: QtWidgets.QMessageBox.critical(self.parent, "验证错误", error_message))
+        self.verify_thread.finished.connect(
+            lambda: self.verify_groups_button.setEnabled(bool(self.group_model.unverified_groups())))
+        self.verify_thread.start()
+        logger.info(f"开始验证 {len(groups)} 组快速指纹结果")
+    
+    def on_verify_completed(self, results):
+        confirmed = sum(len(verified) for _, verified in results)
+        dropped_paths = self.group_model.replace_verified(results)
+        self.file_model.discard_selection(dropped_paths)
+        self.current_group_index = -1
+        self.file_model.set_group([])
+        QtWidgets.QMessageBox.information(self.parent, "验证完成",
+                                        f"已验证 {len(results)} 组：{confirmed} 组内容确认相同，"
+                                        f"{len(dropped_paths)} 个文件内容不同，已从结果中移除")
+    
+    def _unverified_selected_groups(self):
+        selected = self.selected_files
+        return [group for group in self.group_model.unverified_groups()
+                if any(file_path in selected for file_path in group)]
+    
     def move_to_recycle_bin(self):
         if not self.selected_files:
             QtWidgets.QMessageBox.warning(self.parent, "警告", "请先选择要删除的文件")
             return
         
+        unverified_groups = self._unverified_selected_groups()
+        if unverified_groups:
+            reply = QtWidgets.QMessageBox.question(self.parent, "未验证的结果",
+                                                 f"选中的文件涉及 {len(unverified_groups)} 组未验证的快速指纹结果，"
+                                                 f"这些文件只比较了大小和抽样块，内容可能不同。仍然继续吗？",
+                                                 QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+            if reply != QtWidgets.QMessageBox.StandardButton.Yes:
+                return
+        
         reply = QtWidgets.QMessageBox.question(self.parent, "确认删除", 
-                                             f"确定要将 {len(self.selected_files)} 个文件移动到回收站吗？",
+                                             f"确定要将 {len(self.selected_files)} 个文件移动到回收站吗？可以用“撤销删除”恢复。",
                                              QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
         
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            self.deduplicate_thread = FileDeduplicateThread(self.duplicate_groups, list(self.selected_files))
-            self.deduplicate_thread.progress_updated.connect(self.on_deduplicate_progress)
-            self.deduplicate_thread.deduplicate_completed.connect(self.on_deduplicate_completed)
-            self.deduplicate_thread.error_occurred.connect(self.on_deduplicate_error)
-            self.deduplicate_thread.start()
-            
-            logger.info(f"开始删除 {len(self.selected_files)} 个重复文件")
+            self._start_deduplicate(DEDUP_ACTION_DELETE)
+    
+    def replace_with_links(self, action):
+        if not self.selected_files:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "请先选择要替换的文件")
+            return
+        
+        if self.result_scan_mode in (SCAN_MODE_SIMILAR, SCAN_MODE_PAYLOAD):
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "这些图片只是图像内容相同，文件本身并不完全相同，不能替换为链接")
+            return
+        if self.result_scan_mode == SCAN_MODE_MANIFEST:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "指纹清单中的文件不在本机上，不能作为链接目标")
+            return
+        if any(self.group_model.is_directory_group(group) and any(file_path in self.selected_files for file_path in group)
+               for group in self.duplicate_groups):
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "文件夹不能替换为链接，请只选择文件级的重复文件")
+            return
+        if self._unverified_selected_groups():
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "选中的文件中有未验证的快速指纹结果，请先验证所选组再替换为链接")
+            return
+        
+        reply = QtWidgets.QMessageBox.question(self.parent, "确认替换",
+                                             f"确定要把 {len(self.selected_files)} 个文件{DEDUP_ACTION_NAMES[action]}吗？"
+                                             f"每组至少需要保留一个未选中的文件作为链接目标。",
+                                             QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No)
+        
+        if reply == QtWidgets.QMessageBox.StandardButton.Yes:
+            self._start_deduplicate(action)
+    
+    def _start_deduplicate(self, action):
+        keep_only = self.group_model.keep_only_paths()
+        selected_files = [file_path for file_path in self.selected_files
+                          if not is_virtual_path(file_path) and file_path not in keep_only]
+        if not selected_files:
+            QtWidgets.QMessageBox.warning(self.parent, "警告", "选中的文件都来自参考库、指纹清单或压缩包内部，无法直接处理")
+            return
+        
+        self.deduplicate_thread = FileDeduplicateThread(self.duplicate_groups, selected_files, action=action)
+        self.deduplicate_thread.progress_updated.connect(self.on_deduplicate_progress)
+        self.deduplicate_thread.files_processed.connect(self.on_files_processed)
+        self.deduplicate_thread.deduplicate_completed.connect(self.on_deduplicate_completed)
+        self.deduplicate_thread.error_occurred.connect(self.on_deduplicate_error)
+        self.deduplicate_thread.start()
+        
+        logger.info(f"开始{DEDUP_ACTION_NAMES[action]} {len(selected_files)} 个重复文件")
     
     def on_deduplicate_progress(self, progress, status_text):
         self.parent.contrastProgressBar.setValue(progress)
     
+    def on_files_processed(self, processed_paths, failed_paths):
+        if not processed_paths:
+            return
+        
+        processed_set = set(processed_paths)
+        current_group = self.group_model.group_at(self.current_group_index) or []
+        current_path = next((file_path for file_path in current_group if file_path not in processed_set), None)
+        
+        dropped_paths = self.group_model.remove_paths(processed_paths,
+                                                      same_size_groups=self.result_scan_mode not in (SCAN_MODE_SIMILAR, SCAN_MODE_PAYLOAD))
+        self.file_model.discard_selection(processed_paths + dropped_paths)
+        
+        self.current_group_index = -1
+        self.file_model.set_group([])
+        if current_path is not None:
+            for row, group in enumerate(self.duplicate_groups):
+                if current_path in group:
+                    self.parent.duplicateGroupsListView.setCurrentIndex(self.group_model.index(row))
+                    break
+        
+        logger.info(f"已从结果中移除 {len(processed_paths)} 个已处理文件, 剩余 {len(self.duplicate_groups)} 组重复文件")
+    
     def on_deduplicate_completed(self, deleted_count, total_count):
-        message = f"成功删除 {deleted_count} 个重复文件"
+        self._update_undo_trash_button()
+        action_name = DEDUP_ACTION_NAMES[self.deduplicate_thread.action]
+        message = f"成功{action_name} {deleted_count} 个重复文件"
+        if total_count > deleted_count:
+            message += f"，{total_count - deleted_count} 个文件处理失败"
         QtWidgets.QMessageBox.information(self.parent, "去重完成", message)
         
         # 显示托盘通知
@@ -236,8 +745,6 @@ class FileDeduplicationManager(QtWidgets.QWidget):
                 message,
                 QtWidgets.QSystemTrayIcon.MessageIcon.Information
             )
-        
-        self.start_scan()
     
     def on_deduplicate_error(self, error_message):
         QtWidgets.QMessageBox.critical(self.parent, "去重错误", error_message)
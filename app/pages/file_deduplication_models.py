@@ -0,0 +1,347 @@
+import os
+
+from PyQt6 import QtCore, QtWidgets
+
+from core.archive_members import is_virtual_path
+from core.common import format_file_size
+
+FETCH_BATCH_SIZE = 1000
+
+
+class DuplicateGroupListModel(QtCore.QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._groups = []
+        self._wasted_bytes = {}
+        self._loaded_count = 0
+        # 快速指纹模式的结果默认未验证，按组首路径记录已经完整验证过的组
+        self._unverified_mode = False
+        self._verified_keys = set()
+        # 重复目录组的组首路径，这些组里的路径是文件夹而不是文件
+        self._directory_keys = set()
+        # 对照参考库的结果组首是参考库文件，只能保留
+        self._keep_first_mode = False
+
+    @property
+    def groups(self):
+        return self._groups
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded_count
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._loaded_count < len(self._groups)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH_SIZE, len(self._groups) - self._loaded_count)
+        if count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded_count, self._loaded_count + count - 1)
+        self._loaded_count += count
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self._loaded_count:
+            return None
+
+        group = self._groups[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            prefix = "" if self.is_verified(group) else "[未验证] "
+            if self.is_directory_group(group):
+                kind, unit = "重复文件夹组", "个文件夹"
+            else:
+                kind, unit = "重复文件组", "个文件"
+            wasted = self._wasted_bytes.get(group[0])
+            if wasted is None:
+                return f"{prefix}{kind} {index.row()+1} ({len(group)}{unit})"
+            return f"{prefix}{kind} {index.row()+1} ({len(group)}{unit}, 可释放 {format_file_size(wasted)})"
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            if not self.is_verified(group):
+                return f"{group[0]}\n只比较了文件大小和抽样块，内容可能不同，请先验证"
+            return group[0]
+        return None
+
+    def set_directory_groups(self, groups, wasted_bytes):
+        self._directory_keys = {group[0] for group in groups}
+        self._wasted_bytes.update(wasted_bytes)
+
+    def directory_group_count(self):
+        return len(self._directory_keys)
+
+    def is_directory_group(self, group):
+        return group[0] in self._directory_keys
+
+    def set_keep_first(self, keep_first):
+        self._keep_first_mode = keep_first
+
+    def keeps_first(self, group):
+        # 参考库文件、清单中的文件和压缩包成员都排在组首，不能被选中处理
+        return self._keep_first_mode or is_virtual_path(group[0])
+
+    def keep_only_paths(self):
+        return {group[0] for group in self._groups if self.keeps_first(group)}
+
+    def set_unverified(self, unverified):
+        self._unverified_mode = unverified
+        self._verified_keys = set()
+
+    def is_verified(self, group):
+        return not self._unverified_mode or group[0] in self._verified_keys
+
+    def unverified_groups(self, groups=None):
+        return [group for group in (self._groups if groups is None else groups) if not self.is_verified(group)]
+
+    def replace_verified(self, results):
+        # results: [(原始组, [(确认后的组, 可释放字节数), ...])]，没有确认的原始组直接移除
+        replacements = {id(group): verified for group, verified in results}
+        remaining_groups = []
+        dropped_paths = []
+        for group in self._groups:
+            verified = replacements.get(id(group))
+            if verified is None:
+                remaining_groups.append(group)
+                continue
+            kept_paths = set()
+            for verified_group, wasted in verified:
+                remaining_groups.append(verified_group)
+                self._wasted_bytes[verified_group[0]] = wasted
+                self._verified_keys.add(verified_group[0])
+                kept_paths.update(verified_group)
+            dropped_paths.extend(file_path for file_path in group if file_path not in kept_paths)
+
+        self.beginResetModel()
+        self._groups[:] = remaining_groups
+        self._loaded_count = min(self._loaded_count, len(self._groups))
+        self.endResetModel()
+        return dropped_paths
+
+    def set_groups(self, groups, wasted_bytes=None):
+        # 只替换引用，行由视图滚动时分批取出，列出任意多组都是常数时间
+        self.beginResetModel()
+        self._groups = groups
+        if wasted_bytes is not None:
+            self._wasted_bytes = wasted_bytes
+        self._loaded_count = 0
+        self.endResetModel()
+
+    def append_group(self, group, wasted):
+        self._wasted_bytes[group[0]] = wasted
+        if self._loaded_count == len(self._groups) and self._loaded_count < FETCH_BATCH_SIZE:
+            self.beginInsertRows(QtCore.QModelIndex(), self._loaded_count, self._loaded_count)
+            self._groups.append(group)
+            self._loaded_count += 1
+            self.endInsertRows()
+        else:
+            self._groups.append(group)
+
+    def clear(self):
+        self._directory_keys = set()
+        self.set_groups([], {})
+
+    def remove_paths(self, removed_paths, same_size_groups=True):
+        # 只在内存中更新结果：去掉已处理的路径，不足两个文件的组整体移除；
+        # 移走的文件夹下的文件也一并从文件级结果中去掉
+        removed_paths = set(removed_paths)
+        removed_dirs = tuple(os.path.join(file_path, '') for group in self._groups if self.is_directory_group(group)
+                             for file_path in group if file_path in removed_paths)
+        remaining_groups = []
+        dropped_paths = []
+        wasted_bytes = {}
+        for group in self._groups:
+            remaining = [file_path for file_path in group if file_path not in removed_paths and
+                         not (removed_dirs and file_path.startswith(removed_dirs))]
+            if len(remaining) == len(group):
+                remaining_groups.append(group)
+                if group[0] in self._wasted_bytes:
+                    wasted_bytes[group[0]] = self._wasted_bytes[group[0]]
+                continue
+            if removed_dirs:
+                dropped_paths.extend(file_path for file_path in group
+                                     if file_path not in removed_paths and file_path.startswith(removed_dirs))
+            if len(remaining) < 2:
+                dropped_paths.extend(remaining)
+                continue
+
+            remaining_groups.append(remaining)
+            if group[0] in self._verified_keys:
+                self._verified_keys.add(remaining[0])
+            if group[0] in self._directory_keys:
+                self._directory_keys.add(remaining[0])
+            wasted = self._wasted_bytes.get(group[0])
+            # 内容相同的组每个文件大小相同，可以按份数折算；相似图片组无法不读文件就算出新值
+            if wasted is not None and same_size_groups:
+                wasted_bytes[remaining[0]] = wasted // (len(group) - 1) * (len(remaining) - 1)
+
+        self.beginResetModel()
+        self._groups[:] = remaining_groups
+        self._wasted_bytes = wasted_bytes
+        self._loaded_count = min(self._loaded_count, len(self._groups))
+        self.endResetModel()
+        return dropped_paths
+
+    def group_at(self, row):
+        if 0 <= row < len(self._groups):
+            return self._groups[row]
+        return None
+
+
+class DuplicateFileTableModel(QtCore.QAbstractTableModel):
+
+    selection_changed = QtCore.pyqtSignal()
+
+    COLUMN_CHECK = 0
+    COLUMN_NAME = 1
+    COLUMN_PATH = 2
+    HEADERS = ["选择", "文件名", "文件路径"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._paths = []
+        self._keep_only_path = None
+        self.selected_paths = set()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._paths)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.ItemFlag.NoItemFlags
+        flags = QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsSelectable
+        if index.column() == self.COLUMN_CHECK and self._paths[index.row()] != self._keep_only_path:
+            flags |= QtCore.Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        file_path = self._paths[index.row()]
+        column = index.column()
+        if column == self.COLUMN_CHECK:
+            if role == QtCore.Qt.ItemDataRole.CheckStateRole:
+                if file_path in self.selected_paths:
+                    return QtCore.Qt.CheckState.Checked
+                return QtCore.Qt.CheckState.Unchecked
+            return None
+
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(file_path) if column == self.COLUMN_NAME else file_path
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole and column == self.COLUMN_PATH:
+            if file_path == self._keep_only_path:
+                return f"{file_path}\n作为保留项，不能选择处理"
+            return file_path
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.ItemDataRole.EditRole):
+        if (not index.isValid() or index.column() != self.COLUMN_CHECK or
+                role != QtCore.Qt.ItemDataRole.CheckStateRole):
+            return False
+
+        file_path = self._paths[index.row()]
+        if file_path == self._keep_only_path:
+            return False
+        if QtCore.Qt.CheckState(value) == QtCore.Qt.CheckState.Checked:
+            self.selected_paths.add(file_path)
+        else:
+            self.selected_paths.discard(file_path)
+        self.dataChanged.emit(index, index, [QtCore.Qt.ItemDataRole.CheckStateRole])
+        self.selection_changed.emit()
+        return True
+
+    def sort(self, column, order=QtCore.Qt.SortOrder.AscendingOrder):
+        if column == self.COLUMN_CHECK:
+            key = lambda file_path: file_path in self.selected_paths
+        elif column == self.COLUMN_NAME:
+            key = lambda file_path: os.path.basename(file_path).lower()
+        else:
+            key = lambda file_path: file_path.lower()
+
+        self.layoutAboutToBeChanged.emit()
+        self._paths.sort(key=key, reverse=order == QtCore.Qt.SortOrder.DescendingOrder)
+        self.layoutChanged.emit()
+
+    def set_group(self, file_group, keep_first=False):
+        self.beginResetModel()
+        self._paths = list(file_group) if file_group else []
+        self._keep_only_path = self._paths[0] if keep_first and self._paths else None
+        self.endResetModel()
+
+    def discard_selection(self, paths):
+        self.selected_paths.difference_update(paths)
+        self._refresh_check_column()
+        self.selection_changed.emit()
+
+    def set_selection(self, paths):
+        self.selected_paths.clear()
+        self.selected_paths.update(paths)
+        self._refresh_check_column()
+        self.selection_changed.emit()
+
+    def clear_selection(self):
+        self.set_selection(())
+
+    def _refresh_check_column(self):
+        if self._paths:
+            self.dataChanged.emit(self.index(0, self.COLUMN_CHECK), self.index(len(self._paths) - 1, self.COLUMN_CHECK),
+                                  [QtCore.Qt.ItemDataRole.CheckStateRole])
+
+
+class CheckBoxDelegate(QtWidgets.QStyledItemDelegate):
+
+    def _indicator_rect(self, option):
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        check_option = QtWidgets.QStyleOptionButton()
+        indicator = style.subElementRect(QtWidgets.QStyle.SubElement.SE_CheckBoxIndicator, check_option, option.widget)
+        return QtWidgets.QStyle.alignedRect(option.direction, QtCore.Qt.AlignmentFlag.AlignCenter,
+                                            indicator.size(), option.rect)
+
+    def paint(self, painter, option, index):
+        item_option = QtWidgets.QStyleOptionViewItem(option)
+        self.initStyleOption(item_option, index)
+        item_option.features &= ~QtWidgets.QStyleOptionViewItem.ViewItemFeature.HasCheckIndicator
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        style.drawControl(QtWidgets.QStyle.ControlElement.CE_ItemViewItem, item_option, painter, option.widget)
+
+        check_option = QtWidgets.QStyleOptionButton()
+        check_option.rect = self._indicator_rect(option)
+        check_option.state = QtWidgets.QStyle.StateFlag.State_Enabled
+        if index.data(QtCore.Qt.ItemDataRole.CheckStateRole) == QtCore.Qt.CheckState.Checked:
+            check_option.state |= QtWidgets.QStyle.StateFlag.State_On
+        else:
+            check_option.state |= QtWidgets.QStyle.StateFlag.State_Off
+        style.drawPrimitive(QtWidgets.QStyle.PrimitiveElement.PE_IndicatorCheckBox, check_option, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if not index.flags() & QtCore.Qt.ItemFlag.ItemIsUserCheckable:
+            return False
+
+        if event.type() == QtCore.QEvent.Type.MouseButtonRelease:
+            if event.button() != QtCore.Qt.MouseButton.LeftButton or not option.rect.contains(event.position().toPoint()):
+                return False
+        elif event.type() == QtCore.QEvent.Type.MouseButtonDblClick:
+            return True
+        elif event.type() == QtCore.QEvent.Type.KeyPress:
+            if event.key() not in (QtCore.Qt.Key.Key_Space, QtCore.Qt.Key.Key_Select):
+                return False
+        else:
+            return False
+
+        checked = index.data(QtCore.Qt.ItemDataRole.CheckStateRole) == QtCore.Qt.CheckState.Checked
+        new_state = QtCore.Qt.CheckState.Unchecked if checked else QtCore.Qt.CheckState.Checked
+        return model.setData(index, new_state, QtCore.Qt.ItemDataRole.CheckStateRole)
@@ -0,0 +1,75 @@
+import logging
+import tarfile
+import zipfile
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional, Tuple
+
+from core.common import ARCHIVE_EXTENSIONS
+from core.fingerprint_manifest import is_manifest_path
+
+logger = logging.getLogger(__name__)
+
+# 只支持不解压就能读出成员大小的格式：zip 的中央目录、未压缩 tar 的成员头；
+# 压缩过的 tar 要解压整个流才能列出成员，7z/rar 标准库不支持
+MEMBER_ARCHIVE_EXTENSIONS = tuple(extension for extension in ('.zip', '.jar', '.tar') if extension in ARCHIVE_EXTENSIONS)
+ARCHIVE_MEMBER_SEPARATOR = '!/'
+# 损坏、加密或格式不支持的压缩包在列出或读取成员时可能抛出的异常
+ARCHIVE_ERRORS = (OSError, EOFError, RuntimeError, KeyError, zipfile.BadZipFile, tarfile.TarError)
+
+
+def is_member_archive(file_path: str) -> bool:
+    return file_path.lower().endswith(MEMBER_ARCHIVE_EXTENSIONS)
+
+
+def archive_member_path(archive_path: str, member_name: str) -> str:
+    return f"{archive_path}{ARCHIVE_MEMBER_SEPARATOR}{member_name}"
+
+
+def split_archive_member_path(path: str) -> Optional[Tuple[str, str]]:
+    start = 0
+    while True:
+        cut = path.find(ARCHIVE_MEMBER_SEPARATOR, start)
+        if cut < 0:
+            return None
+        if is_member_archive(path[:cut]):
+            return path[:cut], path[cut + len(ARCHIVE_MEMBER_SEPARATOR):]
+        start = cut + 1
+
+
+def is_archive_member_path(path: str) -> bool:
+    return ARCHIVE_MEMBER_SEPARATOR in path and split_archive_member_path(path) is not None
+
+
+def is_virtual_path(path: str) -> bool:
+    # 清单条目和压缩包成员都不是磁盘上的独立文件，只能作为保留项
+    return is_manifest_path(path) or is_archive_member_path(path)
+
+
+def iter_archive_members(archive_path: str) -> Iterator[Tuple[str, int]]:
+    if archive_path.lower().endswith('.tar'):
+        with tarfile.open(archive_path, 'r:') as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, member.size
+        return
+
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size
+
+
+@contextmanager
+def open_archive_member(archive_path: str, member_name: str) -> Iterator[IO[bytes]]:
+    if archive_path.lower().endswith('.tar'):
+        with tarfile.open(archive_path, 'r:') as archive:
+            member_file = archive.extractfile(member_name)
+            if member_file is None:
+                raise OSError(f"压缩包成员不是普通文件: {member_name}")
+            with member_file:
+                yield member_file
+        return
+
+    with zipfile.ZipFile(archive_path) as archive:
+        with archive.open(member_name) as member_file:
+            yield member_file
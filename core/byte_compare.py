@@ -0,0 +1,84 @@
+import logging
+from contextlib import ExitStack
+from typing import Callable, List, Optional, Sequence
+
+from core.file_records import FileRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPARE_BLOCK_SIZE = 1024 * 1024
+MAX_COMPARE_GROUP_SIZE = 3
+
+
+class ByteCompareResult:
+    def __init__(self):
+        self.groups: List[List[FileRecord]] = []
+        self.failed: List[FileRecord] = []
+        self.bytes_read = 0
+        self.completed = True
+
+
+def compare_files(records: Sequence[FileRecord], block_size: int = DEFAULT_COMPARE_BLOCK_SIZE,
+                  stop_check: Optional[Callable[[], bool]] = None,
+                  buffers: Optional[Sequence[bytearray]] = None) -> ByteCompareResult:
+    # 所有候选文件同步按块读取，每块按内容把组拆开，只剩一个文件的分支立即停止读取；
+    # buffers 给出调用方复用的等长缓冲区（至少每个文件一个），此时块大小取缓冲区大小
+    result = ByteCompareResult()
+    with ExitStack() as stack:
+        branches = []
+        files = {}
+        for record in records:
+            try:
+                files[record.path] = stack.enter_context(open(record.path, 'rb', buffering=0))
+            except OSError as e:
+                logger.error(f"无法打开文件进行比较: {record.path} ({str(e)})")
+                result.failed.append(record)
+        members = [record for record in records if record.path in files]
+        if len(members) > 1:
+            branches.append(members)
+
+        if buffers is None:
+            buffers = {path: bytearray(block_size) for path in files}
+        else:
+            block_size = len(buffers[0])
+            buffers = dict(zip(files, buffers))
+        while branches:
+            if stop_check and stop_check():
+                result.completed = False
+                return result
+
+            next_branches = []
+            for members in branches:
+                blocks = []
+                for record in members:
+                    try:
+                        count = files[record.path].readinto(buffers[record.path])
+                    except OSError as e:
+                        logger.error(f"读取文件失败: {record.path} ({str(e)})")
+                        result.failed.append(record)
+                        continue
+                    result.bytes_read += count
+                    buffer = buffers[record.path]
+                    # bytearray 之间的比较走 memcmp，memoryview 会逐元素比较
+                    blocks.append((record, buffer if count == block_size else buffer[:count]))
+
+                partitions = []
+                for record, block in blocks:
+                    for partition in partitions:
+                        if partition[0][1] == block:
+                            partition.append((record, block))
+                            break
+                    else:
+                        partitions.append([(record, block)])
+
+                for partition in partitions:
+                    if len(partition) < 2:
+                        continue
+                    split = [record for record, _ in partition]
+                    if len(partition[0][1]) == 0:
+                        result.groups.append(split)
+                    else:
+                        next_branches.append(split)
+            branches = next_branches
+
+    return result
@@ -86,4 +86,11 @@ def get_file_type(file_path: str) -> str:
     elif file_ext in ARCHIVE_EXTENSIONS:
         return '压缩包'
     
-    return '其他'
\ No newline at end of file
+    return '其他'
+
+
+def format_file_size(size: int) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if abs(size) < 1024 or unit == 'TB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.2f} {unit}"
+        size /= 1024
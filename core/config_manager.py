@@ -131,6 +131,12 @@ class ConfigManager:
         if key in ["source_folder", "target_folder"]:
             return isinstance(value, str)
         
+        if key in ["dedup_buffer_size_kb", "dedup_memory_limit_mb", "dedup_spill_budget_mb"]:
+            return isinstance(value, int) and not isinstance(value, bool) and value > 0
+        
+        if key == "dedup_manifest_paths":
+            return isinstance(value, list) and all(isinstance(path, str) for path in value)
+        
         return True
     
     def _get_default_config(self) -> Dict[str, Any]:
@@ -0,0 +1,154 @@
+import hashlib
+import os
+from collections import namedtuple
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from core.scan_table import ScanTable
+
+MIN_DIRECTORY_FILES = 2
+NO_COPY = -1
+IGNORED_FILE = -2
+
+DirectoryGroup = namedtuple('DirectoryGroup', ['paths', 'file_count', 'size'])
+
+
+class _DirectoryNode:
+    __slots__ = ('entries', 'children', 'file_count', 'size', 'poisoned', 'digest')
+
+    def __init__(self):
+        self.entries = []
+        self.children = []
+        self.file_count = 0
+        self.size = 0
+        self.poisoned = False
+        self.digest = None
+
+
+def _parent_directory(directory: str) -> str:
+    return os.path.join(os.path.dirname(directory[:-1]), '') if len(directory) > 1 else ''
+
+
+def find_duplicate_directories(scan_table: ScanTable, file_tokens: np.ndarray, roots: Sequence[str],
+                               min_files: int = MIN_DIRECTORY_FILES,
+                               incomplete_dirs: Iterable[str] = ()) -> List[DirectoryGroup]:
+    # file_tokens 给出每个文件所属的重复组编号，没有副本的文件为 NO_COPY；
+    # 含有这种文件的目录不可能有完全相同的副本，整条祖先链直接标记，不参与摘要。
+    # IGNORED_FILE 的条目（如压缩包成员）不属于目录树，完全不参与。
+    # incomplete_dirs 是含有未扫描条目（隐藏文件、空文件、跳过的目录）的目录，摘要覆盖不到这些条目，同样标记
+    dir_ids = scan_table.directory_ids
+    sizes = scan_table.sizes
+    root_keys = {os.path.join(root, '') for root in roots}
+
+    nodes: Dict[str, _DirectoryNode] = {}
+    dir_nodes: Dict[int, _DirectoryNode] = {}
+    for dir_id in np.unique(dir_ids[file_tokens != IGNORED_FILE]).tolist():
+        node = nodes.setdefault(scan_table.directory(dir_id), _DirectoryNode())
+        dir_nodes[dir_id] = node
+
+    for dir_id in np.unique(dir_ids[file_tokens == NO_COPY]).tolist():
+        dir_nodes[dir_id].poisoned = True
+    for directory in incomplete_dirs:
+        nodes.setdefault(os.path.join(directory, ''), _DirectoryNode()).poisoned = True
+    copied = np.flatnonzero(file_tokens >= 0)
+    for index, dir_id, size, token in zip(copied.tolist(), dir_ids[copied].tolist(), sizes[copied].tolist(),
+                                          file_tokens[copied].tolist()):
+        node = dir_nodes[dir_id]
+        node.file_count += 1
+        node.size += size
+        if not node.poisoned:
+            node.entries.append(b'f' + scan_table.encoded_name(index) + b'\0' + token.to_bytes(8, 'big'))
+
+    # 补齐只含子目录的中间目录，直到扫描根目录为止
+    linked = set()
+    for directory in list(nodes):
+        while directory not in linked and directory not in root_keys:
+            linked.add(directory)
+            parent = _parent_directory(directory)
+            if not parent or parent == directory:
+                break
+            nodes.setdefault(parent, _DirectoryNode()).children.append(directory)
+            directory = parent
+
+    # 从最深的目录开始向上计算：目录摘要 = H(排序后的 文件名+重复组编号、子目录名+子目录摘要)
+    for directory in sorted(nodes, key=lambda path: path.count(os.sep), reverse=True):
+        node = nodes[directory]
+        items = node.entries
+        for child_path in node.children:
+            child = nodes[child_path]
+            node.file_count += child.file_count
+            node.size += child.size
+            if child.poisoned:
+                node.poisoned = True
+            elif not node.poisoned:
+                items.append(b'd' + os.fsencode(os.path.basename(child_path[:-1])) + b'\0' + child.digest)
+        if not node.poisoned:
+            items.sort()
+            node.digest = hashlib.blake2b(b''.join(len(item).to_bytes(4, 'big') + item for item in items),
+                                          digest_size=16).digest()
+        node.entries = None
+
+    by_digest: Dict[bytes, List[str]] = {}
+    for directory, node in nodes.items():
+        if node.digest is not None and node.file_count >= min_files:
+            by_digest.setdefault(node.digest, []).append(directory)
+
+    # 父目录本身也是重复目录的成员由父目录那一组代表；整组都被覆盖时不再单独列出
+    duplicated = {digest for digest, members in by_digest.items() if len(members) > 1}
+    groups = []
+    for digest in duplicated:
+        members = sorted(by_digest[digest])
+        covered = []
+        uncovered = []
+        for directory in members:
+            parent = nodes.get(_parent_directory(directory))
+            if parent is not None and parent.digest in duplicated:
+                covered.append(directory)
+            else:
+                uncovered.append(directory)
+        if not uncovered:
+            continue
+        if len(uncovered) == 1:
+            uncovered.insert(0, covered[0])
+        node = nodes[members[0]]
+        groups.append(DirectoryGroup([directory[:-1] for directory in uncovered], node.file_count, node.size))
+
+    groups.sort(key=lambda group: group.size * (len(group.paths) - 1), reverse=True)
+    return groups
+
+
+def collapse_file_groups(file_groups: Sequence[Sequence[str]],
+                         directory_groups: Sequence[DirectoryGroup]) -> List[Tuple[int, List[str]]]:
+    # 每个重复目录组保留第一个目录里的文件作为代表，其余副本目录下的文件从文件级结果中去掉；
+    # 返回 (原组序号, 剩余路径)，去掉后不足两个文件的组不再返回
+    redundant = {os.path.join(path, '') for group in directory_groups for path in group.paths[1:]}
+
+    memo: Dict[str, bool] = {}
+
+    def is_redundant(directory):
+        pending = []
+        result = False
+        while directory:
+            if directory in memo:
+                result = memo[directory]
+                break
+            if directory in redundant:
+                result = True
+                break
+            pending.append(directory)
+            parent = _parent_directory(directory)
+            if parent == directory:
+                break
+            directory = parent
+        for path in pending:
+            memo[path] = result
+        return result
+
+    collapsed = []
+    for group_index, group in enumerate(file_groups):
+        remaining = [file_path for file_path in group
+                     if not is_redundant(os.path.join(os.path.dirname(file_path), ''))]
+        if len(remaining) > 1:
+            collapsed.append((group_index, remaining))
+    return collapsed
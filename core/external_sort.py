@@ -0,0 +1,133 @@
+import heapq
+import itertools
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from core.file_records import FileRecord
+
+DEFAULT_SPILL_MEMORY_BUDGET = 256 * 1024 * 1024
+# 大小、摘要都按大端写入，记录按字节比较的顺序就是 (size, digest, id) 的数值顺序
+RUN_RECORD = struct.Struct('>q16sQ')
+RUN_KEY_SIZE = 24
+RUN_READ_RECORDS = 4096
+EMPTY_DIGEST = bytes(16)
+
+FILE_ENTRY = struct.Struct('<QIqqQQ')
+FILE_ENTRY_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4'), ('size', '<i8'), ('mtime_ns', '<i8'),
+                             ('dev', '<u8'), ('ino', '<u8')])
+
+
+class SortedRunWriter:
+    def __init__(self, directory: str, prefix: str, buffer_bytes: int):
+        self.directory = directory
+        self.prefix = prefix
+        self.record_count = 0
+        self.run_paths: List[str] = []
+        self._capacity = max(1024, buffer_bytes // RUN_RECORD.size)
+        self._buffer = bytearray()
+        self._buffered = 0
+
+    def add(self, size: int, digest: bytes, file_id: int) -> None:
+        self._buffer += RUN_RECORD.pack(size, digest, file_id)
+        self._buffered += 1
+        self.record_count += 1
+        if self._buffered >= self._capacity:
+            self._spill()
+
+    def _sorted_buffer(self) -> bytes:
+        records = np.frombuffer(self._buffer, dtype=f'S{RUN_RECORD.size}').copy()
+        records.sort()
+        return records.tobytes()
+
+    def _spill(self) -> None:
+        run_path = os.path.join(self.directory, f"{self.prefix}-{len(self.run_paths):05d}.run")
+        with open(run_path, 'wb') as f:
+            f.write(self._sorted_buffer())
+        self.run_paths.append(run_path)
+        self._buffer = bytearray()
+        self._buffered = 0
+
+    @staticmethod
+    def _iter_run(run_path: str) -> Iterator[bytes]:
+        chunk_size = RUN_RECORD.size * RUN_READ_RECORDS
+        with open(run_path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                for offset in range(0, len(chunk), RUN_RECORD.size):
+                    yield chunk[offset:offset + RUN_RECORD.size]
+
+    def _iter_sorted(self) -> Iterator[bytes]:
+        if not self.run_paths:
+            data = self._sorted_buffer()
+            self._buffer = bytearray()
+            return (data[offset:offset + RUN_RECORD.size] for offset in range(0, len(data), RUN_RECORD.size))
+
+        if self._buffered:
+            self._spill()
+        return heapq.merge(*(self._iter_run(run_path) for run_path in self.run_paths))
+
+    def iter_groups(self) -> Iterator[Tuple[int, bytes, List[int]]]:
+        # 多路归并所有有序段，相同 (size, digest) 的记录是连续的，逐组产出，内存里只有当前这一组
+        for key, records in itertools.groupby(self._iter_sorted(), key=lambda record: record[:RUN_KEY_SIZE]):
+            file_ids = [RUN_RECORD.unpack(record)[2] for record in records]
+            size, digest, _ = RUN_RECORD.unpack(key + bytes(8))
+            yield size, digest, file_ids
+
+    def close(self) -> None:
+        self._buffer = bytearray()
+        for run_path in self.run_paths:
+            try:
+                os.remove(run_path)
+            except OSError:
+                pass
+        self.run_paths = []
+
+
+class SpilledFileStore:
+    def __init__(self, directory: str):
+        self._paths_file_path = os.path.join(directory, 'paths.bin')
+        self._entries_file_path = os.path.join(directory, 'entries.bin')
+        self._paths_file = open(self._paths_file_path, 'wb')
+        self._entries_file = open(self._entries_file_path, 'wb')
+        self._offset = 0
+        self._count = 0
+        self._paths: Optional[np.memmap] = None
+        self._entries: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, record: FileRecord) -> int:
+        encoded_path = os.fsencode(record.path)
+        self._paths_file.write(encoded_path)
+        self._entries_file.write(FILE_ENTRY.pack(self._offset, len(encoded_path), record.size, record.mtime_ns,
+                                                 record.dev, record.ino))
+        self._offset += len(encoded_path)
+        self._count += 1
+        return self._count - 1
+
+    def finish(self) -> None:
+        # 写完后改为内存映射只读访问，按编号取记录时由系统页缓存负责换入换出
+        self._paths_file.close()
+        self._entries_file.close()
+        if self._count:
+            self._paths = np.memmap(self._paths_file_path, dtype=np.uint8, mode='r')
+            self._entries = np.memmap(self._entries_file_path, dtype=FILE_ENTRY_DTYPE, mode='r')
+
+    def record(self, file_id: int) -> FileRecord:
+        entry = self._entries[file_id]
+        offset = int(entry['offset'])
+        path = os.fsdecode(self._paths[offset:offset + int(entry['length'])].tobytes())
+        return FileRecord(path, int(entry['size']), int(entry['mtime_ns']), int(entry['dev']), int(entry['ino']))
+
+    def close(self) -> None:
+        self._paths_file.close()
+        self._entries_file.close()
+        # Windows 上映射未释放时无法删除临时文件
+        self._paths = None
+        self._entries = None
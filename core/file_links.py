@@ -0,0 +1,59 @@
+import logging
+import os
+import shutil
+import sys
+
+logger = logging.getLogger(__name__)
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+TEMP_LINK_SUFFIX = '.leafsort-link'
+
+
+def _temp_link_path(file_path: str) -> str:
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.{os.getpid()}{TEMP_LINK_SUFFIX}")
+
+
+def _replace_atomically(temp_path: str, file_path: str) -> None:
+    try:
+        os.replace(temp_path, file_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def replace_with_hardlink(target_path: str, file_path: str) -> None:
+    if os.path.samefile(target_path, file_path):
+        return
+
+    temp_path = _temp_link_path(file_path)
+    os.link(target_path, temp_path)
+    _replace_atomically(temp_path, file_path)
+
+
+def reflink_supported() -> bool:
+    return sys.platform.startswith('linux')
+
+
+def replace_with_reflink(target_path: str, file_path: str) -> None:
+    if not reflink_supported():
+        raise OSError("当前系统不支持reflink")
+
+    import fcntl
+
+    temp_path = _temp_link_path(file_path)
+    try:
+        with open(target_path, 'rb') as source, open(temp_path, 'wb') as destination:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        shutil.copystat(file_path, temp_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    _replace_atomically(temp_path, file_path)
@@ -0,0 +1,89 @@
+import logging
+import os
+from collections import namedtuple
+from typing import Callable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_DIR_NAMES = {'System Volume Information', '$RECYCLE.BIN', 'RECYCLER'}
+
+
+class FileRecord(namedtuple('FileRecord', ['path', 'size', 'mtime_ns', 'dev', 'ino'])):
+    __slots__ = ()
+
+    @property
+    def stat_key(self):
+        return (self.path, self.dev, self.ino, self.size, self.mtime_ns)
+
+    @classmethod
+    def from_stat(cls, path: str, file_stat: os.stat_result) -> 'FileRecord':
+        return cls(path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_dev, file_stat.st_ino)
+
+    @classmethod
+    def from_path(cls, path: str) -> 'FileRecord':
+        return cls.from_stat(path, os.stat(path))
+
+
+def is_skipped_dir(name: str) -> bool:
+    return name.startswith('.') or name in SKIPPED_DIR_NAMES
+
+
+def is_skipped_file(name: str) -> bool:
+    return name.startswith('.') or name.startswith('~')
+
+
+def record_from_entry(entry: os.DirEntry, root_dev: int) -> FileRecord:
+    entry_stat = entry.stat()
+    # Windows 上 DirEntry.stat() 不填充 st_dev/st_ino
+    dev = entry_stat.st_dev or root_dev
+    ino = entry_stat.st_ino or entry.inode()
+    return FileRecord(entry.path, entry_stat.st_size, entry_stat.st_mtime_ns, dev, ino)
+
+
+def scan_directory(dir_path: str, root_dev: int) -> Tuple[List[str], List[FileRecord], bool]:
+    # 返回 (子目录名, 文件记录, 是否完整)；含有未扫描条目（隐藏文件、跳过的目录、特殊文件、读取失败）
+    # 或者为空的目录不完整，不能按目录摘要判定为重复。目录本身无法读取时抛出 OSError
+    subdirs = []
+    records = []
+    complete = True
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if is_skipped_dir(entry.name):
+                        complete = False
+                    else:
+                        subdirs.append(entry.name)
+                elif entry.is_file() and not is_skipped_file(entry.name):
+                    records.append(record_from_entry(entry, root_dev))
+                else:
+                    complete = False
+            except OSError:
+                complete = False
+    return subdirs, records, complete and bool(subdirs or records)
+
+
+def iter_file_records(folder: str, stop_check: Optional[Callable[[], bool]] = None,
+                      incomplete_dirs: Optional[Set[str]] = None) -> Iterator[FileRecord]:
+    try:
+        root_dev = os.stat(folder).st_dev
+    except OSError as e:
+        logger.error(f"无法访问文件夹 {folder}: {str(e)}")
+        return
+
+    pending_dirs = [folder]
+    while pending_dirs:
+        if stop_check and stop_check():
+            return
+
+        current_dir = pending_dirs.pop()
+        try:
+            subdirs, records, complete = scan_directory(current_dir, root_dev)
+        except OSError as e:
+            logger.warning(f"无法读取文件夹 {current_dir}: {str(e)}")
+            subdirs, records, complete = [], [], False
+        if not complete and incomplete_dirs is not None:
+            incomplete_dirs.add(current_dir)
+
+        pending_dirs.extend(os.path.join(current_dir, name) for name in subdirs)
+        yield from records
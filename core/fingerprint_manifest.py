@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+import time
+from collections import namedtuple
+from typing import IO, Iterator, Optional
+
+from core.tree_hash import TREE_HASH_MIN_SIZE, TREE_SEGMENT_SIZE
+
+MANIFEST_FORMAT = 'leafsort-fingerprints'
+MANIFEST_VERSION = 1
+MANIFEST_FILE_FILTER = "指纹清单 (*.ndjson.gz *.ndjson)"
+MANIFEST_PATH_PREFIX = '清单://'
+
+ManifestHeader = namedtuple('ManifestHeader', ['label', 'root', 'hash_algorithm', 'filter_algorithm',
+                                               'partial_block_size', 'created_at', 'tree_hash_min_size',
+                                               'tree_segment_size'])
+ManifestEntry = namedtuple('ManifestEntry', ['path', 'size', 'mtime_ns', 'partial_hash', 'hash'])
+
+
+def _open_text(path: str, mode: str, compressed: Optional[bool] = None) -> IO[str]:
+    if compressed is None:
+        compressed = path.endswith('.gz')
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def manifest_display_path(label: str, relative_path: str) -> str:
+    # 清单里的文件不在本机上，用带前缀的路径显示在结果里，删除和链接操作据此跳过
+    return f"{MANIFEST_PATH_PREFIX}{label}/{relative_path}"
+
+
+def is_manifest_path(path: str) -> bool:
+    return path.startswith(MANIFEST_PATH_PREFIX)
+
+
+class ManifestWriter:
+    def __init__(self, path: str, root: str, hash_algorithm: str, filter_algorithm: str, partial_block_size: int,
+                 label: Optional[str] = None):
+        self.path = path
+        self.root = root
+        self.entry_count = 0
+        self._temp_path = path + '.tmp'
+        self._file = _open_text(self._temp_path, 'w', compressed=path.endswith('.gz'))
+        header = {
+            'format': MANIFEST_FORMAT,
+            'version': MANIFEST_VERSION,
+            'label': label or os.path.basename(os.path.normpath(root)) or root,
+            'root': root,
+            'hash_algorithm': hash_algorithm,
+            'filter_algorithm': filter_algorithm,
+            'partial_block_size': partial_block_size,
+            'tree_hash_min_size': TREE_HASH_MIN_SIZE,
+            'tree_segment_size': TREE_SEGMENT_SIZE,
+            'created_at': int(time.time()),
+        }
+        self._file.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    def add(self, file_path: str, size: int, mtime_ns: int, partial_hash: Optional[str], full_hash: str) -> None:
+        relative_path = os.path.relpath(file_path, self.root).replace(os.sep, '/')
+        self._file.write(json.dumps({
+            'path': relative_path,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'partial': partial_hash,
+            'hash': full_hash,
+        }, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.entry_count += 1
+
+    def commit(self) -> None:
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+
+def _parse_header(manifest_file: IO[str], path: str) -> ManifestHeader:
+    try:
+        header = json.loads(manifest_file.readline())
+    except ValueError:
+        raise ValueError(f"不是有效的指纹清单: {path}")
+    if not isinstance(header, dict) or header.get('format') != MANIFEST_FORMAT:
+        raise ValueError(f"不是有效的指纹清单: {path}")
+    if header.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"不支持的指纹清单版本: {header.get('version')}")
+    return ManifestHeader(header['label'], header['root'], header['hash_algorithm'], header['filter_algorithm'],
+                          header['partial_block_size'], header['created_at'],
+                          header.get('tree_hash_min_size'), header.get('tree_segment_size'))
+
+
+def read_manifest_header(path: str) -> ManifestHeader:
+    with _open_text(path, 'r') as manifest_file:
+        return _parse_header(manifest_file, path)
+
+
+def iter_manifest_entries(path: str) -> Iterator[ManifestEntry]:
+    with _open_text(path, 'r') as manifest_file:
+        _parse_header(manifest_file, path)
+        for line in manifest_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            yield ManifestEntry(entry['path'], entry['size'], entry['mtime_ns'], entry['partial'], entry['hash'])
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+import time
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Crc32Hash:
+    digest_size = 4
+
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, 'big')
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+class HashAlgorithm:
+    def __init__(self, name: str, label: str, factory, cryptographic: bool):
+        self.name = name
+        self.label = label
+        self.factory = factory
+        self.cryptographic = cryptographic
+
+    def new(self):
+        return self.factory()
+
+
+HASH_ALGORITHMS: Dict[str, HashAlgorithm] = {}
+
+
+def register_hash_algorithm(name: str, label: str, factory, cryptographic: bool) -> None:
+    HASH_ALGORITHMS[name] = HashAlgorithm(name, label, factory, cryptographic)
+
+
+register_hash_algorithm('blake2b', 'BLAKE2b-256', lambda: hashlib.blake2b(digest_size=32), True)
+register_hash_algorithm('sha256', 'SHA-256', hashlib.sha256, True)
+register_hash_algorithm('md5', 'MD5', hashlib.md5, True)
+if xxhash is not None:
+    register_hash_algorithm('xxh3_64', 'xxHash3-64', xxhash.xxh3_64, False)
+register_hash_algorithm('crc32', 'CRC32', _Crc32Hash, False)
+
+DEFAULT_HASH_ALGORITHM = 'blake2b'
+DEFAULT_FILTER_ALGORITHM = 'xxh3_64' if xxhash is not None else 'crc32'
+
+
+def get_hash_algorithm(name: Optional[str], default: str = DEFAULT_HASH_ALGORITHM) -> HashAlgorithm:
+    if name in HASH_ALGORITHMS:
+        return HASH_ALGORITHMS[name]
+    if name:
+        logger.warning(f"未知的哈希算法 {name}，使用 {default}")
+    return HASH_ALGORITHMS[default]
+
+
+def new_hasher(name: str):
+    return get_hash_algorithm(name).new()
+
+
+def empty_digest(name: str) -> str:
+    return new_hasher(name).hexdigest()
+
+
+def get_strong_algorithms() -> List[HashAlgorithm]:
+    return [algorithm for algorithm in HASH_ALGORITHMS.values() if algorithm.cryptographic]
+
+
+def get_filter_algorithms() -> List[HashAlgorithm]:
+    return list(HASH_ALGORITHMS.values())
+
+
+def benchmark_hash_algorithms(data_size: int = 256 * 1024 * 1024, block_size: int = 1024 * 1024) -> Dict[str, float]:
+    block = memoryview(os.urandom(block_size))
+    rounds = max(1, data_size // block_size)
+    results = {}
+    for name, algorithm in HASH_ALGORITHMS.items():
+        hasher = algorithm.new()
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            hasher.update(block)
+        hasher.hexdigest()
+        elapsed = time.perf_counter() - start_time
+        results[name] = rounds * block_size / (1024 * 1024) / max(elapsed, 1e-9)
+    return results
+
+
+if __name__ == '__main__':
+    for name, throughput in sorted(benchmark_hash_algorithms().items(), key=lambda item: -item[1]):
+        print(f"{HASH_ALGORITHMS[name].label:<12} {throughput:10.1f} MB/s")
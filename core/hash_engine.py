@@ -0,0 +1,137 @@
+import logging
+import mmap
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from core.hash_algorithms import new_hasher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+MMAP_THRESHOLD = 100 * 1024 * 1024
+PROGRESS_INTERVAL_BYTES = 100 * 1024 * 1024
+
+
+class HashEngine:
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, mmap_threshold: int = MMAP_THRESHOLD):
+        granularity = mmap.ALLOCATIONGRANULARITY
+        self.buffer_size = max(granularity, (buffer_size // granularity) * granularity)
+        self.mmap_threshold = mmap_threshold
+        self._local = threading.local()
+
+    def max_workers_for(self, memory_limit: int) -> int:
+        return max(1, memory_limit // self.buffer_size)
+
+    def _get_buffer(self) -> memoryview:
+        view = getattr(self._local, 'view', None)
+        if view is None:
+            view = memoryview(bytearray(self.buffer_size))
+            self._local.view = view
+        return view
+
+    def compare_buffers(self, count: int) -> List[bytearray]:
+        # 逐字节比较用的缓冲区，每个线程一组、合计不超过 buffer_size，与哈希缓冲区一起计入内存预算
+        buffers = getattr(self._local, 'compare_buffers', None)
+        if buffers is None or len(buffers) != count:
+            buffers = [bytearray(self.buffer_size // count) for _ in range(count)]
+            self._local.compare_buffers = buffers
+        return buffers
+
+    def hash_file(self, file_path: str, algorithm: str, file_size: int,
+                  stop_check: Optional[Callable[[], bool]] = None,
+                  progress_callback: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        hasher = new_hasher(algorithm)
+        with open(file_path, 'rb', buffering=0) as f:
+            if file_size >= self.mmap_threshold:
+                try:
+                    completed = self._hash_mmap(f, hasher, file_size, stop_check, progress_callback)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"内存映射读取失败，回退到缓冲读取: {file_path} ({str(e)})")
+                    f.seek(0)
+                    hasher = new_hasher(algorithm)
+                    completed = self._hash_readinto(f, hasher, file_size, stop_check, progress_callback)
+            else:
+                completed = self._hash_readinto(f, hasher, file_size, stop_check, progress_callback)
+
+        return hasher.hexdigest() if completed else None
+
+    def _hash_readinto(self, f, hasher, file_size, stop_check, progress_callback) -> bool:
+        buffer = self._get_buffer()
+        bytes_read = 0
+        next_progress = PROGRESS_INTERVAL_BYTES
+        while True:
+            if stop_check and stop_check():
+                return False
+
+            count = f.readinto(buffer)
+            if not count:
+                break
+
+            hasher.update(buffer[:count])
+            bytes_read += count
+
+            if progress_callback and bytes_read >= next_progress:
+                progress_callback(min(100, int(bytes_read / file_size * 100)))
+                next_progress += PROGRESS_INTERVAL_BYTES
+        return True
+
+    def _hash_mmap(self, f, hasher, file_size, stop_check, progress_callback) -> bool:
+        offset = 0
+        next_progress = PROGRESS_INTERVAL_BYTES
+        while offset < file_size:
+            if stop_check and stop_check():
+                return False
+
+            length = min(self.buffer_size, file_size - offset)
+            mapped = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+            try:
+                with memoryview(mapped) as view:
+                    hasher.update(view)
+            finally:
+                mapped.close()
+            offset += length
+
+            if progress_callback and offset >= next_progress:
+                progress_callback(min(100, int(offset / file_size * 100)))
+                next_progress += PROGRESS_INTERVAL_BYTES
+        return True
+
+    def hash_segment(self, file_path: str, algorithm: str, offset: int, length: int,
+                     stop_check: Optional[Callable[[], bool]] = None,
+                     bytes_callback: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        # 每个分段独立打开文件，多个线程可以同时读取同一文件的不同位置
+        hasher = new_hasher(algorithm)
+        buffer = self._get_buffer()
+        with open(file_path, 'rb', buffering=0) as f:
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                if stop_check and stop_check():
+                    return None
+                count = f.readinto(buffer[:min(remaining, self.buffer_size)])
+                if not count:
+                    raise OSError(f"文件在读取过程中被截断: {file_path}")
+                hasher.update(buffer[:count])
+                remaining -= count
+                if bytes_callback:
+                    bytes_callback(count)
+        return hasher.hexdigest()
+
+    def hash_ranges(self, file_path: str, algorithm: str, ranges: Iterable[Tuple[int, int]],
+                    prefix: bytes = b'') -> str:
+        hasher = new_hasher(algorithm)
+        if prefix:
+            hasher.update(prefix)
+        buffer = self._get_buffer()
+        with open(file_path, 'rb', buffering=0) as f:
+            for offset, length in ranges:
+                f.seek(offset)
+                remaining = length
+                while remaining > 0:
+                    count = f.readinto(buffer[:min(remaining, self.buffer_size)])
+                    if not count:
+                        break
+                    hasher.update(buffer[:count])
+                    remaining -= count
+        return hasher.hexdigest()
@@ -0,0 +1,158 @@
+import logging
+import os
+import sqlite3
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+
+from core.archive_members import split_archive_member_path
+from core.config_manager import get_app_data_path
+from core.sqlite_store import SQLITE_BATCH_SIZE, SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+HASH_INDEX_FILENAME = 'hash_index.db'
+HASH_INDEX_SCHEMA_VERSION = 1
+
+# (path, dev, ino, size, mtime_ns)
+StatKey = Tuple[str, int, int, int, int]
+
+
+def get_hash_index_path() -> str:
+    internal_dir = os.path.join(get_app_data_path(), '_internal')
+    os.makedirs(internal_dir, exist_ok=True)
+    return os.path.join(internal_dir, HASH_INDEX_FILENAME)
+
+
+class HashIndex:
+    def __init__(self, db_path: Optional[str] = None):
+        self._store = SQLiteStore("哈希索引", db_path, get_hash_index_path, self._ensure_schema,
+                                  "本次扫描将不使用持久化缓存")
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != HASH_INDEX_SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS file_digests")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_digests ("
+            " path TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " dev INTEGER NOT NULL,"
+            " ino INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " PRIMARY KEY (path, kind))"
+        )
+        conn.execute(f"PRAGMA user_version = {HASH_INDEX_SCHEMA_VERSION}")
+        conn.commit()
+
+    def lookup_many(self, keys: Iterable[StatKey], kind: str) -> Dict[str, str]:
+        keys_by_path = {key[0]: key for key in keys}
+        found = {}
+        if not keys_by_path:
+            return found
+
+        with self._store.connection() as conn:
+            if conn is None:
+                return found
+
+            stale_paths = []
+            paths = list(keys_by_path)
+            try:
+                for start in range(0, len(paths), SQLITE_BATCH_SIZE):
+                    batch = paths[start:start + SQLITE_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(batch))
+                    rows = conn.execute(
+                        f"SELECT path, dev, ino, size, mtime_ns, digest FROM file_digests "
+                        f"WHERE kind = ? AND path IN ({placeholders})",
+                        [kind] + batch
+                    )
+                    for path, dev, ino, size, mtime_ns, digest in rows:
+                        if keys_by_path[path] == (path, dev, ino, size, mtime_ns):
+                            found[path] = digest
+                        else:
+                            stale_paths.append(path)
+
+                if stale_paths:
+                    conn.executemany(
+                        "DELETE FROM file_digests WHERE path = ? AND kind = ?",
+                        [(path, kind) for path in stale_paths]
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"查询哈希索引失败: {str(e)}")
+
+        return found
+
+    def upsert_many(self, entries: Iterable[Tuple[StatKey, str]], kind: str) -> int:
+        rows = [key + (kind, digest) for key, digest in entries]
+        if not rows:
+            return 0
+
+        with self._store.connection() as conn:
+            if conn is None:
+                return 0
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO file_digests (path, dev, ino, size, mtime_ns, kind, digest) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                return len(rows)
+            except sqlite3.Error as e:
+                logger.error(f"写入哈希索引失败: {str(e)}")
+                return 0
+
+    def prune_missing(self, root: str, seen_paths: Collection[str]) -> int:
+        # 完整扫描一个根目录后调用：lookup_many 只清理再次查到的路径，删除、移动或移到回收站的文件
+        # 留下的各类摘要要在这里清掉；本次没列出但仍存在的路径（被过滤或没展开的压缩包成员）保留
+        prefix = os.path.join(root, '')
+        with self._store.connection() as conn:
+            if conn is None:
+                return 0
+            try:
+                rows = conn.execute(
+                    "SELECT DISTINCT path FROM file_digests WHERE path >= ? AND path < ?",
+                    (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+                )
+                missing = [path for path, in rows
+                           if path not in seen_paths and not self._path_exists(path)]
+                with conn:
+                    for start in range(0, len(missing), SQLITE_BATCH_SIZE):
+                        batch = missing[start:start + SQLITE_BATCH_SIZE]
+                        placeholders = ','.join('?' * len(batch))
+                        conn.execute(f"DELETE FROM file_digests WHERE path IN ({placeholders})", batch)
+            except sqlite3.Error as e:
+                logger.error(f"清理哈希索引失败: {str(e)}")
+                return 0
+
+        if missing:
+            logger.info(f"清理哈希索引 {root}: 删除 {len(missing)} 个已不存在文件的记录")
+        return len(missing)
+
+    @staticmethod
+    def _path_exists(path: str) -> bool:
+        member = split_archive_member_path(path)
+        return os.path.lexists(member[0] if member else path)
+
+    def close(self) -> None:
+        self._store.close()
+
+
+class HashIndexWriter:
+    def __init__(self, index: HashIndex, kind: str, flush_size: int = 1000):
+        self._index = index
+        self._kind = kind
+        self._flush_size = flush_size
+        self._pending: List[Tuple[StatKey, str]] = []
+
+    def add(self, key: StatKey, digest: str) -> None:
+        self._pending.append((key, digest))
+        if len(self._pending) >= self._flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._index.upsert_many(self._pending, self._kind)
+            self._pending = []
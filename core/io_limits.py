@@ -0,0 +1,391 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+DEVICE_CLASS_HDD = 'hdd'
+DEVICE_CLASS_SSD = 'ssd'
+DEVICE_CLASS_NVME = 'nvme'
+DEVICE_CLASS_USB = 'usb'
+DEVICE_CLASS_NETWORK = 'network'
+DEVICE_CLASS_UNKNOWN = 'unknown'
+
+# 起始并发数和自动调节的上限；USB 桥接芯片报告的旋转标志常常不准，按机械盘起步，再由实测吞吐决定能否放开
+DEVICE_CONCURRENCY: Dict[str, int] = {
+    DEVICE_CLASS_HDD: 1,
+    DEVICE_CLASS_SSD: 4,
+    DEVICE_CLASS_NVME: 8,
+    DEVICE_CLASS_USB: 1,
+    DEVICE_CLASS_NETWORK: 4,
+    DEVICE_CLASS_UNKNOWN: 2,
+}
+DEVICE_MAX_CONCURRENCY: Dict[str, int] = {
+    DEVICE_CLASS_HDD: 4,
+    DEVICE_CLASS_SSD: 16,
+    DEVICE_CLASS_NVME: 32,
+    DEVICE_CLASS_USB: 4,
+    DEVICE_CLASS_NETWORK: 16,
+    DEVICE_CLASS_UNKNOWN: 8,
+}
+
+# 每个统计窗口至少持续这么久、完成不少于当前并发数个任务
+TUNER_WINDOW_SECONDS = 0.5
+# 增加并发后吞吐至少提高这么多才保留，减少并发后吞吐下降不超过这么多就继续减
+TUNER_GAIN_THRESHOLD = 1.05
+# 平稳运行时平均延迟比上个窗口高出这么多倍而吞吐没有提高，说明设备开始拥塞，并发减半
+TUNER_LATENCY_BACKOFF = 2.0
+# 试探失败回退后保持这么多个窗口再向另一个方向试探
+TUNER_HOLD_WINDOWS = 8
+
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'sshfs', 'fuse.sshfs', '9p', 'afs', 'davfs', 'fuse.rclone'}
+
+_device_class_cache: Dict[int, str] = {}
+_device_class_lock = threading.Lock()
+
+
+def _read_sysfs(path: str) -> str:
+    try:
+        with open(path, 'r', encoding='ascii') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def _linux_mount_types() -> Dict[str, str]:
+    mount_types = {}
+    try:
+        with open('/proc/self/mountinfo', 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                fields = line.split()
+                if ' - ' not in line or len(fields) < 3:
+                    continue
+                fs_type = line.split(' - ', 1)[1].split()[0]
+                mount_types[fields[2]] = fs_type
+    except OSError:
+        pass
+    return mount_types
+
+
+def _detect_linux_device_class(st_dev: int) -> str:
+    major, minor = os.major(st_dev), os.minor(st_dev)
+    fs_type = _linux_mount_types().get(f"{major}:{minor}", '')
+    if fs_type in NETWORK_FILESYSTEMS:
+        return DEVICE_CLASS_NETWORK
+
+    block_dir = f"/sys/dev/block/{major}:{minor}"
+    if not os.path.exists(block_dir):
+        return DEVICE_CLASS_UNKNOWN
+
+    block_dir = os.path.realpath(block_dir)
+    if os.path.exists(os.path.join(block_dir, 'partition')):
+        block_dir = os.path.dirname(block_dir)
+
+    if os.path.basename(block_dir).startswith('nvme'):
+        return DEVICE_CLASS_NVME
+    if '/usb' in block_dir:
+        return DEVICE_CLASS_USB
+
+    rotational = _read_sysfs(os.path.join(block_dir, 'queue', 'rotational'))
+    if rotational == '1':
+        return DEVICE_CLASS_HDD
+    if rotational == '0':
+        return DEVICE_CLASS_SSD
+    return DEVICE_CLASS_UNKNOWN
+
+
+_WINDOWS_DRIVE_REMOTE = 4
+_WINDOWS_FILE_SHARE_READ_WRITE = 0x1 | 0x2
+_WINDOWS_OPEN_EXISTING = 3
+_WINDOWS_IOCTL_STORAGE_QUERY_PROPERTY = 0x2D1400
+_WINDOWS_STORAGE_DEVICE_PROPERTY = 0
+_WINDOWS_STORAGE_SEEK_PENALTY_PROPERTY = 7
+_WINDOWS_BUS_TYPE_USB = 7
+_WINDOWS_BUS_TYPE_NVME = 17
+
+
+def _query_windows_storage_property(kernel32, handle, property_id: int, buffer_size: int) -> Optional[bytes]:
+    import ctypes
+    from ctypes import wintypes
+
+    # STORAGE_PROPERTY_QUERY: PropertyId, QueryType=PropertyStandardQuery, AdditionalParameters[1]
+    query = (wintypes.DWORD * 3)(property_id, 0, 0)
+    output = ctypes.create_string_buffer(buffer_size)
+    returned = wintypes.DWORD()
+    if not kernel32.DeviceIoControl(handle, _WINDOWS_IOCTL_STORAGE_QUERY_PROPERTY, query, ctypes.sizeof(query),
+                                    output, buffer_size, ctypes.byref(returned), None):
+        return None
+    return output.raw[:returned.value]
+
+
+def _detect_windows_device_class(path: str) -> str:
+    import ctypes
+    from ctypes import wintypes
+
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive.startswith(('\\\\', '//')):
+        return DEVICE_CLASS_NETWORK
+    if not drive:
+        return DEVICE_CLASS_UNKNOWN
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    if kernel32.GetDriveTypeW(f"{drive}\\") == _WINDOWS_DRIVE_REMOTE:
+        return DEVICE_CLASS_NETWORK
+
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+    kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                                     wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+    kernel32.DeviceIoControl.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPVOID, wintypes.DWORD,
+                                         wintypes.LPVOID, wintypes.DWORD, ctypes.POINTER(wintypes.DWORD),
+                                         wintypes.LPVOID]
+    # 查询存储属性不需要读写权限，普通用户也能打开卷设备
+    handle = kernel32.CreateFileW(f"\\\\.\\{drive}", 0, _WINDOWS_FILE_SHARE_READ_WRITE, None,
+                                  _WINDOWS_OPEN_EXISTING, 0, None)
+    if handle is None or handle == wintypes.HANDLE(-1).value:
+        return DEVICE_CLASS_UNKNOWN
+    try:
+        # STORAGE_DEVICE_DESCRIPTOR 中 BusType 位于偏移 28
+        descriptor = _query_windows_storage_property(kernel32, handle, _WINDOWS_STORAGE_DEVICE_PROPERTY, 1024)
+        bus_type = int.from_bytes(descriptor[28:32], 'little') if descriptor and len(descriptor) >= 32 else None
+        if bus_type == _WINDOWS_BUS_TYPE_NVME:
+            return DEVICE_CLASS_NVME
+        if bus_type == _WINDOWS_BUS_TYPE_USB:
+            return DEVICE_CLASS_USB
+
+        # DEVICE_SEEK_PENALTY_DESCRIPTOR: Version, Size, IncursSeekPenalty
+        penalty = _query_windows_storage_property(kernel32, handle, _WINDOWS_STORAGE_SEEK_PENALTY_PROPERTY, 12)
+        if penalty and len(penalty) >= 9:
+            return DEVICE_CLASS_HDD if penalty[8] else DEVICE_CLASS_SSD
+        return DEVICE_CLASS_UNKNOWN
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def detect_device_class(st_dev: int, path: Optional[str] = None) -> str:
+    with _device_class_lock:
+        if st_dev in _device_class_cache:
+            return _device_class_cache[st_dev]
+
+    device_class = DEVICE_CLASS_UNKNOWN
+    try:
+        if sys.platform.startswith('linux'):
+            device_class = _detect_linux_device_class(st_dev)
+        elif sys.platform == 'win32' and path:
+            # Windows 上 st_dev 是卷序列号，只能通过路径所在的盘符查询
+            device_class = _detect_windows_device_class(path)
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning(f"检测存储设备类型失败: {str(e)}")
+
+    with _device_class_lock:
+        _device_class_cache[st_dev] = device_class
+    logger.info(f"存储设备 {st_dev} 类型: {device_class}")
+    return device_class
+
+
+def get_device_concurrency(st_dev: int, path: Optional[str] = None) -> int:
+    return DEVICE_CONCURRENCY[detect_device_class(st_dev, path)]
+
+
+class IOConcurrencyTuner:
+    # 按设备类型给出起始并发数，运行中按窗口统计吞吐和延迟做加性增、乘性减：
+    # 加一后吞吐上涨就继续加，减半后吞吐不降就继续减，试探没有收益就退回并保持一段时间，
+    # 之后换个方向再试；延迟突然成倍上涨而吞吐不涨时直接减半
+    def __init__(self, st_dev: int, path: Optional[str] = None, max_limit: Optional[int] = None,
+                 label: str = "I/O"):
+        self.st_dev = st_dev
+        self.label = label
+        self.device_class = detect_device_class(st_dev, path)
+        upper = DEVICE_MAX_CONCURRENCY[self.device_class]
+        self.max_limit = max(1, min(upper, max_limit) if max_limit else upper)
+        self.limit = min(DEVICE_CONCURRENCY[self.device_class], self.max_limit)
+        self._lock = threading.Lock()
+        self.restart()
+
+    def restart(self):
+        # 不同阶段每个任务读取的量不同，吞吐不可比，只沿用已经调好的并发数
+        with self._lock:
+            now = time.monotonic()
+            self._started = now
+            self._window_start = now
+            self._window_bytes = 0
+            self._window_count = 0
+            self._window_latency = 0.0
+            self._last_throughput = None
+            self._last_latency = None
+            self._last_limit = self.limit
+            self._last_step = 0
+            self._probe_up = True
+            self._hold = 0
+            self._total_bytes = 0
+            self._total_count = 0
+            self._lowest = self.limit
+            self._highest = self.limit
+
+    def record(self, byte_count: int, latency: float):
+        with self._lock:
+            self._total_bytes += byte_count
+            self._total_count += 1
+            self._window_bytes += byte_count
+            self._window_count += 1
+            self._window_latency += latency
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed < TUNER_WINDOW_SECONDS or self._window_count < self.limit:
+                return
+            throughput = self._window_bytes / elapsed
+            average_latency = self._window_latency / self._window_count
+            self._window_start = now
+            self._window_bytes = 0
+            self._window_count = 0
+            self._window_latency = 0.0
+            self._adjust(throughput, average_latency)
+
+    def _adjust(self, throughput: float, latency: float):
+        current = self.limit
+        previous = self._last_throughput
+        step = 0
+        if previous is None:
+            target, step = current + 1, 1
+        elif self._last_step > 0:
+            if throughput >= previous * TUNER_GAIN_THRESHOLD:
+                target, step = current + 1, 1
+            else:
+                target, self._hold, self._probe_up = self._last_limit, TUNER_HOLD_WINDOWS, False
+        elif self._last_step < 0:
+            if throughput * TUNER_GAIN_THRESHOLD >= previous:
+                target, step = current // 2, -1
+            else:
+                target, self._hold, self._probe_up = self._last_limit, TUNER_HOLD_WINDOWS, True
+        elif throughput < previous * TUNER_GAIN_THRESHOLD and latency > self._last_latency * TUNER_LATENCY_BACKOFF:
+            target, self._hold = current // 2, TUNER_HOLD_WINDOWS
+        elif self._hold > 0:
+            target = current
+            self._hold -= 1
+        elif self._probe_up:
+            target, step = current + 1, 1
+        else:
+            target, step = current // 2, -1
+
+        self.limit = min(self.max_limit, max(1, target))
+        self._last_step = step if self.limit != current else 0
+        self._last_throughput = throughput
+        self._last_latency = latency
+        self._last_limit = current
+        self._lowest = min(self._lowest, self.limit)
+        self._highest = max(self._highest, self.limit)
+        if self.limit != current:
+            logger.debug(f"{self.label} 并发调整: 设备 {self.st_dev} ({self.device_class}) {current} -> {self.limit}, "
+                         f"{throughput / 1024 / 1024:.1f} MB/s, 平均延迟 {latency * 1000:.0f} ms")
+
+    def summary(self) -> str:
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-6)
+            return (f"{self.label}: 设备 {self.st_dev} ({self.device_class}) 并发 {self.limit} "
+                    f"(范围 {self._lowest}-{self._highest}, 上限 {self.max_limit}), 完成 {self._total_count} 项, "
+                    f"{self._total_bytes / elapsed / 1024 / 1024:.1f} MB/s")
+
+    @property
+    def completed(self) -> int:
+        return self._total_count
+
+
+T = TypeVar('T')
+
+
+def file_size_or_zero(file_path) -> int:
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+class AdaptiveIOPool:
+    # 每个设备一个调节器和一条队列，同一设备上同时进行的任务数不超过它当前的并发数；
+    # 调节器跨多次 map 保留，后面的阶段从前面调好的并发数开始
+    def __init__(self, label: str, max_workers: int, thread_name_prefix: str = 'io'):
+        self.label = label
+        self.max_workers = max(1, max_workers)
+        self.thread_name_prefix = thread_name_prefix
+        self._tuners: Dict[int, IOConcurrencyTuner] = {}
+        self._directory_devices: Dict[str, int] = {}
+
+    def tuner(self, st_dev: int, path: Optional[str] = None) -> IOConcurrencyTuner:
+        tuner = self._tuners.get(st_dev)
+        if tuner is None:
+            tuner = IOConcurrencyTuner(st_dev, path, self.max_workers, self.label)
+            self._tuners[st_dev] = tuner
+        return tuner
+
+    def path_device(self, file_path) -> Tuple[int, str]:
+        # 可直接用作 map 的 device_of；同一目录下的文件只 stat 一次目录
+        directory = os.path.dirname(file_path)
+        st_dev = self._directory_devices.get(directory)
+        if st_dev is None:
+            try:
+                st_dev = os.stat(directory).st_dev
+            except OSError:
+                st_dev = 0
+            self._directory_devices[directory] = st_dev
+        return st_dev, os.fspath(file_path)
+
+    def map(self, items: Iterable[T], func: Callable[[T], object], device_of: Callable[[T], Tuple[int, str]],
+            read_size: Callable[[T], int], stop_check: Optional[Callable[[], bool]] = None
+            ) -> Iterator[Tuple[T, object, Optional[BaseException]]]:
+        device_queues: Dict[int, deque] = {}
+        for item in items:
+            st_dev, path = device_of(item)
+            if st_dev not in device_queues:
+                self.tuner(st_dev, path).restart()
+                device_queues[st_dev] = deque()
+            device_queues[st_dev].append(item)
+        if not device_queues:
+            return
+
+        tuners = {st_dev: self._tuners[st_dev] for st_dev in device_queues}
+        running = {st_dev: 0 for st_dev in device_queues}
+        in_flight = {}
+
+        def timed(st_dev, item):
+            # 任务可能移动或删除文件，先取得读取量再执行
+            byte_count = read_size(item)
+            start = time.monotonic()
+            result = func(item)
+            tuners[st_dev].record(byte_count, time.monotonic() - start)
+            return result
+
+        def submit_ready():
+            for st_dev, queue in device_queues.items():
+                while queue and running[st_dev] < tuners[st_dev].limit:
+                    item = queue.popleft()
+                    in_flight[executor.submit(timed, st_dev, item)] = (st_dev, item)
+                    running[st_dev] += 1
+
+        max_workers = min(self.max_workers, sum(tuner.max_limit for tuner in tuners.values()))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.thread_name_prefix)
+        try:
+            submit_ready()
+            while in_flight:
+                if stop_check and stop_check():
+                    return
+
+                done, _ = wait(in_flight, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    st_dev, item = in_flight.pop(future)
+                    running[st_dev] -= 1
+                    try:
+                        result, error = future.result(), None
+                    except Exception as e:
+                        result, error = None, e
+                    yield item, result, error
+
+                submit_ready()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for tuner in tuners.values():
+                if tuner.completed:
+                    logger.info(tuner.summary())
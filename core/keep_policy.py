@@ -0,0 +1,118 @@
+import logging
+import os
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from PIL import Image
+
+from core.archive_members import is_virtual_path
+
+logger = logging.getLogger(__name__)
+
+KEEP_RULE_OLDEST = 'oldest'
+KEEP_RULE_SHORTEST_PATH = 'shortest_path'
+KEEP_RULE_REFERENCE = 'reference'
+KEEP_RULE_RESOLUTION = 'resolution'
+KEEP_RULE_EXIF = 'exif'
+
+ATTRIBUTE_MTIME = 'mtime'
+ATTRIBUTE_RESOLUTION = 'resolution'
+ATTRIBUTE_EXIF = 'exif'
+
+# 每条规则需要的文件属性；不需要读文件的规则只比较路径字符串
+RULE_ATTRIBUTES = {
+    KEEP_RULE_OLDEST: ATTRIBUTE_MTIME,
+    KEEP_RULE_RESOLUTION: ATTRIBUTE_RESOLUTION,
+    KEEP_RULE_EXIF: ATTRIBUTE_EXIF,
+}
+
+KeepPreset = namedtuple('KeepPreset', ['label', 'rules'])
+KEEP_PRESETS = [
+    KeepPreset("保留修改时间最早的文件", [KEEP_RULE_OLDEST, KEEP_RULE_SHORTEST_PATH]),
+    KeepPreset("保留路径最短的文件", [KEEP_RULE_SHORTEST_PATH, KEEP_RULE_OLDEST]),
+    KeepPreset("优先保留目标文件夹和参考库中的文件", [KEEP_RULE_REFERENCE, KEEP_RULE_OLDEST, KEEP_RULE_SHORTEST_PATH]),
+    KeepPreset("保留分辨率最高的图片", [KEEP_RULE_RESOLUTION, KEEP_RULE_EXIF, KEEP_RULE_OLDEST]),
+    KeepPreset("保留EXIF信息最完整的图片", [KEEP_RULE_EXIF, KEEP_RULE_RESOLUTION, KEEP_RULE_OLDEST]),
+]
+
+EXIF_SUB_IFDS = (0x8769, 0x8825, 0xA005)
+MISSING = float('inf')
+
+
+def read_image_resolution(file_path: str) -> int:
+    # Image.open 只解析文件头，不解码像素
+    with Image.open(file_path) as img:
+        width, height = img.size
+    return width * height
+
+
+def count_exif_tags(file_path: str) -> int:
+    with Image.open(file_path) as img:
+        exif = img.getexif()
+        count = len(exif)
+        for ifd in EXIF_SUB_IFDS:
+            if ifd in exif:
+                count += len(exif.get_ifd(ifd))
+    return count
+
+
+def _folder_prefixes(folders: Iterable[str]) -> List[str]:
+    prefixes = []
+    for folder in folders:
+        if folder:
+            prefixes.append(os.path.join(os.path.normcase(os.path.abspath(folder)), ''))
+    return prefixes
+
+
+class KeepPolicy:
+    def __init__(self, rules: Sequence[str], reference_folders: Iterable[str] = ()):
+        self.rules = list(rules)
+        self._reference_prefixes = _folder_prefixes(reference_folders)
+
+    def attributes_for(self, rule: str) -> Optional[str]:
+        return RULE_ATTRIBUTES.get(rule)
+
+    def _rule_key(self, rule: str, values: Dict[str, float]) -> Callable[[str], float]:
+        # 值越小越优先保留；取不到属性的文件排在最后
+        if rule == KEEP_RULE_SHORTEST_PATH:
+            return len
+        if rule == KEEP_RULE_REFERENCE:
+            prefixes = tuple(self._reference_prefixes)
+            return lambda file_path: 0 if os.path.normcase(file_path).startswith(prefixes) else 1
+        if rule == KEEP_RULE_OLDEST:
+            return lambda file_path: MISSING if values.get(file_path) is None else values[file_path]
+        return lambda file_path: MISSING if values.get(file_path) is None else -values[file_path]
+
+    def select_removals(self, groups: Sequence[Sequence[str]],
+                        fetch_attribute: Callable[[str, List[str]], Dict[str, float]],
+                        stop_check: Optional[Callable[[], bool]] = None, keep_first: bool = False) -> List[str]:
+        # 规则按顺序逐条应用到全部结果上：每一轮只保留各组中当前并列最优的文件，
+        # 需要读文件的属性只为仍然并列的文件批量获取
+        # 结果中来自清单或压缩包内部的文件总是排在组首，只需检查第一个路径；
+        # keep_first 时（对照参考库）组首是参考库文件，总是保留
+        contenders = [group[:1] if keep_first or is_virtual_path(group[0]) else group for group in groups]
+
+        for rule in self.rules:
+            if stop_check and stop_check():
+                return []
+            tied_paths = [file_path for candidates in contenders if len(candidates) > 1 for file_path in candidates]
+            if not tied_paths:
+                break
+
+            attribute = self.attributes_for(rule)
+            key = self._rule_key(rule, fetch_attribute(attribute, tied_paths) if attribute else {})
+            for i, candidates in enumerate(contenders):
+                if len(candidates) == 2:
+                    first, second = map(key, candidates)
+                    if first != second:
+                        contenders[i] = candidates[:1] if first < second else candidates[1:]
+                elif len(candidates) > 2:
+                    ranked = list(map(key, candidates))
+                    best = min(ranked)
+                    contenders[i] = [file_path for file_path, value in zip(candidates, ranked) if value == best]
+
+        removals = []
+        for group, candidates in zip(groups, contenders):
+            keeper = min(candidates)
+            removals.extend(file_path for file_path in group if file_path != keeper)
+        return removals
@@ -0,0 +1,245 @@
+import logging
+import os
+import struct
+from typing import BinaryIO, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+PNG_EXTENSIONS = ('.png',)
+HEIF_EXTENSIONS = ('.heic', '.heif')
+PAYLOAD_HASH_EXTENSIONS = JPEG_EXTENSIONS + PNG_EXTENSIONS + HEIF_EXTENSIONS
+
+# APP1 (EXIF/XMP)、APP13 (IPTC/Photoshop)、COM 注释段
+JPEG_METADATA_MARKERS = {0xE1, 0xED, 0xFE}
+JPEG_STANDALONE_MARKERS = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+HEIF_METADATA_ITEM_TYPES = {b'Exif', b'mime', b'uri '}
+MAX_HEIF_META_SIZE = 16 * 1024 * 1024
+
+ByteRange = Tuple[int, int]
+
+
+def _merge_ranges(ranges: List[ByteRange]) -> List[ByteRange]:
+    merged = []
+    for offset, length in ranges:
+        if length <= 0:
+            continue
+        if merged and merged[-1][0] + merged[-1][1] == offset:
+            merged[-1] = (merged[-1][0], merged[-1][1] + length)
+        else:
+            merged.append((offset, length))
+    return merged
+
+
+def _jpeg_payload_ranges(f: BinaryIO, file_size: int) -> List[ByteRange]:
+    if f.read(2) != b'\xff\xd8':
+        raise ValueError("不是有效的JPEG文件")
+
+    ranges = [(0, 2)]
+    position = 2
+    while position < file_size:
+        f.seek(position)
+        if f.read(1) != b'\xff':
+            raise ValueError(f"JPEG标记错误: 偏移 {position}")
+
+        marker_start = position
+        marker = 0xFF
+        while marker == 0xFF:
+            byte = f.read(1)
+            if not byte:
+                raise ValueError("JPEG文件被截断")
+            marker = byte[0]
+        position = f.tell()
+
+        if marker in JPEG_STANDALONE_MARKERS:
+            ranges.append((marker_start, position - marker_start))
+            continue
+        if marker == JPEG_EOI:
+            ranges.append((marker_start, file_size - marker_start))
+            break
+
+        length_bytes = f.read(2)
+        if len(length_bytes) != 2:
+            raise ValueError("JPEG文件被截断")
+        segment_end = position + struct.unpack('>H', length_bytes)[0]
+
+        if marker == JPEG_SOS:
+            # 从扫描段开始到文件结尾都是压缩数据，整体计入
+            ranges.append((marker_start, file_size - marker_start))
+            break
+        if marker not in JPEG_METADATA_MARKERS:
+            ranges.append((marker_start, segment_end - marker_start))
+        position = segment_end
+
+    return _merge_ranges(ranges)
+
+
+def _png_payload_ranges(f: BinaryIO, file_size: int) -> List[ByteRange]:
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("不是有效的PNG文件")
+
+    ranges = [(0, 8)]
+    position = 8
+    while position + 12 <= file_size:
+        f.seek(position)
+        length, chunk_type = struct.unpack('>I4s', f.read(8))
+        chunk_size = 12 + length
+        # 块类型首字母大写的是关键块（IHDR/PLTE/IDAT/IEND），小写的辅助块包含 eXIf、tEXt、tIME 等元数据
+        if chunk_type[0] & 0x20 == 0:
+            ranges.append((position, chunk_size))
+        position += chunk_size
+        if chunk_type == b'IEND':
+            break
+
+    return _merge_ranges(ranges)
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, position)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, position + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - position
+        if size < header_size or position + size > end:
+            raise ValueError("HEIF box 长度错误")
+        yield box_type, position, position + header_size, position + size
+        position += size
+
+
+def _read_uint(data: bytes, position: int, size: int) -> Tuple[int, int]:
+    if size == 0:
+        return 0, position
+    return int.from_bytes(data[position:position + size], 'big'), position + size
+
+
+def _parse_heif_item_types(data: bytes, start: int, end: int) -> Dict[int, bytes]:
+    version = data[start]
+    position = start + 4
+    entry_count, position = _read_uint(data, position, 2 if version == 0 else 4)
+    item_types = {}
+    for box_type, _, box_start, box_end in _iter_boxes(data, position, end):
+        if box_type != b'infe':
+            continue
+        infe_version = data[box_start]
+        if infe_version < 2:
+            continue
+        item_id, item_position = _read_uint(data, box_start + 4, 2 if infe_version == 2 else 4)
+        item_types[item_id] = data[item_position + 2:item_position + 6]
+    return item_types
+
+
+def _parse_heif_item_locations(data: bytes, start: int) -> Dict[int, Tuple[int, int, List[ByteRange]]]:
+    version = data[start]
+    position = start + 4
+    offset_size, length_size = data[position] >> 4, data[position] & 0x0F
+    base_offset_size, index_size = data[position + 1] >> 4, data[position + 1] & 0x0F
+    if version == 0:
+        index_size = 0
+    position += 2
+    item_count, position = _read_uint(data, position, 4 if version == 2 else 2)
+
+    locations = {}
+    for _ in range(item_count):
+        item_id, position = _read_uint(data, position, 4 if version == 2 else 2)
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = int.from_bytes(data[position:position + 2], 'big') & 0x0F
+            position += 2
+        position += 2
+        base_offset, position = _read_uint(data, position, base_offset_size)
+        extent_count, position = _read_uint(data, position, 2)
+        extents = []
+        for _ in range(extent_count):
+            _, position = _read_uint(data, position, index_size)
+            extent_offset, position = _read_uint(data, position, offset_size)
+            extent_length, position = _read_uint(data, position, length_size)
+            extents.append((base_offset + extent_offset, extent_length))
+        locations[item_id] = (construction_method, base_offset, extents)
+    return locations
+
+
+def _heif_payload_ranges(f: BinaryIO, file_size: int) -> List[ByteRange]:
+    meta_range = None
+    position = 0
+    while position + 8 <= file_size:
+        f.seek(position)
+        header = f.read(16)
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_size - position
+        if size < header_size:
+            raise ValueError("HEIF box 长度错误")
+        if box_type == b'meta':
+            meta_range = (position, size)
+            break
+        position += size
+
+    if meta_range is None or meta_range[1] > MAX_HEIF_META_SIZE:
+        raise ValueError("未找到HEIF meta box")
+
+    f.seek(meta_range[0])
+    data = f.read(meta_range[1])
+    meta_end = len(data)
+    _, _, meta_start, _ = next(_iter_boxes(data, 0, meta_end))
+
+    item_types = {}
+    locations = {}
+    property_range = None
+    idat_offset = None
+    # meta 是 FullBox，子 box 从版本和标志之后开始
+    for box_type, box_position, box_start, box_end in _iter_boxes(data, meta_start + 4, meta_end):
+        if box_type == b'iinf':
+            item_types = _parse_heif_item_types(data, box_start, box_end)
+        elif box_type == b'iloc':
+            locations = _parse_heif_item_locations(data, box_start)
+        elif box_type == b'iprp':
+            property_range = (meta_range[0] + box_position, box_end - box_position)
+        elif box_type == b'idat':
+            idat_offset = meta_range[0] + box_start
+
+    ranges = [property_range] if property_range else []
+    for item_id in sorted(locations):
+        if item_types.get(item_id) in HEIF_METADATA_ITEM_TYPES:
+            continue
+        construction_method, _, extents = locations[item_id]
+        if construction_method == 1:
+            if idat_offset is None:
+                raise ValueError("HEIF缺少idat box")
+            ranges.extend((idat_offset + offset, length) for offset, length in extents)
+        elif construction_method == 0:
+            ranges.extend((offset, length if length else file_size - offset) for offset, length in extents)
+        else:
+            raise ValueError(f"不支持的HEIF数据构造方式: {construction_method}")
+
+    if not ranges:
+        raise ValueError("HEIF中没有图像数据")
+    return ranges
+
+
+def get_payload_ranges(file_path: str, file_size: int) -> List[ByteRange]:
+    extension = os.path.splitext(file_path)[1].lower()
+    with open(file_path, 'rb') as f:
+        if extension in JPEG_EXTENSIONS:
+            return _jpeg_payload_ranges(f, file_size)
+        if extension in PNG_EXTENSIONS:
+            return _png_payload_ranges(f, file_size)
+        if extension in HEIF_EXTENSIONS:
+            return _heif_payload_ranges(f, file_size)
+    raise ValueError(f"不支持的图片格式: {extension}")
+
+
+def payload_size(ranges: List[ByteRange]) -> int:
+    return sum(length for _, length in ranges)
@@ -0,0 +1,136 @@
+import logging
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pillow_heif import register_heif_opener
+    PILLOW_HEIF_AVAILABLE = True
+    register_heif_opener()
+except ImportError:
+    PILLOW_HEIF_AVAILABLE = False
+
+PERCEPTUAL_HASH_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp', '.tiff', '.tif']
+if PILLOW_HEIF_AVAILABLE:
+    PERCEPTUAL_HASH_EXTENSIONS += ['.heic', '.heif']
+
+DEFAULT_HASH_SIZE = 8
+DEFAULT_SIMILARITY_THRESHOLD = 6
+DRAFT_SCALE = 8
+
+
+def compute_dhash(file_path: str, hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    with Image.open(file_path) as img:
+        # JPEG 在 draft 模式下按 1/2、1/4、1/8 缩放解码，避免完整解码大图
+        img.draft('L', (hash_size * DRAFT_SCALE, hash_size * DRAFT_SCALE))
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = np.asarray(small, dtype=np.int16)
+
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+MULTI_INDEX_CHUNKS = 3
+
+
+def _flip_masks(bits: int, radius: int) -> np.ndarray:
+    masks = [0]
+    frontier = [(0, 0)]
+    for _ in range(radius):
+        next_frontier = []
+        for current, start_bit in frontier:
+            for bit in range(start_bit, bits):
+                flipped = current | (1 << bit)
+                masks.append(flipped)
+                next_frontier.append((flipped, bit + 1))
+        frontier = next_frontier
+    return np.array(masks, dtype=np.int64)
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def find_similar_pairs(values: np.ndarray, threshold: int,
+                       hash_bits: int = DEFAULT_HASH_SIZE * DEFAULT_HASH_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    # 多索引哈希：切成 m 段，距离 <= r 的两个哈希至少有一段距离 <= r // m，
+    # 每段用直接寻址表查找所有翻转 r // m 位以内的候选，再整体校验汉明距离
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    count = len(values)
+    empty = np.empty(0, dtype=np.int64)
+    if count < 2:
+        return empty, empty
+
+    chunk_bits = -(-hash_bits // MULTI_INDEX_CHUNKS)
+    masks = _flip_masks(chunk_bits, threshold // MULTI_INDEX_CHUNKS)
+    chunk_mask = np.uint64((1 << chunk_bits) - 1)
+    first_parts, second_parts = [], []
+
+    for chunk_index in range(MULTI_INDEX_CHUNKS):
+        chunks = ((values >> np.uint64(chunk_index * chunk_bits)) & chunk_mask).astype(np.int64)
+        order = np.argsort(chunks, kind='stable')
+        starts = np.zeros((1 << chunk_bits) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(chunks, minlength=1 << chunk_bits), out=starts[1:])
+
+        for mask in masks:
+            targets = chunks ^ mask
+            low, high = starts[targets], starts[targets + 1]
+            hits = high - low
+            sources = np.nonzero(hits)[0]
+            if len(sources) == 0:
+                continue
+
+            hits = hits[sources]
+            offsets = np.arange(hits.sum()) - np.repeat(np.cumsum(hits) - hits, hits)
+            first = np.repeat(sources, hits)
+            second = order[np.repeat(low[sources], hits) + offsets]
+
+            keep = first < second
+            first, second = first[keep], second[keep]
+            close = _popcount64(values[first] ^ values[second]) <= threshold
+            first_parts.append(first[close])
+            second_parts.append(second[close])
+
+    if not first_parts:
+        return empty, empty
+
+    pairs = np.unique(np.stack([np.concatenate(first_parts), np.concatenate(second_parts)], axis=1), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def group_similar_hashes(hashes: Iterable[Tuple[Hashable, int]],
+                         threshold: int = DEFAULT_SIMILARITY_THRESHOLD) -> List[List[Hashable]]:
+    hashes = list(hashes)
+    items = [item for item, _ in hashes]
+    values = np.array([value for _, value in hashes], dtype=np.uint64)
+    first, second = find_similar_pairs(values, threshold)
+
+    parents = list(range(len(items)))
+
+    def find(index):
+        root = index
+        while parents[root] != root:
+            root = parents[root]
+        while parents[index] != root:
+            parents[index], index = root, parents[index]
+        return root
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parents[root_b] = root_a
+
+    groups: Dict[int, List[Hashable]] = {}
+    for index in set(first.tolist()) | set(second.tolist()):
+        groups.setdefault(find(index), []).append(items[index])
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def format_perceptual_hash(value: int, hash_size: int = DEFAULT_HASH_SIZE) -> str:
+    return f"{value:0{hash_size * hash_size // 4}x}"
@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import stat
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from core.config_manager import get_app_data_path
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_JOURNAL_DIRNAME = 'quarantine'
+QUARANTINE_JOURNAL_SUFFIX = '.journal'
+QUARANTINE_DIRNAME = '.LeafSortQuarantine'
+TRASH_BATCH_SIZE = 256
+MAX_KEPT_JOURNALS = 20
+
+TrashLocation = namedtuple('TrashLocation', ['files_dir', 'info_dir', 'top_dir'])
+QuarantineBatch = namedtuple('QuarantineBatch', ['batch_id', 'file_count', 'created_at'])
+
+
+def get_quarantine_journal_dir() -> str:
+    journal_dir = os.path.join(get_app_data_path(), '_internal', QUARANTINE_JOURNAL_DIRNAME)
+    os.makedirs(journal_dir, exist_ok=True)
+    return journal_dir
+
+
+def _find_mount_point(path: str, dev: int) -> str:
+    path = os.path.abspath(path)
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return path
+        try:
+            if os.stat(parent).st_dev != dev:
+                return path
+        except OSError:
+            return path
+        path = parent
+
+
+def _ensure_dirs(*dirs: str) -> None:
+    for directory in dirs:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+
+def _freedesktop_trash_location(dev: int, sample_path: str) -> TrashLocation:
+    # freedesktop.org Trash 规范：与家目录同一设备用 $XDG_DATA_HOME/Trash，
+    # 否则用挂载点下的 $topdir/.Trash/$uid（需有粘滞位且不是符号链接）或 $topdir/.Trash-$uid
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    home_trash = os.path.join(data_home, 'Trash')
+    try:
+        os.makedirs(data_home, exist_ok=True)
+        if os.stat(data_home).st_dev == dev:
+            location = TrashLocation(os.path.join(home_trash, 'files'), os.path.join(home_trash, 'info'), None)
+            _ensure_dirs(location.files_dir, location.info_dir)
+            return location
+    except OSError:
+        pass
+
+    top_dir = _find_mount_point(sample_path, dev)
+    uid = str(os.getuid())
+    shared_trash = os.path.join(top_dir, '.Trash')
+    try:
+        shared_stat = os.lstat(shared_trash)
+        if stat.S_ISDIR(shared_stat.st_mode) and shared_stat.st_mode & stat.S_ISVTX:
+            trash_dir = os.path.join(shared_trash, uid)
+            location = TrashLocation(os.path.join(trash_dir, 'files'), os.path.join(trash_dir, 'info'), top_dir)
+            _ensure_dirs(location.files_dir, location.info_dir)
+            return location
+    except OSError:
+        pass
+
+    trash_dir = os.path.join(top_dir, f'.Trash-{uid}')
+    location = TrashLocation(os.path.join(trash_dir, 'files'), os.path.join(trash_dir, 'info'), top_dir)
+    _ensure_dirs(location.files_dir, location.info_dir)
+    return location
+
+
+def _quarantine_location(dev: int, sample_path: str) -> TrashLocation:
+    if sys.platform == 'win32':
+        top_dir = os.path.splitdrive(os.path.abspath(sample_path))[0] + os.sep
+    else:
+        top_dir = _find_mount_point(sample_path, dev)
+    quarantine_dir = os.path.join(top_dir, QUARANTINE_DIRNAME)
+    location = TrashLocation(os.path.join(quarantine_dir, 'files'), None, top_dir)
+    _ensure_dirs(location.files_dir)
+    return location
+
+
+def _trash_info_path(location: TrashLocation, original_path: str) -> str:
+    if location.top_dir is not None:
+        relative_path = os.path.relpath(original_path, location.top_dir)
+        if not relative_path.startswith(os.pardir):
+            return relative_path
+    return original_path
+
+
+class Quarantine:
+    def __init__(self, journal_dir: Optional[str] = None, max_workers: int = 8,
+                 batch_size: int = TRASH_BATCH_SIZE):
+        self.journal_dir = journal_dir or get_quarantine_journal_dir()
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._locations: Dict[int, TrashLocation] = {}
+        self._dir_devices: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._use_freedesktop = sys.platform.startswith('linux')
+
+    def _location_for(self, file_path: str) -> TrashLocation:
+        # 同一目录下的文件只 stat 一次目录，用目录的设备号找到同一文件系统上的回收站
+        directory = os.path.dirname(file_path)
+        with self._lock:
+            dev = self._dir_devices.get(directory)
+        if dev is None:
+            dev = os.stat(directory).st_dev
+            with self._lock:
+                self._dir_devices[directory] = dev
+
+        with self._lock:
+            location = self._locations.get(dev)
+            if location is None:
+                if self._use_freedesktop:
+                    location = _freedesktop_trash_location(dev, file_path)
+                else:
+                    location = _quarantine_location(dev, file_path)
+                self._locations[dev] = location
+        return location
+
+    def _reserve_name(self, location: TrashLocation, file_path: str, fallback_suffix: str,
+                      deletion_date: str) -> Tuple[str, Optional[str]]:
+        name = os.path.basename(file_path)
+        if location.info_dir is None:
+            return os.path.join(location.files_dir, f"{fallback_suffix}_{name}"), None
+
+        stem, extension = os.path.splitext(name)
+        info_content = (f"[Trash Info]\nPath={quote(_trash_info_path(location, file_path))}\n"
+                        f"DeletionDate={deletion_date}\n").encode('utf-8')
+        for trash_name in (name, f"{stem}.{fallback_suffix}{extension}"):
+            info_path = os.path.join(location.info_dir, trash_name + '.trashinfo')
+            try:
+                fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                continue
+            try:
+                os.write(fd, info_content)
+            finally:
+                os.close(fd)
+            return os.path.join(location.files_dir, trash_name), info_path
+        raise FileExistsError(f"回收站中已存在同名文件: {name}")
+
+    def _trash_chunk(self, batch_id: str, start: int, paths: Sequence[str]):
+        moved = []
+        failed = []
+        deletion_date = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        for offset, file_path in enumerate(paths):
+            info_path = None
+            try:
+                location = self._location_for(file_path)
+                trashed_path, info_path = self._reserve_name(location, file_path, f"{batch_id}-{start + offset}",
+                                                             deletion_date)
+                os.rename(file_path, trashed_path)
+                moved.append((file_path, trashed_path, info_path))
+            except OSError as e:
+                if info_path:
+                    try:
+                        os.remove(info_path)
+                    except OSError:
+                        pass
+                failed.append((file_path, str(e)))
+        return moved, failed
+
+    def trash_files(self, paths: Sequence[str], stop_check: Optional[Callable[[], bool]] = None,
+                    progress_callback: Optional[Callable[[int, int], None]] = None):
+        batch_id = time.strftime('%Y%m%d%H%M%S') + f"{int(time.time() * 1000) % 1000:03d}"
+        moved_paths = []
+        failed = []
+        completed = 0
+
+        journal_path = os.path.join(self.journal_dir, batch_id + QUARANTINE_JOURNAL_SUFFIX)
+        with open(journal_path, 'a', encoding='utf-8') as journal, \
+                ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='dedup-trash') as executor:
+            pending = {}
+            chunks = iter(range(0, len(paths), self.batch_size))
+
+            def submit_next():
+                if stop_check and stop_check():
+                    return
+                start = next(chunks, None)
+                if start is not None:
+                    chunk = paths[start:start + self.batch_size]
+                    pending[executor.submit(self._trash_chunk, batch_id, start, chunk)] = len(chunk)
+
+            for _ in range(self.max_workers * 2):
+                submit_next()
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk_size = pending.pop(future)
+                    chunk_moved, chunk_failed = future.result()
+                    # 日志按批写入并立即落盘，每个文件一行，撤销时逐行改名回原位置
+                    journal.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in chunk_moved)
+                    journal.flush()
+                    moved_paths.extend(entry[0] for entry in chunk_moved)
+                    failed.extend(chunk_failed)
+                    completed += chunk_size
+                    if progress_callback:
+                        progress_callback(completed, len(paths))
+                    submit_next()
+
+        if not moved_paths:
+            os.remove(journal_path)
+            batch_id = None
+        self._prune_journals()
+        return batch_id, moved_paths, failed
+
+    def list_batches(self) -> List[QuarantineBatch]:
+        batches = []
+        try:
+            names = os.listdir(self.journal_dir)
+        except OSError:
+            return batches
+        for name in names:
+            if not name.endswith(QUARANTINE_JOURNAL_SUFFIX):
+                continue
+            journal_path = os.path.join(self.journal_dir, name)
+            try:
+                with open(journal_path, 'rb') as f:
+                    file_count = sum(1 for _ in f)
+                created_at = os.path.getmtime(journal_path)
+            except OSError:
+                continue
+            batches.append(QuarantineBatch(name[:-len(QUARANTINE_JOURNAL_SUFFIX)], file_count, created_at))
+        batches.sort(key=lambda batch: batch.batch_id, reverse=True)
+        return batches
+
+    @staticmethod
+    def _read_journal(journal_path: str) -> List[list]:
+        with open(journal_path, 'r', encoding='utf-8') as journal:
+            return [json.loads(line) for line in journal if line.strip()]
+
+    @staticmethod
+    def _finish_journal(journal_path: str, entries: List[list], failed: List[Tuple[str, str]]) -> None:
+        if failed:
+            # 只保留没能处理的条目，方便处理冲突后再次操作
+            failed_paths = {file_path for file_path, _ in failed}
+            with open(journal_path, 'w', encoding='utf-8') as journal:
+                journal.writelines(json.dumps(entry, ensure_ascii=False) + '\n'
+                                   for entry in entries if entry[0] in failed_paths)
+        else:
+            os.remove(journal_path)
+
+    def restore_batch(self, batch_id: str, progress_callback: Optional[Callable[[int, int], None]] = None):
+        journal_path = os.path.join(self.journal_dir, batch_id + QUARANTINE_JOURNAL_SUFFIX)
+        entries = self._read_journal(journal_path)
+
+        restored = []
+        failed = []
+        for i, (original_path, trashed_path, info_path) in enumerate(entries):
+            try:
+                if os.path.lexists(original_path):
+                    raise FileExistsError(f"原位置已存在文件: {original_path}")
+                os.makedirs(os.path.dirname(original_path), exist_ok=True)
+                os.rename(trashed_path, original_path)
+                if info_path:
+                    try:
+                        os.remove(info_path)
+                    except OSError:
+                        pass
+                restored.append(original_path)
+            except OSError as e:
+                failed.append((original_path, str(e)))
+            if progress_callback and (i + 1) % self.batch_size == 0:
+                progress_callback(i + 1, len(entries))
+
+        self._finish_journal(journal_path, entries, failed)
+        return restored, failed
+
+    def _purge_entries(self, entries: List[list],
+                       progress_callback: Optional[Callable[[int, int], None]] = None):
+        purged = []
+        failed = []
+        for i, (original_path, trashed_path, info_path) in enumerate(entries):
+            try:
+                try:
+                    os.remove(trashed_path)
+                except FileNotFoundError:
+                    # 已经被手动清空的文件不算失败
+                    pass
+                if info_path:
+                    try:
+                        os.remove(info_path)
+                    except FileNotFoundError:
+                        pass
+                purged.append(original_path)
+            except OSError as e:
+                failed.append((original_path, str(e)))
+            if progress_callback and (i + 1) % self.batch_size == 0:
+                progress_callback(i + 1, len(entries))
+        return purged, failed
+
+    def purge_batch(self, batch_id: str, progress_callback: Optional[Callable[[int, int], None]] = None):
+        journal_path = os.path.join(self.journal_dir, batch_id + QUARANTINE_JOURNAL_SUFFIX)
+        entries = self._read_journal(journal_path)
+        purged, failed = self._purge_entries(entries, progress_callback)
+        self._finish_journal(journal_path, entries, failed)
+        return purged, failed
+
+    def _prune_journals(self) -> None:
+        try:
+            names = sorted((name for name in os.listdir(self.journal_dir) if name.endswith(QUARANTINE_JOURNAL_SUFFIX)),
+                           reverse=True)
+        except OSError:
+            return
+        for name in names[MAX_KEPT_JOURNALS:]:
+            # 系统回收站里的文件（有 trashinfo）仍由回收站管理；自建隔离目录不会被系统清空，
+            # 丢弃日志前先删除其中的文件，删除失败的条目留在日志里，下次再清理
+            journal_path = os.path.join(self.journal_dir, name)
+            try:
+                entries = self._read_journal(journal_path)
+                _, failed = self._purge_entries([entry for entry in entries if not entry[2]])
+                self._finish_journal(journal_path, entries, failed)
+            except (OSError, ValueError) as e:
+                logger.warning(f"清理隔离日志失败: {str(e)}")
+                continue
+            for file_path, error in failed:
+                logger.warning(f"清理隔离文件失败: {file_path} ({error})")
@@ -0,0 +1,120 @@
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+from core.config_manager import get_app_data_path
+from core.file_records import FileRecord
+from core.sqlite_store import SQLITE_BATCH_SIZE, SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_LIBRARY_FILENAME = 'reference_library.db'
+REFERENCE_LIBRARY_SCHEMA_VERSION = 1
+
+
+def get_reference_library_path() -> str:
+    internal_dir = os.path.join(get_app_data_path(), '_internal')
+    os.makedirs(internal_dir, exist_ok=True)
+    return os.path.join(internal_dir, REFERENCE_LIBRARY_FILENAME)
+
+
+class ReferenceLibrary:
+    def __init__(self, db_path: Optional[str] = None):
+        self._store = SQLiteStore("参考库", db_path, get_reference_library_path, self._ensure_schema,
+                                  "本次无法对照参考库")
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != REFERENCE_LIBRARY_SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS library_roots")
+            conn.execute("DROP TABLE IF EXISTS library_files")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS library_roots ("
+            " root TEXT PRIMARY KEY,"
+            " file_count INTEGER NOT NULL,"
+            " total_size INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS library_files ("
+            " root TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " dev INTEGER NOT NULL,"
+            " ino INTEGER NOT NULL,"
+            " PRIMARY KEY (root, path))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS library_files_size ON library_files (size)")
+        conn.execute(f"PRAGMA user_version = {REFERENCE_LIBRARY_SCHEMA_VERSION}")
+        conn.commit()
+
+    def get_roots(self) -> Dict[str, int]:
+        with self._store.connection() as conn:
+            if conn is None:
+                return {}
+            try:
+                return dict(conn.execute("SELECT root, file_count FROM library_roots ORDER BY root"))
+            except sqlite3.Error as e:
+                logger.error(f"读取参考库失败: {str(e)}")
+                return {}
+
+    def replace_root(self, root: str, records: Iterable[FileRecord]) -> int:
+        rows = [(root, record.path, record.size, record.mtime_ns, record.dev, record.ino) for record in records]
+        with self._store.connection() as conn:
+            if conn is None:
+                return 0
+            try:
+                with conn:
+                    conn.execute("DELETE FROM library_files WHERE root = ?", (root,))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO library_files (root, path, size, mtime_ns, dev, ino) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    conn.execute(
+                        "INSERT OR REPLACE INTO library_roots (root, file_count, total_size) VALUES (?, ?, ?)",
+                        (root, len(rows), sum(row[2] for row in rows))
+                    )
+                return len(rows)
+            except sqlite3.Error as e:
+                logger.error(f"写入参考库索引失败: {str(e)}")
+                return 0
+
+    def remove_root(self, root: str) -> None:
+        with self._store.connection() as conn:
+            if conn is None:
+                return
+            try:
+                with conn:
+                    conn.execute("DELETE FROM library_files WHERE root = ?", (root,))
+                    conn.execute("DELETE FROM library_roots WHERE root = ?", (root,))
+            except sqlite3.Error as e:
+                logger.error(f"移除参考库失败: {str(e)}")
+
+    def lookup_sizes(self, sizes: Iterable[int]) -> Dict[int, List[FileRecord]]:
+        sizes = list(set(sizes))
+        found: Dict[int, List[FileRecord]] = {}
+        seen_paths = set()
+        with self._store.connection() as conn:
+            if conn is None:
+                return found
+            try:
+                for start in range(0, len(sizes), SQLITE_BATCH_SIZE):
+                    batch = sizes[start:start + SQLITE_BATCH_SIZE]
+                    placeholders = ','.join('?' * len(batch))
+                    for path, size, mtime_ns, dev, ino in conn.execute(
+                            f"SELECT path, size, mtime_ns, dev, ino FROM library_files "
+                            f"WHERE size IN ({placeholders})", batch):
+                        # 嵌套的参考库根目录会重复登记同一个文件
+                        if path in seen_paths:
+                            continue
+                        seen_paths.add(path)
+                        found.setdefault(size, []).append(FileRecord(path, size, mtime_ns, dev, ino))
+            except sqlite3.Error as e:
+                logger.error(f"查询参考库失败: {str(e)}")
+        return found
+
+    def close(self) -> None:
+        self._store.close()
@@ -0,0 +1,208 @@
+import logging
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from core.config_manager import get_app_data_path
+from core.file_records import FileRecord, scan_directory
+from core.sqlite_store import SQLITE_BATCH_SIZE, SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+SCAN_SNAPSHOT_FILENAME = 'scan_snapshot.db'
+SCAN_SNAPSHOT_SCHEMA_VERSION = 2
+# 目录在这个时间窗口内被修改过时，同一时间戳内可能还有后续修改，下次扫描不信任它
+RACY_MTIME_WINDOW_NS = 2 * 1000 * 1000 * 1000
+UNTRUSTED_MTIME = -1
+
+DirectoryState = namedtuple('DirectoryState', ['mtime_ns', 'subdirs', 'files', 'complete'])
+
+
+def get_scan_snapshot_path() -> str:
+    internal_dir = os.path.join(get_app_data_path(), '_internal')
+    os.makedirs(internal_dir, exist_ok=True)
+    return os.path.join(internal_dir, SCAN_SNAPSHOT_FILENAME)
+
+
+class ScanSnapshot:
+    def __init__(self, db_path: Optional[str] = None):
+        self._store = SQLiteStore("扫描快照", db_path, get_scan_snapshot_path, self._ensure_schema,
+                                  "本次扫描将重新列出所有目录")
+        self.listed_dirs = 0
+        self.reused_dirs = 0
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCAN_SNAPSHOT_SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS snapshot_dirs")
+            conn.execute("DROP TABLE IF EXISTS snapshot_files")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_dirs ("
+            " root TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " subdirs TEXT NOT NULL,"
+            " complete INTEGER NOT NULL,"
+            " PRIMARY KEY (root, path))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_files ("
+            " root TEXT NOT NULL,"
+            " dir TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " dev INTEGER NOT NULL,"
+            " ino INTEGER NOT NULL,"
+            " PRIMARY KEY (root, dir, name))"
+        )
+        conn.execute(f"PRAGMA user_version = {SCAN_SNAPSHOT_SCHEMA_VERSION}")
+        conn.commit()
+
+    def load(self, root: str) -> Dict[str, DirectoryState]:
+        # 只读目录状态，文件条目在沿用某个目录时才按目录读取，不会一次性为整棵树构造记录
+        directories = {}
+        with self._store.connection() as conn:
+            if conn is None:
+                return directories
+            try:
+                for path, mtime_ns, subdirs, complete in conn.execute(
+                        "SELECT path, mtime_ns, subdirs, complete FROM snapshot_dirs WHERE root = ?", (root,)):
+                    directories[path] = DirectoryState(mtime_ns, subdirs.split('\0') if subdirs else [], None,
+                                                       bool(complete))
+            except sqlite3.Error as e:
+                logger.error(f"读取扫描快照失败: {str(e)}")
+                return {}
+        return directories
+
+    def load_files(self, root: str, dir_path: str) -> Optional[List[FileRecord]]:
+        with self._store.connection() as conn:
+            if conn is None:
+                return None
+            try:
+                return [FileRecord(os.path.join(dir_path, name), size, mtime_ns, dev, ino)
+                        for name, size, mtime_ns, dev, ino in conn.execute(
+                            "SELECT name, size, mtime_ns, dev, ino FROM snapshot_files WHERE root = ? AND dir = ?",
+                            (root, dir_path))]
+            except sqlite3.Error as e:
+                logger.error(f"读取扫描快照失败: {str(e)}")
+                return None
+
+    def save(self, root: str, changed: Dict[str, DirectoryState], removed: List[str]) -> None:
+        stale_dirs = list(changed) + removed
+        if not stale_dirs:
+            return
+
+        with self._store.connection() as conn:
+            if conn is None:
+                return
+            try:
+                with conn:
+                    for start in range(0, len(stale_dirs), SQLITE_BATCH_SIZE):
+                        batch = stale_dirs[start:start + SQLITE_BATCH_SIZE]
+                        placeholders = ','.join('?' * len(batch))
+                        conn.execute(f"DELETE FROM snapshot_dirs WHERE root = ? AND path IN ({placeholders})",
+                                     [root] + batch)
+                        conn.execute(f"DELETE FROM snapshot_files WHERE root = ? AND dir IN ({placeholders})",
+                                     [root] + batch)
+                    conn.executemany(
+                        "INSERT INTO snapshot_dirs (root, path, mtime_ns, subdirs, complete) VALUES (?, ?, ?, ?, ?)",
+                        [(root, path, state.mtime_ns, '\0'.join(state.subdirs), int(state.complete))
+                         for path, state in changed.items()]
+                    )
+                    conn.executemany(
+                        "INSERT INTO snapshot_files (root, dir, name, size, mtime_ns, dev, ino) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(root, path, os.path.basename(record.path), record.size, record.mtime_ns,
+                          record.dev, record.ino)
+                         for path, state in changed.items() for record in state.files]
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"写入扫描快照失败: {str(e)}")
+
+    def close(self) -> None:
+        self._store.close()
+
+    def iter_file_records(self, folder: str, stop_check: Optional[Callable[[], bool]] = None,
+                          incomplete_dirs: Optional[Set[str]] = None) -> Iterator[FileRecord]:
+        try:
+            root_dev = os.stat(folder).st_dev
+        except OSError as e:
+            logger.error(f"无法访问文件夹 {folder}: {str(e)}")
+            return
+
+        previous = self.load(folder)
+        visited = set()
+        changed = {}
+        self.listed_dirs = 0
+        self.reused_dirs = 0
+
+        pending_dirs = [folder]
+        while pending_dirs:
+            if stop_check and stop_check():
+                return
+
+            current_dir = pending_dirs.pop()
+            visited.add(current_dir)
+            try:
+                mtime_ns = os.stat(current_dir).st_mtime_ns
+            except OSError as e:
+                logger.warning(f"无法读取文件夹 {current_dir}: {str(e)}")
+                if incomplete_dirs is not None:
+                    incomplete_dirs.add(current_dir)
+                continue
+
+            state = previous.get(current_dir)
+            files = None
+            if state is not None and state.mtime_ns == mtime_ns:
+                files = self.load_files(folder, current_dir)
+            if files is not None:
+                self.reused_dirs += 1
+                # 原地覆盖文件不会改变目录的 mtime：沿用的条目逐个重新 stat（不需要列目录），有变化的目录写回快照
+                current_files = self._restat_files(files, root_dev)
+                state = state._replace(files=current_files)
+                if current_files != files:
+                    changed[current_dir] = state
+            else:
+                state = self._list_directory(current_dir, mtime_ns, root_dev)
+                if state is None:
+                    if incomplete_dirs is not None:
+                        incomplete_dirs.add(current_dir)
+                    continue
+                changed[current_dir] = state
+                self.listed_dirs += 1
+
+            if not state.complete and incomplete_dirs is not None:
+                incomplete_dirs.add(current_dir)
+            pending_dirs.extend(os.path.join(current_dir, name) for name in state.subdirs)
+            yield from state.files
+
+        removed = [path for path in previous if path not in visited]
+        self.save(folder, changed, removed)
+
+    @staticmethod
+    def _restat_files(files: List[FileRecord], root_dev: int) -> List[FileRecord]:
+        current = []
+        for record in files:
+            try:
+                file_stat = os.stat(record.path)
+            except OSError:
+                continue
+            current.append(FileRecord(record.path, file_stat.st_size, file_stat.st_mtime_ns,
+                                      file_stat.st_dev or root_dev, file_stat.st_ino or record.ino))
+        return current
+
+    @staticmethod
+    def _list_directory(dir_path: str, mtime_ns: int, root_dev: int) -> Optional[DirectoryState]:
+        try:
+            subdirs, files, complete = scan_directory(dir_path, root_dev)
+        except OSError as e:
+            logger.warning(f"无法读取文件夹 {dir_path}: {str(e)}")
+            return None
+
+        if time.time_ns() - mtime_ns < RACY_MTIME_WINDOW_NS:
+            mtime_ns = UNTRUSTED_MTIME
+        return DirectoryState(mtime_ns, subdirs, files, complete)
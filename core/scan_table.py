@@ -0,0 +1,156 @@
+import os
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.file_records import FileRecord
+
+DIGEST_SIZE = 16
+
+
+def _split_path(path: str) -> Tuple[str, str]:
+    # 目录部分保留末尾的分隔符，拼接时原样还原路径，不经过 os.path 的规范化
+    cut = path.rfind(os.sep)
+    if os.altsep:
+        cut = max(cut, path.rfind(os.altsep))
+    return path[:cut + 1], path[cut + 1:]
+
+
+def digest_bytes(digest: str) -> bytes:
+    raw = bytes.fromhex(digest)[:DIGEST_SIZE]
+    return raw.ljust(DIGEST_SIZE, b'\0')
+
+
+class ScanTable:
+    def __init__(self):
+        self._dirs: List[str] = []
+        self._dir_ids = {}
+        self._dir_index = array('I')
+        self._name_offsets = array('q', [0])
+        self._names = bytearray()
+        self._sizes = array('q')
+        self._mtimes = array('q')
+        self._devs = array('Q')
+        self._inos = array('Q')
+
+    @classmethod
+    def from_records(cls, records: Iterable[FileRecord]) -> 'ScanTable':
+        table = cls()
+        for record in records:
+            table.append(record)
+        return table
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def append(self, record: FileRecord) -> int:
+        dir_path, name = _split_path(record.path)
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dir_ids[dir_path] = dir_id
+            self._dirs.append(dir_path)
+
+        self._dir_index.append(dir_id)
+        self._names += os.fsencode(name)
+        self._name_offsets.append(len(self._names))
+        self._sizes.append(record.size)
+        self._mtimes.append(record.mtime_ns)
+        self._devs.append(record.dev)
+        self._inos.append(record.ino)
+        return len(self._sizes) - 1
+
+    def update(self, index: int, record: FileRecord) -> None:
+        self._sizes[index] = record.size
+        self._mtimes[index] = record.mtime_ns
+        self._devs[index] = record.dev
+        self._inos[index] = record.ino
+
+    def path(self, index: int) -> str:
+        name = self._names[self._name_offsets[index]:self._name_offsets[index + 1]]
+        return self._dirs[self._dir_index[index]] + os.fsdecode(bytes(name))
+
+    def name(self, index: int) -> str:
+        return os.fsdecode(bytes(self._names[self._name_offsets[index]:self._name_offsets[index + 1]]))
+
+    def encoded_name(self, index: int) -> bytes:
+        return bytes(self._names[self._name_offsets[index]:self._name_offsets[index + 1]])
+
+    def record(self, index: int) -> FileRecord:
+        index = int(index)
+        return FileRecord(self.path(index), self._sizes[index], self._mtimes[index],
+                          self._devs[index], self._inos[index])
+
+    def records(self, indices: Optional[Iterable[int]] = None) -> List[FileRecord]:
+        if indices is None:
+            indices = range(len(self))
+        return [self.record(index) for index in indices]
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return np.frombuffer(self._sizes, dtype=np.int64)
+
+    @property
+    def devs(self) -> np.ndarray:
+        return np.frombuffer(self._devs, dtype=np.uint64)
+
+    @property
+    def inos(self) -> np.ndarray:
+        return np.frombuffer(self._inos, dtype=np.uint64)
+
+    @property
+    def directory_ids(self) -> np.ndarray:
+        return np.frombuffer(self._dir_index, dtype=np.uint32)
+
+    @property
+    def directory_count(self) -> int:
+        return len(self._dirs)
+
+    def directory(self, dir_id: int) -> str:
+        return self._dirs[dir_id]
+
+    def all_indices(self) -> np.ndarray:
+        return np.arange(len(self), dtype=np.int64)
+
+    def unique_inode_indices(self) -> np.ndarray:
+        # 同一设备上 inode 相同的路径只保留第一次出现的那个；拿不到 inode 的文件全部保留
+        devs = self.devs
+        inos = self.inos
+        known = np.flatnonzero(inos != 0)
+        keys = np.empty(len(known), dtype=[('dev', np.uint64), ('ino', np.uint64)])
+        keys['dev'] = devs[known]
+        keys['ino'] = inos[known]
+        _, first = np.unique(keys, return_index=True)
+        keep = np.concatenate((known[first], np.flatnonzero(inos == 0)))
+        keep.sort()
+        return keep
+
+    def group_indices(self, indices: np.ndarray, digests: Optional[np.ndarray] = None,
+                      min_count: int = 2) -> Tuple[List[np.ndarray], int]:
+        # 按大小（以及给定的摘要）排序后找出相同键的连续区间，返回成员数不少于 min_count 的组
+        # 和落单文件的总字节数
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return [], 0
+
+        sizes = self.sizes[indices]
+        if digests is None:
+            order = np.argsort(sizes, kind='stable')
+            sorted_sizes = sizes[order]
+            changed = sorted_sizes[1:] != sorted_sizes[:-1]
+        else:
+            words = np.ascontiguousarray(digests).view(np.uint64).reshape(len(indices), -1)
+            order = np.lexsort(tuple(words[:, column] for column in reversed(range(words.shape[1]))) + (sizes,))
+            sorted_sizes = sizes[order]
+            sorted_words = words[order]
+            changed = (sorted_sizes[1:] != sorted_sizes[:-1]) | np.any(sorted_words[1:] != sorted_words[:-1], axis=1)
+
+        starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+        counts = np.diff(np.concatenate((starts, [len(indices)])))
+        sorted_indices = indices[order]
+        single_bytes = int(sorted_sizes[starts[counts == 1]].sum())
+
+        grouped = counts >= min_count
+        groups = [sorted_indices[start:start + count] for start, count in zip(starts[grouped], counts[grouped])]
+        return groups, single_bytes
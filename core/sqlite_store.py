@@ -0,0 +1,72 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+SQLITE_BATCH_SIZE = 500
+
+
+class SQLiteStore:
+    # 持久化数据库的公共部分：首次使用时连接并建表，数据库损坏时删除重建一次，仍失败则本次运行禁用；
+    # name 只用于日志，disabled_hint 说明禁用后的影响
+    def __init__(self, name: str, db_path: Optional[str], default_path: Callable[[], str],
+                 ensure_schema: Callable[[sqlite3.Connection], None], disabled_hint: str):
+        self.name = name
+        self.db_path = db_path
+        self._default_path = default_path
+        self._ensure_schema = ensure_schema
+        self._disabled_hint = disabled_hint
+        self._lock = threading.RLock()
+        self._conn = None
+        self._disabled = False
+
+    @contextmanager
+    def connection(self) -> Iterator[Optional[sqlite3.Connection]]:
+        with self._lock:
+            yield self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+
+        if not self.db_path:
+            self.db_path = self._default_path()
+
+        for attempt in range(2):
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                self._ensure_schema(conn)
+                self._conn = conn
+                return conn
+            except sqlite3.DatabaseError as e:
+                logger.error(f"{self.name}数据库不可用: {str(e)}")
+                if attempt == 0:
+                    self._remove_db_files()
+
+        logger.warning(f"{self.name}已禁用，{self._disabled_hint}")
+        self._disabled = True
+        return None
+
+    def _remove_db_files(self) -> None:
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.db_path + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"删除损坏的{self.name}失败: {str(e)}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"关闭{self.name}失败: {str(e)}")
+                self._conn = None
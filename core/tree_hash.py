@@ -0,0 +1,36 @@
+from typing import List, Optional, Sequence, Tuple
+
+from core.hash_algorithms import new_hasher
+
+# 超过这个大小的文件改为分段哈希；以前这些文件直接跳过，所以更小文件的摘要和旧索引、旧清单保持一致
+TREE_HASH_MIN_SIZE = 2 * 1024 * 1024 * 1024
+TREE_SEGMENT_SIZE = 64 * 1024 * 1024
+
+
+def segment_ranges(file_size: int, segment_size: int = TREE_SEGMENT_SIZE) -> List[Tuple[int, int]]:
+    return [(offset, min(segment_size, file_size - offset)) for offset in range(0, file_size, segment_size)]
+
+
+def segment_index_kind(algorithm: str, segment_size: int = TREE_SEGMENT_SIZE) -> str:
+    return f"segments:{algorithm}:{segment_size}"
+
+
+def combine_segment_digests(algorithm: str, file_size: int, digests: Sequence[str],
+                            segment_size: int = TREE_SEGMENT_SIZE) -> str:
+    # 根摘要 = H(前缀 + 文件大小 + 段大小 + 各段摘要)，段大小不同的结果不会互相混淆
+    hasher = new_hasher(algorithm)
+    hasher.update(f"tree:{file_size}:{segment_size}:".encode('ascii'))
+    for digest in digests:
+        hasher.update(bytes.fromhex(digest))
+    return hasher.hexdigest()
+
+
+def encode_segment_digests(digests: Sequence[Optional[str]]) -> str:
+    return ','.join(digest or '' for digest in digests)
+
+
+def decode_segment_digests(value: Optional[str], count: int) -> List[Optional[str]]:
+    digests = [digest or None for digest in value.split(',')] if value else []
+    if len(digests) != count:
+        return [None] * count
+    return digests
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# 导入 core 时会创建配置文件，测试期间放到临时目录，不写进源码目录
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='leafsort-test-')
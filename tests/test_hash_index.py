@@ -0,0 +1,36 @@
+import os
+
+from core.file_records import FileRecord
+from core.hash_index import HashIndex
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_prune_missing_drops_rows_of_removed_files_only(tmp_path):
+    root = tmp_path / 'photos'
+    root.mkdir()
+    kept = root / 'kept.jpg'
+    filtered = root / 'filtered.jpg'
+    removed = root / 'removed.jpg'
+    outside = tmp_path / 'photos-other' / 'x.jpg'
+    outside.parent.mkdir()
+    for path in (kept, filtered, removed, outside):
+        _write(path, b'x' * 1024)
+
+    index = HashIndex(str(tmp_path / 'hash_index.db'))
+    keys = [FileRecord.from_path(str(path)).stat_key for path in (kept, filtered, removed, outside)]
+    for kind in ('full', 'partial'):
+        index.upsert_many([(key, 'digest') for key in keys], kind)
+    os.remove(removed)
+    os.remove(outside)
+
+    # filtered.jpg 本次没列出但仍存在；photos-other 不在这个根目录下
+    assert index.prune_missing(str(root), {str(kept)}) == 1
+
+    for kind in ('full', 'partial'):
+        found = index.lookup_many(keys, kind)
+        assert set(found) == {str(kept), str(filtered), str(outside)}
+    index.close()
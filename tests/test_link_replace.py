@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+QtCore = pytest.importorskip('PyQt6.QtCore')
+
+from threads.file_deduplication_thread import DEDUP_ACTION_HARDLINK, FileDeduplicateThread
+
+
+def _replace(keeper, duplicate):
+    thread = FileDeduplicateThread([[str(keeper), str(duplicate)]], [str(duplicate)], action=DEDUP_ACTION_HARDLINK)
+    results = []
+    thread.files_processed.connect(lambda processed, failed: results.append((processed, failed)))
+    thread.run()
+    return results[-1]
+
+
+def test_hardlink_replaces_identical_copy(tmp_path):
+    content = os.urandom(8192)
+    keeper, duplicate = tmp_path / 'a.jpg', tmp_path / 'b.jpg'
+    keeper.write_bytes(content)
+    duplicate.write_bytes(content)
+
+    processed, failed = _replace(keeper, duplicate)
+    assert processed == [str(duplicate)] and failed == []
+    assert os.stat(keeper).st_ino == os.stat(duplicate).st_ino
+
+
+def test_hardlink_refuses_copy_changed_after_scan(tmp_path):
+    keeper, duplicate = tmp_path / 'a.jpg', tmp_path / 'b.jpg'
+    keeper.write_bytes(os.urandom(8192))
+    # 扫描之后被改写：大小相同、内容不同
+    changed = os.urandom(8192)
+    duplicate.write_bytes(changed)
+
+    processed, failed = _replace(keeper, duplicate)
+    assert processed == [] and failed == [str(duplicate)]
+    assert duplicate.read_bytes() == changed
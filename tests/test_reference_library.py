@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+QtCore = pytest.importorskip('PyQt6.QtCore')
+
+from threads.file_deduplication_thread import SCAN_MODE_REFERENCE, FileScanThread, ReferenceLibraryThread
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / 'appdata'))
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    library = tmp_path / 'library'
+    incoming = tmp_path / 'card'
+    library.mkdir()
+    incoming.mkdir()
+    content = os.urandom(64 * 1024)
+    (library / 'a.jpg').write_bytes(content)
+    (incoming / 'a.jpg').write_bytes(content)
+    ReferenceLibraryThread([str(library)]).run()
+    yield library, incoming
+    del app
+
+
+def _scan(folder):
+    thread = FileScanThread([str(folder)], scan_mode=SCAN_MODE_REFERENCE)
+    results = []
+    thread.scan_completed.connect(results.append)
+    thread.run()
+    return results[0] if results else []
+
+
+def test_library_file_edited_after_indexing_is_not_matched(folders):
+    library, incoming = folders
+    assert len(_scan(incoming)) == 1
+
+    # 同样大小、不同内容，索引里仍是修改前的 stat
+    (library / 'a.jpg').write_bytes(os.urandom(64 * 1024))
+    assert _scan(incoming) == []
+
+
+def test_library_file_deleted_after_indexing_is_not_matched(folders):
+    library, incoming = folders
+    assert len(_scan(incoming)) == 1
+
+    (library / 'a.jpg').unlink()
+    assert _scan(incoming) == []
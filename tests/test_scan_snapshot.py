@@ -0,0 +1,37 @@
+import os
+
+from core.scan_snapshot import ScanSnapshot
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_reused_directory_reports_file_overwritten_in_place(tmp_path):
+    folder = tmp_path / 'photos'
+    (folder / 'a').mkdir(parents=True)
+    (folder / 'b').mkdir()
+    _write(folder / 'a' / 'x.jpg', b'x' * 4096)
+    _write(folder / 'b' / 'y.jpg', b'y' * 1024)
+    # 目录 mtime 放到竞态窗口之外，下一次扫描才会沿用快照
+    for path in (folder, folder / 'a', folder / 'b'):
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+
+    db_path = str(tmp_path / 'snapshot.db')
+    snapshot = ScanSnapshot(db_path)
+    first = {record.path: record.size for record in snapshot.iter_file_records(str(folder))}
+    snapshot.close()
+    assert first[str(folder / 'b' / 'y.jpg')] == 1024
+
+    # 原地覆盖文件，所在目录的 mtime 不变
+    _write(folder / 'b' / 'y.jpg', b'x' * 4096)
+    os.utime(folder / 'b', ns=(1_000_000_000, 1_000_000_000))
+
+    for _ in range(2):
+        snapshot = ScanSnapshot(db_path)
+        records = {record.path: record.size for record in snapshot.iter_file_records(str(folder))}
+        snapshot.close()
+        assert snapshot.listed_dirs == 0
+        assert records[str(folder / 'b' / 'y.jpg')] == 4096
+        assert records[str(folder / 'a' / 'x.jpg')] == 4096
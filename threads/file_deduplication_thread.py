@@ -1,18 +1,56 @@
 import os
-import hashlib
 import logging
+import struct
+import tempfile
 import time
 import threading
 from datetime import datetime
 from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from PyQt6 import QtCore
 
+from core.common import format_file_size
+from core.hash_algorithms import (DEFAULT_FILTER_ALGORITHM, DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS, empty_digest,
+                                  get_hash_algorithm, new_hasher)
+from core.hash_engine import DEFAULT_BUFFER_SIZE, DEFAULT_MEMORY_LIMIT, HashEngine
+from core.external_sort import DEFAULT_SPILL_MEMORY_BUDGET, EMPTY_DIGEST, SortedRunWriter, SpilledFileStore
+from core.archive_members import (ARCHIVE_ERRORS, archive_member_path, is_archive_member_path, is_member_archive,
+                                   is_virtual_path, iter_archive_members, open_archive_member,
+                                   split_archive_member_path)
+from core.byte_compare import MAX_COMPARE_GROUP_SIZE, compare_files
+from core.directory_digest import IGNORED_FILE, NO_COPY, collapse_file_groups, find_duplicate_directories
+from core.file_links import replace_with_hardlink, replace_with_reflink
+from core.fingerprint_manifest import (ManifestWriter, iter_manifest_entries, manifest_display_path,
+                                       read_manifest_header)
+from core.file_records import FileRecord, iter_file_records
+from core.hash_index import HashIndex, HashIndexWriter
+from core.quarantine import Quarantine
+from core.reference_library import ReferenceLibrary
+from core.scan_snapshot import ScanSnapshot
+from core.scan_table import DIGEST_SIZE, ScanTable, digest_bytes
+from core.tree_hash import (TREE_HASH_MIN_SIZE, TREE_SEGMENT_SIZE, combine_segment_digests, decode_segment_digests,
+                             encode_segment_digests, segment_index_kind, segment_ranges)
+from core.keep_policy import (ATTRIBUTE_MTIME, ATTRIBUTE_RESOLUTION, KeepPolicy, count_exif_tags,
+                              read_image_resolution)
+from core.io_limits import AdaptiveIOPool
+from core.payload_hash import PAYLOAD_HASH_EXTENSIONS, get_payload_ranges, payload_size
+from core.perceptual_hash import (DEFAULT_HASH_SIZE, DEFAULT_SIMILARITY_THRESHOLD, PERCEPTUAL_HASH_EXTENSIONS,
+                                  compute_dhash, format_perceptual_hash, group_similar_hashes)
+
 logger = logging.getLogger(__name__)
 
 SMALL_FILE_THRESHOLD = 100 * 1024 * 1024
-MAX_FILE_SIZE_TO_SCAN = 10 * 1024 * 1024 * 1024
 MAX_CACHE_SIZE = 10000
+PARTIAL_HASH_BLOCK_SIZE = 64 * 1024
+PARTIAL_HASH_MIN_SIZE = 16 * PARTIAL_HASH_BLOCK_SIZE
+PAYLOAD_SIZE_INDEX_KIND = 'payload_size'
+QUICK_SAMPLE_BLOCKS = 16
+QUICK_SAMPLE_BLOCK_SIZE = 64 * 1024
+EXTERNAL_HASH_BATCH_SIZE = 4096
+KEEP_ATTRIBUTE_BATCH_SIZE = 16384
+KEEP_ATTRIBUTE_CHUNK_SIZE = 256
+PERCEPTUAL_HASH_INDEX_KIND = f"dhash{DEFAULT_HASH_SIZE}"
 
 class LRUCache:
     def __init__(self, max_size=MAX_CACHE_SIZE):
@@ -43,19 +81,77 @@ class LRUCache:
         with self._lock:
             self._cache.clear()
 
+SCAN_MODE_EXACT = 'exact'
+SCAN_MODE_SIMILAR = 'similar'
+SCAN_MODE_REFERENCE = 'reference'
+SCAN_MODE_PAYLOAD = 'payload'
+SCAN_MODE_MANIFEST = 'manifest'
+SCAN_MODE_QUICK = 'quick'
+
+DEDUP_ACTION_DELETE = 'delete'
+DEDUP_ACTION_HARDLINK = 'hardlink'
+DEDUP_ACTION_REFLINK = 'reflink'
+DEDUP_ACTION_NAMES = {
+    DEDUP_ACTION_DELETE: '移到回收站',
+    DEDUP_ACTION_HARDLINK: '硬链接替换',
+    DEDUP_ACTION_REFLINK: 'reflink替换',
+}
+
+def partial_read_size(record):
+    return min(record.size, 3 * PARTIAL_HASH_BLOCK_SIZE)
+
+def wasted_bytes(records):
+    return sum(record.size for record in records) - max(record.size for record in records)
+
 class FileScanThread(QtCore.QThread):
     
     progress_updated = QtCore.pyqtSignal(int, str)
     scan_completed = QtCore.pyqtSignal(list)
+    group_found = QtCore.pyqtSignal(list, object)
+    # (重复目录组, 最终结果中每组的可释放字节数)
+    directory_groups_found = QtCore.pyqtSignal(list, dict)
+    scan_summary = QtCore.pyqtSignal(dict)
     error_occurred = QtCore.pyqtSignal(str)
     
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, hash_algorithm=DEFAULT_HASH_ALGORITHM, filter_algorithm=DEFAULT_FILTER_ALGORITHM,
+                 buffer_size=DEFAULT_BUFFER_SIZE, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 scan_mode=SCAN_MODE_EXACT, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, incremental=True,
+                 spill_to_disk=False, spill_memory_budget=DEFAULT_SPILL_MEMORY_BUDGET, manifest_paths=(),
+                 scan_archives=False):
         super().__init__()
         self.folder_path = folder_path
+        self.scan_mode = scan_mode
+        self.similarity_threshold = similarity_threshold
+        self.hash_algorithm = get_hash_algorithm(hash_algorithm).name
+        self.filter_algorithm = get_hash_algorithm(filter_algorithm, DEFAULT_FILTER_ALGORITHM).name
         self._stop_flag = False
         self._file_cache = LRUCache(MAX_CACHE_SIZE)
-        self._thread_pool = None
-        self._max_workers = min(4, os.cpu_count() or 2)
+        self._hash_index = HashIndex()
+        self.spill_to_disk = spill_to_disk and scan_mode == SCAN_MODE_EXACT
+        self.spill_memory_budget = spill_memory_budget
+        self.manifest_paths = list(manifest_paths)
+        self._scan_roots = []
+        # 压缩包成员只在内存中的精确模式里参与比较
+        self.scan_archives = scan_archives and scan_mode == SCAN_MODE_EXACT and not self.spill_to_disk
+        self._archive_member_indices = []
+        # 含有未扫描条目（隐藏文件、空文件等）的目录，不参与重复目录判定
+        self._incomplete_dirs = set()
+        # 低内存模式边遍历边写盘，不加载整棵目录树的快照
+        self._scan_snapshot = ScanSnapshot() if incremental and not self.spill_to_disk else None
+        self._tree_hash_locks = {}
+        self._hash_engine = HashEngine(buffer_size, mmap_threshold=SMALL_FILE_THRESHOLD)
+        # 线程数按内存预算分配：分段池的线程只有一份哈希缓冲区，主线程池的线程还有一组
+        # 同样大小的逐字节比较缓冲区，各算两份；预算只够一个缓冲区时不建分段池，大文件的分段
+        # 在当前线程依次计算，放不下比较缓冲区时不做逐字节比较，直接计算哈希
+        buffer_budget = self._hash_engine.max_workers_for(memory_limit)
+        thread_limit = min(16, (os.cpu_count() or 2) * 2)
+        segment_workers = min(thread_limit, buffer_budget // 3)
+        self._max_workers = min(thread_limit, max(1, (buffer_budget - segment_workers) // 2))
+        self._byte_compare_fits = self._max_workers * 2 + segment_workers <= buffer_budget
+        self._io_pool = AdaptiveIOPool("去重扫描", self._max_workers, thread_name_prefix='dedup-hash')
+        self._segment_pool = (AdaptiveIOPool("分段哈希", segment_workers, thread_name_prefix='dedup-segment')
+                              if segment_workers else None)
+        self._progress_lock = threading.Lock()
         self._last_progress_time = 0
         self._progress_update_interval = 0.5
         self._total_files = 0
@@ -63,53 +159,47 @@ class FileScanThread(QtCore.QThread):
     def stop(self):
         self._stop_flag = True
     
-    def _calculate_md5(self, file_path, block_size=8192*16):
+    @property
+    def _payload_index_kind(self):
+        return f"payload:{self.hash_algorithm}"
+    
+    @property
+    def _partial_index_kind(self):
+        return f"partial:{self.filter_algorithm}"
+    
+    @property
+    def _sample_index_kind(self):
+        return f"sample:{self.filter_algorithm}:{QUICK_SAMPLE_BLOCKS}x{QUICK_SAMPLE_BLOCK_SIZE}"
+    
+    def _calculate_hash(self, record):
+        file_path = record.path
         cached = self._file_cache.get(file_path)
-        if cached:
-            try:
-                current_stat = os.stat(file_path)
-                if (current_stat.st_size == cached['size'] and 
-                    abs(current_stat.st_mtime - cached['mtime']) < 0.1):
-                    return cached['hash']
-            except (OSError, IOError) as e:
-                logger.warning(f"检查文件缓存状态失败: {str(e)}")
+        if (cached and cached['algorithm'] == self.hash_algorithm and
+                cached['size'] == record.size and cached['mtime_ns'] == record.mtime_ns):
+            return cached['hash']
         
         try:
-            file_stat = os.stat(file_path)
-            file_size = file_stat.st_size
-            file_mtime = file_stat.st_mtime
-            
-            if file_size > 2 * 1024 * 1024 * 1024:
-                logger.warning(f"文件过大，跳过MD5计算: {file_path} ({file_size} bytes)")
-                return None
-            
-            if file_size == 0:
-                empty_hash = "d41d8cd98f00b204e9800998ecf8427e"
-                self._file_cache.set(file_path, {
-                    'hash': empty_hash,
-                    'size': file_size,
-                    'mtime': file_mtime
-                })
-                return empty_hash
-            
-            if file_size < SMALL_FILE_THRESHOLD:
-                try:
-                    with open(file_path, 'rb') as f:
-                        content = f.read()
-                    if self._stop_flag:
-                        return None
-                    file_hash = hashlib.md5(content).hexdigest()
-                except MemoryError:
-                    logger.warning(f"小文件一次性读取内存不足，回退到分块读取: {file_path}")
-                    return self._calculate_md5_chunked(file_path, file_size, file_mtime, block_size)
+            if record.size == 0:
+                file_hash = empty_digest(self.hash_algorithm)
+            elif is_archive_member_path(file_path):
+                file_hash = self._calculate_member_hash(record)
+                if file_hash is None:
+                    return None
+            elif record.size > TREE_HASH_MIN_SIZE:
+                file_hash = self._calculate_tree_hash(record)
+                if file_hash is None:
+                    return None
             else:
-                return self._calculate_md5_chunked(file_path, file_size, file_mtime, block_size)
+                file_name = os.path.basename(file_path)
+                file_hash = self._hash_engine.hash_file(
+                    file_path, self.hash_algorithm, record.size,
+                    stop_check=lambda: self._stop_flag,
+                    progress_callback=lambda progress: self._safe_progress_update(progress, f"正在计算哈希: {file_name}")
+                )
+                if file_hash is None:
+                    return None
             
-            self._file_cache.set(file_path, {
-                'hash': file_hash,
-                'size': file_size,
-                'mtime': file_mtime
-            })
+            self._cache_hash(record, file_hash)
             
             return file_hash
         except FileNotFoundError:
@@ -123,50 +213,108 @@ class FileScanThread(QtCore.QThread):
                 logger.warning(f"文件名编码问题，跳过文件: {file_path}")
                 return None
             else:
-                logger.error(f"计算文件{file_path}的MD5值失败: {str(e)}")
+                logger.error(f"计算文件{file_path}的哈希值失败: {str(e)}")
                 return None
     
-    def _calculate_md5_chunked(self, file_path, file_size, file_mtime, block_size):
+    def _calculate_member_hash(self, record):
+        # 成员在内存中流式解压计算哈希，不落地临时文件
+        archive_path, member_name = split_archive_member_path(record.path)
+        hasher = new_hasher(self.hash_algorithm)
+        buffer = bytearray(self._hash_engine.buffer_size)
         try:
-            md5_hash = hashlib.md5()
-            with open(file_path, 'rb') as f:
-                bytes_read = 0
+            with open_archive_member(archive_path, member_name) as member_file:
                 while True:
                     if self._stop_flag:
                         return None
-                    
-                    chunk = f.read(block_size)
-                    if not chunk:
+                    count = member_file.readinto(buffer)
+                    if not count:
                         break
-                    
-                    md5_hash.update(chunk)
-                    bytes_read += len(chunk)
-                    
-                    if bytes_read % (100 * 1024 * 1024) < block_size:
-                        progress = min(100, int((bytes_read / file_size) * 100))
-                        self.progress_updated.emit(progress, f"正在计算MD5: {os.path.basename(file_path)}")
-            
-            file_hash = md5_hash.hexdigest()
-            
-            self._file_cache.set(file_path, {
-                'hash': file_hash,
-                'size': file_size,
-                'mtime': file_mtime
-            })
-            
-            return file_hash
-        except OSError as e:
-            if e.errno == 22:
-                logger.warning(f"文件名编码问题，跳过文件: {file_path}")
+                    hasher.update(memoryview(buffer)[:count])
+        except ARCHIVE_ERRORS as e:
+            logger.warning(f"无法读取压缩包成员: {record.path} ({str(e)})")
+            return None
+        return hasher.hexdigest()
+    
+    def _tree_hash_lock(self, dev):
+        with self._progress_lock:
+            return self._tree_hash_locks.setdefault(dev, threading.Lock())
+    
+    def _calculate_tree_hash(self, record):
+        # 大文件切成固定大小的段，在不同偏移上并发读取；各段摘要写入索引，中途停止后下次只补算缺失的段
+        file_name = os.path.basename(record.path)
+        ranges = segment_ranges(record.size)
+        index_kind = segment_index_kind(self.hash_algorithm)
+        cached = self._hash_index.lookup_many([record.stat_key], index_kind).get(record.path)
+        digests = decode_segment_digests(cached, len(ranges))
+        pending = [i for i, digest in enumerate(digests) if digest is None]
+        
+        done_bytes = [record.size - sum(ranges[i][1] for i in pending)]
+        done_lock = threading.Lock()
+        
+        def on_bytes(count):
+            with done_lock:
+                done_bytes[0] += count
+                done = done_bytes[0]
+            self._safe_progress_update(int(done / record.size * 100),
+                                       f"正在分段计算哈希: {file_name} "
+                                       f"({format_file_size(done)}/{format_file_size(record.size)})")
+        
+        def hash_segment(i):
+            offset, length = ranges[i]
+            return self._hash_engine.hash_segment(record.path, self.hash_algorithm, offset, length,
+                                                  stop_check=lambda: self._stop_flag, bytes_callback=on_bytes)
+        
+        # 同一设备上一次只分段哈希一个大文件，段并发数由设备的调节器按实测吞吐决定
+        start_time = time.time()
+        with self._tree_hash_lock(record.dev):
+            if self._segment_pool is not None:
+                results = self._segment_pool.map(pending, hash_segment, lambda i: (record.dev, record.path),
+                                                 lambda i: ranges[i][1], stop_check=lambda: self._stop_flag)
             else:
-                logger.error(f"分块计算文件{file_path}的MD5值失败: {str(e)}")
+                results = ((i, hash_segment(i), None) for i in pending)
+            try:
+                for i, digest, error in results:
+                    if error is not None:
+                        raise error
+                    digests[i] = digest
+            finally:
+                if pending:
+                    self._hash_index.upsert_many([(record.stat_key, encode_segment_digests(digests))], index_kind)
+        
+        if None in digests:
             return None
+        
+        elapsed = time.time() - start_time
+        hashed_bytes = sum(ranges[i][1] for i in pending)
+        if hashed_bytes:
+            logger.info(f"分段哈希完成: {record.path} ({len(pending)}/{len(ranges)} 段, "
+                        f"{hashed_bytes / max(elapsed, 1e-6) / 1024 / 1024:.1f} MB/s)")
+        return combine_segment_digests(self.hash_algorithm, record.size, digests)
+    
+    def _cache_hash(self, record, file_hash):
+        self._file_cache.set(record.path, {
+            'hash': file_hash,
+            'algorithm': self.hash_algorithm,
+            'size': record.size,
+            'mtime_ns': record.mtime_ns
+        })
     
     def _safe_progress_update(self, progress, status_text):
         current_time = time.time()
-        if current_time - self._last_progress_time >= self._progress_update_interval:
-            self.progress_updated.emit(progress, status_text)
+        with self._progress_lock:
+            if current_time - self._last_progress_time < self._progress_update_interval:
+                return
             self._last_progress_time = current_time
+        self.progress_updated.emit(progress, status_text)
+    
+    def _iter_parallel(self, records, func, read_size=None):
+        # read_size 给出每个任务实际读取的字节数，调节器据此计算吞吐
+        results = self._io_pool.map(records, func, lambda record: (record.dev, record.path),
+                                    read_size or (lambda record: record.size), stop_check=lambda: self._stop_flag)
+        for record, result, error in results:
+            if error is not None:
+                logger.error(f"处理文件{record.path}时出错: {str(error)}")
+            yield record, result
     
     def run(self):
         try:
@@ -194,37 +342,62 @@ class FileScanThread(QtCore.QThread):
                 
                 valid_folders.append(folder)
             
+            self._scan_roots = valid_folders
             if not valid_folders:
                 logger.warning("没有有效的文件夹")
                 self.error_occurred.emit("没有有效的文件夹")
                 self.scan_completed.emit([])
                 return
             
-            all_files = []
-            self._total_files = 0
+            if self.spill_to_disk:
+                duplicate_groups = self._find_duplicates_external(valid_folders)
+                if self._stop_flag:
+                    return
+                
+                self.progress_updated.emit(100, "扫描完成")
+                self.scan_completed.emit(duplicate_groups)
+                return
+            
+            scan_table = ScanTable()
             for folder in valid_folders:
                 if self._stop_flag:
                     break
                 
-                folder_files = self._collect_files(folder)
-                all_files.extend(folder_files)
-                self._total_files += len(folder_files)
+                first_index = len(scan_table)
+                self._collect_files(folder, scan_table)
+                if not self._stop_flag:
+                    self._hash_index.prune_missing(
+                        folder, {scan_table.path(index) for index in range(first_index, len(scan_table))})
                 
                 self.progress_updated.emit(10, f"已扫描文件夹: {os.path.basename(folder)}")
             
-            if not all_files:
+            self._total_files = len(scan_table)
+            if not self._total_files:
                 logger.warning("没有找到任何文件")
                 self.scan_completed.emit([])
                 return
             
+            indices = self._collapse_same_inode(scan_table)
+            
             if self._total_files > 50000:
                 self._progress_update_interval = 1.0
             elif self._total_files > 10000:
                 self._progress_update_interval = 0.5
             
-            self.progress_updated.emit(30, f"开始分析 {len(all_files)} 个文件")
+            self.progress_updated.emit(30, f"开始分析 {len(indices)} 个文件")
             
-            duplicate_groups = self._find_duplicates(all_files)
+            if self.scan_mode == SCAN_MODE_SIMILAR:
+                duplicate_groups = self._find_similar_images(scan_table, indices)
+            elif self.scan_mode == SCAN_MODE_PAYLOAD:
+                duplicate_groups = self._find_payload_duplicates(scan_table, indices)
+            elif self.scan_mode == SCAN_MODE_REFERENCE:
+                duplicate_groups = self._find_in_reference_library(scan_table.records(indices))
+            elif self.scan_mode == SCAN_MODE_MANIFEST:
+                duplicate_groups = self._find_in_manifests(scan_table, indices)
+            elif self.scan_mode == SCAN_MODE_QUICK:
+                duplicate_groups = self._find_quick_duplicates(scan_table, indices)
+            else:
+                duplicate_groups = self._find_duplicates(scan_table, indices)
             
             if self._stop_flag:
                 return
@@ -234,217 +407,1420 @@ class FileScanThread(QtCore.QThread):
             
         except MemoryError as e:
             logger.error(f"内存不足: {str(e)}")
-            self.error_occurred.emit(f"内存不足，请尝试扫描更小的文件夹")
+            self.error_occurred.emit("内存不足，请开启低内存模式或尝试扫描更小的文件夹")
         except Exception as e:
             logger.error(f"扫描线程运行出错: {str(e)}")
             self.error_occurred.emit(f"扫描线程运行出错: {str(e)}")
+        finally:
+            self._hash_index.close()
+            if self._scan_snapshot is not None:
+                self._scan_snapshot.close()
     
-    def _collect_files(self, folder):
-        files = []
-        file_count = 0
+    def _collect_files(self, folder, scan_table):
+        collected = 0
+        walk = self._scan_snapshot.iter_file_records if self._scan_snapshot is not None else iter_file_records
         
         try:
-            for root, dirs, filenames in os.walk(folder):
+            for record in walk(folder, stop_check=lambda: self._stop_flag, incomplete_dirs=self._incomplete_dirs):
                 if self._stop_flag:
                     break
                 
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['System Volume Information', '$RECYCLE.BIN', 'RECYCLER']]
+                if record.size == 0:
+                    self._incomplete_dirs.add(os.path.dirname(record.path))
+                    continue
                 
-                for filename in filenames:
-                    if self._stop_flag:
-                        break
-                    
-                    if filename.startswith('.') or filename.startswith('~'):
-                        continue
-                    
-                    file_path = os.path.join(root, filename)
-                                        
-                    try:
-                        file_size = os.path.getsize(file_path)
-                        if file_size == 0:
-                            continue
-                        if file_size > MAX_FILE_SIZE_TO_SCAN:
-                            continue
-                    except (OSError, IOError, PermissionError) as e:
-                        continue
-                    
-                    files.append(file_path)
-                    file_count += 1
-                    
-                    if file_count % 500 == 0:
-                        self.progress_updated.emit(5, f"已收集 {file_count} 个文件")
+                scan_table.append(record)
+                collected += 1
+                if self.scan_archives and is_member_archive(record.path):
+                    self._collect_archive_members(record, scan_table)
+                
+                if collected % 500 == 0:
+                    self.progress_updated.emit(5, f"已收集 {len(scan_table)} 个文件")
         
         except Exception as e:
             logger.error(f"收集文件时出错: {str(e)}")
         
-        return files
+        if self._scan_snapshot is not None:
+            logger.info(f"增量扫描 {folder}: 重新列出 {self._scan_snapshot.listed_dirs} 个目录, "
+                        f"沿用快照 {self._scan_snapshot.reused_dirs} 个目录")
+        
+        return collected
+    
+    def _collect_archive_members(self, archive_record, scan_table):
+        # 只读中央目录或成员头得到大小，成员和普通文件一起按大小筛选，只有大小撞上的成员才会被解压
+        try:
+            for member_name, member_size in iter_archive_members(archive_record.path):
+                if member_size == 0:
+                    continue
+                # 成员记录沿用压缩包的设备号和修改时间，压缩包变化后索引里的成员摘要随之失效
+                member = FileRecord(archive_member_path(archive_record.path, member_name), member_size,
+                                    archive_record.mtime_ns, archive_record.dev, 0)
+                self._archive_member_indices.append(scan_table.append(member))
+        except ARCHIVE_ERRORS as e:
+            logger.warning(f"无法读取压缩包成员列表: {archive_record.path} ({str(e)})")
+    
+    def _archive_member_mask(self, scan_table):
+        mask = np.zeros(len(scan_table), dtype=bool)
+        mask[np.array(self._archive_member_indices, dtype=np.int64)] = True
+        return mask
+    
+    def _records_with_extensions(self, scan_table, indices, extensions):
+        return [scan_table.record(index) for index in indices
+                if os.path.splitext(scan_table.name(index))[1].lower() in extensions]
+    
+    def _collapse_same_inode(self, scan_table):
+        indices = scan_table.unique_inode_indices()
+        alias_count = len(scan_table) - len(indices)
+        if alias_count:
+            logger.info(f"跳过 {alias_count} 个指向同一文件的路径（硬链接或重复选择的文件夹）")
+        return indices
+    
+    def _calculate_partial_hash(self, record, block_size=PARTIAL_HASH_BLOCK_SIZE):
+        file_size = record.size
+        ranges = [(0, block_size), ((file_size - block_size) // 2, block_size), (file_size - block_size, block_size)]
+        try:
+            return self._hash_engine.hash_ranges(record.path, self.filter_algorithm, ranges,
+                                                 prefix=str(file_size).encode('ascii'))
+        except OSError as e:
+            logger.warning(f"计算文件{record.path}的部分哈希失败: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _sample_ranges(file_size):
+        # 首尾各一块，中间均匀分布；文件不比抽样总量大时直接读完整个文件
+        if file_size <= QUICK_SAMPLE_BLOCKS * QUICK_SAMPLE_BLOCK_SIZE:
+            return [(0, file_size)]
+        step = (file_size - QUICK_SAMPLE_BLOCK_SIZE) // (QUICK_SAMPLE_BLOCKS - 1)
+        return [(i * step, QUICK_SAMPLE_BLOCK_SIZE) for i in range(QUICK_SAMPLE_BLOCKS)]
+    
+    def _calculate_sampled_hash(self, record):
+        try:
+            return self._hash_engine.hash_ranges(record.path, self.filter_algorithm, self._sample_ranges(record.size),
+                                                 prefix=str(record.size).encode('ascii'))
+        except OSError as e:
+            logger.warning(f"计算文件{record.path}的抽样指纹失败: {str(e)}")
+            return None
+    
+    def _find_quick_duplicates(self, scan_table, indices):
+        total_files = len(indices)
+        self._skipped_files = 0
+        self._reset_read_stats()
+        
+        candidate_groups, _ = scan_table.group_indices(indices)
+        if self._stop_flag:
+            return []
+        
+        candidate_bytes = int(sum(scan_table.sizes[group].sum() for group in candidate_groups))
+        self.progress_updated.emit(40, f"快速指纹: 需要抽样的文件数 "
+                                       f"{sum(len(group) for group in candidate_groups)} (总文件数: {total_files})")
+        
+        # 只比较大小和若干抽样块，结果没有经过完整哈希确认，界面上标记为未验证
+        duplicate_groups = self._group_by_full_hash(
+            [scan_table.records(group) for group in candidate_groups],
+            hash_func=self._calculate_sampled_hash,
+            index_kind=self._sample_index_kind,
+            read_size=lambda record: sum(length for _, length in self._sample_ranges(record.size))
+        )
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        if self._skipped_files > 0:
+            logger.warning(f"扫描过程中跳过了 {self._skipped_files} 个文件")
+        
+        sampled_bytes = self._read_stats['full_read']
+        logger.info(f"快速指纹: 抽样读取 {format_file_size(sampled_bytes)}, 完整哈希需要读取 "
+                    f"{format_file_size(candidate_bytes)} ({sampled_bytes / max(candidate_bytes, 1) * 100:.2f}%), "
+                    f"哈希索引避免读取 {format_file_size(self._read_stats['index_skipped'])}")
+        
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        self._emit_summary(total_files, duplicate_groups)
+        
+        return [[record.path for record in records] for records in duplicate_groups]
     
-    def _find_duplicates(self, all_files):
-        file_hashes = {}
-        total_files = len(all_files)
-        skipped_files = 0
-        last_progress_update = 0
+    def _find_duplicates(self, scan_table, indices):
+        total_files = len(indices)
+        self._skipped_files = 0
+        self._reset_read_stats()
         
-        size_groups = {}
-        for file_path in all_files:
+        # 大小分组在数组上排序完成，只有候选组里的文件才会还原成完整路径
+        candidate_groups, single_bytes = scan_table.group_indices(indices)
+        self._read_stats['size_skipped'] += single_bytes
+        if self._stop_flag:
+            return []
+        
+        potential_duplicates = sum(len(group) for group in candidate_groups)
+        if potential_duplicates > 0:
+            self.progress_updated.emit(40, f"文件大小分析完成: 候选文件组={len(candidate_groups)}, 潜在重复文件={potential_duplicates}")
+        
+        candidate_groups = self._filter_by_partial_hash(scan_table, candidate_groups)
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        filtered_count = sum(len(group) for group in candidate_groups)
+        
+        self.progress_updated.emit(50, f"优化后需要计算完整哈希的文件数: {filtered_count} (总文件数: {total_files})")
+        
+        accept_group = self._accept_archive_group if self._archive_member_indices else None
+        duplicate_groups = self._group_by_full_hash([scan_table.records(group) for group in candidate_groups],
+                                                    accept_group=accept_group)
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        if self._archive_member_indices:
+            logger.info(f"压缩包成员: 共 {len(self._archive_member_indices)} 个, "
+                        f"与 {sum(1 for records in duplicate_groups if is_archive_member_path(records[0].path))} "
+                        f"组磁盘文件内容相同")
+        
+        if self._skipped_files > 0:
+            logger.warning(f"扫描过程中跳过了 {self._skipped_files} 个文件")
+        
+        self._log_read_stats()
+        
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        self._emit_summary(total_files, duplicate_groups)
+        
+        return self._group_directories(scan_table, duplicate_groups)
+    
+    def _accept_archive_group(self, records):
+        # 压缩包成员无法单独删除，只作为已有备份的证据：保留一个成员放在组首作为保留项，
+        # 只有成员没有磁盘文件的组不列出
+        files = [record for record in records if not is_archive_member_path(record.path)]
+        if not files:
+            return None
+        if len(files) == len(records):
+            return records
+        return [next(record for record in records if is_archive_member_path(record.path))] + files
+    
+    def _group_directories(self, scan_table, duplicate_groups):
+        # 只用已经确认的文件分组自底向上计算目录摘要，不再读取任何文件内容
+        start_time = time.time()
+        tokens_by_inode = {}
+        tokens_by_path = {}
+        for token, records in enumerate(duplicate_groups):
+            for record in records:
+                if record.ino:
+                    tokens_by_inode[(record.dev, record.ino)] = token
+                else:
+                    tokens_by_path[record.path] = token
+        
+        # 按 inode 对应，被合并掉的硬链接别名也能拿到所属的重复组
+        file_tokens = np.fromiter((tokens_by_inode.get(key, NO_COPY)
+                                   for key in zip(scan_table.devs.tolist(), scan_table.inos.tolist())),
+                                  dtype=np.int64, count=len(scan_table))
+        for index in np.flatnonzero(scan_table.inos == 0).tolist():
+            file_tokens[index] = tokens_by_path.get(scan_table.path(index), NO_COPY)
+        if self._archive_member_indices:
+            file_tokens[self._archive_member_mask(scan_table)] = IGNORED_FILE
+        
+        directory_groups = find_duplicate_directories(scan_table, file_tokens, self._scan_roots,
+                                                      incomplete_dirs=self._incomplete_dirs)
+        file_groups = [[record.path for record in records] for records in duplicate_groups]
+        if not directory_groups:
+            return file_groups
+        
+        collapsed = collapse_file_groups(file_groups, directory_groups)
+        result = [group.paths for group in directory_groups]
+        wasted = {group.paths[0]: group.size * (len(group.paths) - 1) for group in directory_groups}
+        for group_index, group in collapsed:
+            result.append(group)
+            wasted[group[0]] = duplicate_groups[group_index][0].size * (len(group) - 1)
+        
+        logger.info(f"重复目录: {len(directory_groups)} 组, 合并了 "
+                    f"{sum(group.file_count * (len(group.paths) - 1) for group in directory_groups)} 个文件级副本, "
+                    f"文件级结果 {len(file_groups)} 组 -> {len(collapsed)} 组, 耗时 {time.time() - start_time:.2f} 秒")
+        self.directory_groups_found.emit(result[:len(directory_groups)], wasted)
+        return result
+    
+    def _find_duplicates_external(self, folders):
+        self._skipped_files = 0
+        self._reset_read_stats()
+        
+        with tempfile.TemporaryDirectory(prefix='leafsort-dedup-') as work_dir:
+            # 缓冲区总量按预算分给三组有序段，超出部分排序后写成临时文件
+            run_buffer = self.spill_memory_budget // 4
+            file_store = SpilledFileStore(work_dir)
+            size_runs = SortedRunWriter(work_dir, 'size', run_buffer)
+            partial_runs = SortedRunWriter(work_dir, 'partial', run_buffer)
+            full_runs = SortedRunWriter(work_dir, 'full', run_buffer)
+            try:
+                return self._run_external_stages(folders, file_store, size_runs, partial_runs, full_runs)
+            finally:
+                file_store.close()
+                for runs in (size_runs, partial_runs, full_runs):
+                    runs.close()
+    
+    def _run_external_stages(self, folders, file_store, size_runs, partial_runs, full_runs):
+        for folder in folders:
+            for record in iter_file_records(folder, stop_check=lambda: self._stop_flag):
+                if record.size == 0:
+                    continue
+                size_runs.add(record.size, EMPTY_DIGEST, file_store.append(record))
+                if len(file_store) % 5000 == 0:
+                    self.progress_updated.emit(5, f"已收集 {len(file_store)} 个文件")
             if self._stop_flag:
+                self.error_occurred.emit("扫描已停止")
                 return []
+            self.progress_updated.emit(10, f"已扫描文件夹: {os.path.basename(folder)}")
+        
+        file_store.finish()
+        self._total_files = len(file_store)
+        if not self._total_files:
+            logger.warning("没有找到任何文件")
+            return []
+        
+        if self._total_files > 50000:
+            self._progress_update_interval = 1.0
+        logger.info(f"低内存模式: 已将 {self._total_files} 个文件写入临时文件, 大小排序段 {len(size_runs.run_paths)} 个")
+        self.progress_updated.emit(30, f"开始分析 {self._total_files} 个文件")
+        
+        partial_pending = []
+        full_pending = []
+        alias_count = 0
+        for size, _, file_ids in size_runs.iter_groups():
+            if self._stop_flag:
+                break
+            if len(file_ids) == 1:
+                self._read_stats['size_skipped'] += size
+                continue
             
-            try:
-                file_size = os.path.getsize(file_path)
-                if file_size in size_groups:
-                    size_groups[file_size].append(file_path)
-                else:
-                    size_groups[file_size] = [file_path]
-            except Exception as e:
-                skipped_files += 1
-                logger.warning(f"获取文件大小失败 {file_path}: {str(e)}")
-        
-        single_files = 0
-        potential_duplicates = 0
-        for size, files in size_groups.items():
-            if len(files) == 1:
-                single_files += 1
+            records = self._unique_inode_records(file_store, file_ids)
+            alias_count += len(file_ids) - len(records)
+            if len(records) < 2:
+                continue
+            if size >= PARTIAL_HASH_MIN_SIZE:
+                partial_pending.extend(records)
+                if len(partial_pending) >= EXTERNAL_HASH_BATCH_SIZE:
+                    self._spill_digests(partial_pending, partial_runs, full=False)
             else:
-                potential_duplicates += len(files)
+                full_pending.extend(records)
+                if len(full_pending) >= EXTERNAL_HASH_BATCH_SIZE:
+                    self._spill_digests(full_pending, full_runs, full=True)
+        self._spill_digests(partial_pending, partial_runs, full=False)
+        if alias_count:
+            logger.info(f"跳过 {alias_count} 个指向同一文件的路径（硬链接或重复选择的文件夹）")
         
-        if potential_duplicates > 0:
-            self.progress_updated.emit(40, f"文件大小分析完成: 总文件组={len(size_groups)}, 潜在重复文件={potential_duplicates}")
-        
-        filtered_files = []
-        for size, files in size_groups.items():
-            if len(files) > 1:
-                filtered_files.extend(files)
+        self.progress_updated.emit(50, f"预筛选完成, 正在合并 {partial_runs.record_count} 条部分哈希记录")
+        for size, _, file_ids in partial_runs.iter_groups():
+            if self._stop_flag:
+                break
+            if len(file_ids) == 1:
+                self._read_stats['partial_skipped'] += size
+                continue
+            full_pending.extend((file_id, file_store.record(file_id)) for file_id in file_ids)
+            if len(full_pending) >= EXTERNAL_HASH_BATCH_SIZE:
+                self._spill_digests(full_pending, full_runs, full=True)
+        self._spill_digests(full_pending, full_runs, full=True)
         
-        self.progress_updated.emit(50, f"优化后需要计算MD5的文件数: {len(filtered_files)} (总文件数: {total_files})")
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
         
-        total_filtered = len(filtered_files)
-        for i, file_path in enumerate(filtered_files):
+        # 最后一轮归并时每确认一组就立即发给界面
+        self.progress_updated.emit(90, f"正在合并 {full_runs.record_count} 条完整哈希记录")
+        duplicate_groups = []
+        for _, _, file_ids in full_runs.iter_groups():
             if self._stop_flag:
                 self.error_occurred.emit("扫描已停止")
                 return []
+            if len(file_ids) > 1:
+                records = [file_store.record(file_id) for file_id in file_ids]
+                duplicate_groups.append(records)
+                self._emit_group(records)
+        
+        if self._skipped_files > 0:
+            logger.warning(f"扫描过程中跳过了 {self._skipped_files} 个文件")
+        
+        self._log_read_stats()
+        
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        self._emit_summary(self._total_files, duplicate_groups)
+        
+        return [[record.path for record in records] for records in duplicate_groups]
+    
+    @staticmethod
+    def _unique_inode_records(file_store, file_ids):
+        seen_inodes = set()
+        records = []
+        for file_id in file_ids:
+            record = file_store.record(file_id)
+            if record.ino:
+                if (record.dev, record.ino) in seen_inodes:
+                    continue
+                seen_inodes.add((record.dev, record.ino))
+            records.append((file_id, record))
+        return records
+    
+    def _spill_digests(self, pending, runs, full):
+        if not pending or self._stop_flag:
+            pending.clear()
+            return
+        
+        file_ids = {record.path: file_id for file_id, record in pending}
+        records = [record for _, record in pending]
+        pending.clear()
+        
+        digests = self._hash_records(records, full)
+        for record in records:
+            digest = digests.get(record.path)
+            if digest is None:
+                self._skipped_files += 1
+                continue
+            runs.add(record.size, digest_bytes(digest), file_ids[record.path])
+    
+    def _hash_records(self, records, full):
+        index_kind = self.hash_algorithm if full else self._partial_index_kind
+        hash_func = self._calculate_hash if full else self._calculate_partial_hash
+        digests = self._hash_index.lookup_many((record.stat_key for record in records), index_kind)
+        if full:
+            self._read_stats['index_skipped'] += sum(record.size for record in records if record.path in digests)
+        index_writer = HashIndexWriter(self._hash_index, index_kind)
+        to_hash = [record for record in records if record.path not in digests]
+        read_size = None if full else partial_read_size
+        for i, (record, digest) in enumerate(self._iter_parallel(to_hash, hash_func, read_size)):
+            self._safe_progress_update(int((i + 1) / len(to_hash) * 100),
+                                       f"正在扫描: {os.path.basename(record.path)} ({i+1}/{len(to_hash)})")
+            self._read_stats['full_read' if full else 'partial_read'] += (
+                record.size if full else 3 * PARTIAL_HASH_BLOCK_SIZE)
+            if digest is None:
+                continue
+            digests[record.path] = digest
+            index_writer.add(record.stat_key, digest)
+        index_writer.flush()
+        return digests
+    
+    def _load_manifests(self, live_sizes):
+        # 只保留本地出现过的大小，清单再大也只有这部分条目留在内存里
+        manifest_by_size = {}
+        manifest_algorithms = None
+        for manifest_path in self.manifest_paths:
+            try:
+                header = read_manifest_header(manifest_path)
+            except (OSError, EOFError, ValueError, KeyError) as e:
+                logger.error(f"读取指纹清单失败: {manifest_path}: {str(e)}")
+                self.error_occurred.emit(f"读取指纹清单失败: {os.path.basename(manifest_path)}")
+                continue
             
-            current_time = time.time()
-            if current_time - last_progress_update > self._progress_update_interval:
-                progress = int((i + 1) / total_filtered * 100)
-                self._safe_progress_update(progress, f"正在扫描: {os.path.basename(file_path)} ({i+1}/{total_filtered})")
-                last_progress_update = current_time
+            algorithms = (header.hash_algorithm, header.filter_algorithm, header.partial_block_size)
+            if header.hash_algorithm not in HASH_ALGORITHMS:
+                logger.warning(f"指纹清单 {manifest_path} 使用的哈希算法 {header.hash_algorithm} 在本机不可用，已跳过")
+                self.error_occurred.emit(f"本机不支持清单使用的哈希算法: {header.hash_algorithm}")
+                continue
+            if manifest_algorithms is None:
+                manifest_algorithms = algorithms
+            elif algorithms[0] != manifest_algorithms[0]:
+                logger.warning(f"指纹清单 {manifest_path} 使用的哈希算法 {header.hash_algorithm} 与其他清单不同，已跳过")
+                continue
             
+            # 预筛选算法或块大小不同的清单只用完整哈希比较
+            use_partial = algorithms == manifest_algorithms and header.filter_algorithm in HASH_ALGORITHMS
+            # 分段参数不同的清单，超大文件的根摘要无法和本地结果比较
+            tree_compatible = (header.tree_hash_min_size, header.tree_segment_size) == (TREE_HASH_MIN_SIZE,
+                                                                                        TREE_SEGMENT_SIZE)
             try:
-                file_hash = self._calculate_md5(file_path)
-                if self._stop_flag:
-                    return []
-                
-                if file_hash is None:
-                    skipped_files += 1
+                for entry in iter_manifest_entries(manifest_path):
+                    if entry.size > TREE_HASH_MIN_SIZE and not tree_compatible:
+                        continue
+                    if entry.size in live_sizes:
+                        if not use_partial:
+                            entry = entry._replace(partial_hash=None)
+                        manifest_by_size.setdefault(entry.size, []).append((header.label, entry))
+            except (OSError, EOFError, ValueError, KeyError) as e:
+                logger.error(f"读取指纹清单失败: {manifest_path}: {str(e)}")
+                self.error_occurred.emit(f"指纹清单已损坏: {os.path.basename(manifest_path)}")
+        return manifest_algorithms, manifest_by_size
+    
+    def _find_in_manifests(self, scan_table, indices):
+        total_files = len(indices)
+        self._skipped_files = 0
+        self._reset_read_stats()
+        
+        sizes = scan_table.sizes
+        manifest_algorithms, manifest_by_size = self._load_manifests(set(np.unique(sizes[indices]).tolist()))
+        if manifest_algorithms is None:
+            self.error_occurred.emit("没有可用的指纹清单，请先导入清单")
+            return []
+        
+        # 本地文件要用清单记录时的算法重新计算，摘要才能比较
+        self.hash_algorithm = get_hash_algorithm(manifest_algorithms[0]).name
+        partial_usable = manifest_algorithms[1] in HASH_ALGORITHMS and manifest_algorithms[2] == PARTIAL_HASH_BLOCK_SIZE
+        if partial_usable:
+            self.filter_algorithm = manifest_algorithms[1]
+        
+        matched = np.isin(sizes[indices], np.fromiter(manifest_by_size, dtype=np.int64, count=len(manifest_by_size)))
+        self._read_stats['size_skipped'] += int(sizes[indices[~matched]].sum())
+        candidates = indices[matched]
+        live_files = [record for record in scan_table.records(candidates) if record.size in manifest_by_size]
+        self.progress_updated.emit(40, f"清单大小匹配: {len(live_files)} 个本地文件, 清单候选 "
+                                       f"{sum(len(entries) for entries in manifest_by_size.values())} 条")
+        
+        partial_sets = {}
+        if partial_usable:
+            for size, entries in manifest_by_size.items():
+                partial_hashes = {entry.partial_hash for _, entry in entries}
+                if size >= PARTIAL_HASH_MIN_SIZE and None not in partial_hashes:
+                    partial_sets[size] = partial_hashes
+        
+        prefilter_files = [record for record in live_files if record.size in partial_sets]
+        partial_hashes = self._hash_records(prefilter_files, full=False)
+        to_hash = []
+        for record in live_files:
+            if record.size in partial_sets and partial_hashes.get(record.path) not in partial_sets[record.size]:
+                self._read_stats['partial_skipped'] += record.size
+                continue
+            to_hash.append(record)
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        self.progress_updated.emit(50, f"需要计算完整哈希的文件数: {len(to_hash)} (总文件数: {total_files})")
+        full_hashes = self._hash_records(to_hash, full=True)
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        matches = {}
+        for record in to_hash:
+            file_hash = full_hashes.get(record.path)
+            if file_hash is None:
+                self._skipped_files += 1
+                continue
+            matches.setdefault((record.size, file_hash), []).append(record)
+        
+        duplicate_groups = []
+        for (size, file_hash), records in matches.items():
+            manifest_entry = next(((label, entry) for label, entry in manifest_by_size[size]
+                                   if entry.hash == file_hash), None)
+            if manifest_entry is None:
+                continue
+            label, entry = manifest_entry
+            # 清单中的文件排在首位且只放一个，默认只处理本地副本
+            manifest_record = FileRecord(manifest_display_path(label, entry.path), entry.size, entry.mtime_ns, 0, 0)
+            group = [manifest_record] + records
+            duplicate_groups.append(group)
+            self._emit_group(group)
+        
+        if self._skipped_files > 0:
+            logger.warning(f"扫描过程中跳过了 {self._skipped_files} 个文件")
+        
+        self._log_read_stats()
+        
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        self._emit_summary(total_files, duplicate_groups)
+        
+        return [[record.path for record in records] for records in duplicate_groups]
+    
+    def _find_in_reference_library(self, incoming_files):
+        total_files = len(incoming_files)
+        self._skipped_files = 0
+        self._reset_read_stats()
+        
+        reference_library = ReferenceLibrary()
+        try:
+            library_roots = reference_library.get_roots()
+            if not library_roots:
+                self.error_occurred.emit("尚未设置参考库，请先添加参考库文件夹并建立索引")
+                return []
+            
+            self.progress_updated.emit(35, f"正在查询参考库: {len(library_roots)} 个文件夹")
+            library_by_size = reference_library.lookup_sizes(record.size for record in incoming_files)
+        finally:
+            reference_library.close()
+        
+        incoming_paths = {record.path for record in incoming_files}
+        incoming_inodes = {(record.dev, record.ino) for record in incoming_files if record.ino}
+        candidate_groups = []
+        stale_count = 0
+        for size, records in self._group_by_size(incoming_files).items():
+            library_records = []
+            for record in library_by_size.get(size, []):
+                if record.path in incoming_paths:
                     continue
-                
-                if file_hash in file_hashes:
-                    file_hashes[file_hash].append(file_path)
+                # 建立索引后参考库文件可能已被修改或删除：按索引里的旧 stat 查询哈希索引会得到过期的摘要，
+                # 所以大小命中的参考库文件都重新 stat，用当前的记录计算和查询哈希
+                try:
+                    current = FileRecord.from_path(record.path)
+                except OSError:
+                    stale_count += 1
+                    continue
+                if current.size != size:
+                    stale_count += 1
+                    continue
+                # 待检查的文件夹位于参考库内时，同一个文件不能和自己比较
+                if (current.dev, current.ino) not in incoming_inodes:
+                    library_records.append(current)
+            if library_records:
+                candidate_groups.append(library_records + records)
+            else:
+                self._read_stats['size_skipped'] += size * len(records)
+        if stale_count:
+            logger.warning(f"参考库中有 {stale_count} 个文件在建立索引后已被删除或修改大小，本次不参与比较，建议重建参考库索引")
+        
+        library_count = sum(len(records) for records in library_by_size.values())
+        self.progress_updated.emit(40, f"参考库大小匹配: {len(candidate_groups)} 组, 参考库候选文件 {library_count} 个")
+        
+        candidate_table = ScanTable.from_records(record for records in candidate_groups for record in records)
+        candidate_groups, _ = candidate_table.group_indices(candidate_table.all_indices())
+        candidate_groups = self._filter_by_partial_hash(candidate_table, candidate_groups)
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        def accept_group(records):
+            library_records = sorted(record for record in records if record.path not in incoming_paths)
+            matched_records = [record for record in records if record.path in incoming_paths]
+            if not library_records or not matched_records:
+                return None
+            # 每组只放一个参考库文件并排在首位，默认只处理待检查文件夹中的副本
+            return library_records[:1] + matched_records
+        
+        duplicate_groups = self._group_by_full_hash([candidate_table.records(group) for group in candidate_groups],
+                                                    accept_group=accept_group)
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        if self._skipped_files > 0:
+            logger.warning(f"扫描过程中跳过了 {self._skipped_files} 个文件")
+        
+        self._log_read_stats()
+        
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        self._emit_summary(total_files, duplicate_groups)
+        
+        return [[record.path for record in records] for records in duplicate_groups]
+    
+    def _parse_payload(self, record):
+        try:
+            return get_payload_ranges(record.path, record.size)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"解析图片{record.path}的数据段失败: {str(e)}")
+            return None
+    
+    def _calculate_payload_hash(self, record, payload_ranges=None):
+        try:
+            if payload_ranges is None:
+                payload_ranges = get_payload_ranges(record.path, record.size)
+            return self._hash_engine.hash_ranges(record.path, self.hash_algorithm, payload_ranges)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"计算图片{record.path}的内容摘要失败: {str(e)}")
+            return None
+    
+    def _find_payload_duplicates(self, scan_table, indices):
+        self._skipped_files = 0
+        self._reset_read_stats()
+        image_files = self._records_with_extensions(scan_table, indices, PAYLOAD_HASH_EXTENSIONS)
+        self.progress_updated.emit(35, f"找到 {len(image_files)} 张可比较内容的图片")
+        
+        # 元数据长度不同的副本文件大小也不同，先解析各段位置得到图像数据大小，再按它分组
+        payload_sizes = self._hash_index.lookup_many((record.stat_key for record in image_files),
+                                                     PAYLOAD_SIZE_INDEX_KIND)
+        index_writer = HashIndexWriter(self._hash_index, PAYLOAD_SIZE_INDEX_KIND)
+        payload_layouts = {}
+        to_parse = [record for record in image_files if record.path not in payload_sizes]
+        total_to_parse = len(to_parse)
+        for i, (record, payload_ranges) in enumerate(self._iter_parallel(to_parse, self._parse_payload)):
+            self._safe_progress_update(int((i + 1) / total_to_parse * 100),
+                                       f"正在解析图片结构: {os.path.basename(record.path)} ({i+1}/{total_to_parse})")
+            if payload_ranges is None:
+                self._skipped_files += 1
+                continue
+            
+            payload_layouts[record.path] = payload_ranges
+            payload_sizes[record.path] = str(payload_size(payload_ranges))
+            index_writer.add(record.stat_key, payload_sizes[record.path])
+        index_writer.flush()
+        
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        size_groups = {}
+        for record in image_files:
+            if record.path in payload_sizes:
+                size_groups.setdefault(int(payload_sizes[record.path]), []).append(record)
+        candidate_groups = [records for records in size_groups.values() if len(records) > 1]
+        for records in size_groups.values():
+            if len(records) == 1:
+                self._read_stats['size_skipped'] += records[0].size
+        
+        self.progress_updated.emit(50, f"需要计算内容摘要的图片数: {sum(len(records) for records in candidate_groups)}")
+        
+        duplicate_groups = self._group_by_full_hash(
+            candidate_groups,
+            hash_func=lambda record: self._calculate_payload_hash(record, payload_layouts.get(record.path)),
+            index_kind=self._payload_index_kind
+        )
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        if self._skipped_files > 0:
+            logger.warning(f"扫描过程中跳过了 {self._skipped_files} 个文件")
+        
+        self._log_read_stats()
+        
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        self._emit_summary(len(image_files), duplicate_groups)
+        
+        return [[record.path for record in records] for records in duplicate_groups]
+    
+    def _reset_read_stats(self):
+        self._read_stats = {
+            'size_skipped': 0,
+            'partial_read': 0,
+            'partial_skipped': 0,
+            'index_skipped': 0,
+            'full_read': 0,
+            'compare_read': 0,
+            'compare_skipped': 0,
+        }
+    
+    def _emit_group(self, records):
+        self.group_found.emit([record.path for record in records], wasted_bytes(records))
+    
+    def _emit_summary(self, total_files, duplicate_groups):
+        self.scan_summary.emit({
+            'total_files': total_files,
+            'group_count': len(duplicate_groups),
+            'duplicate_files': sum(len(records) for records in duplicate_groups),
+            'wasted_bytes': sum(wasted_bytes(records) for records in duplicate_groups),
+            'skipped_files': self._skipped_files,
+            'read_stats': dict(self._read_stats),
+        })
+    
+    def _group_by_size(self, all_files):
+        size_groups = {}
+        for record in all_files:
+            if record.size in size_groups:
+                size_groups[record.size].append(record)
+            else:
+                size_groups[record.size] = [record]
+        
+        return size_groups
+    
+    def _filter_by_partial_hash(self, scan_table, candidate_groups):
+        sizes = scan_table.sizes
+        # 压缩包成员读取末尾块也要解压整个成员，含成员的组直接计算完整哈希
+        member_mask = self._archive_member_mask(scan_table) if self._archive_member_indices else None
+        filtered_groups = []
+        large_groups = []
+        for group in candidate_groups:
+            if sizes[group[0]] < PARTIAL_HASH_MIN_SIZE or (member_mask is not None and member_mask[group].any()):
+                filtered_groups.append(group)
+            else:
+                large_groups.append(group)
+        if not large_groups:
+            return candidate_groups
+        
+        pending = np.concatenate(large_groups)
+        pending_files = scan_table.records(pending)
+        partial_hashes = self._hash_index.lookup_many((record.stat_key for record in pending_files),
+                                                      self._partial_index_kind)
+        index_writer = HashIndexWriter(self._hash_index, self._partial_index_kind)
+        
+        to_hash = [record for record in pending_files if record.path not in partial_hashes]
+        total_pending = len(to_hash)
+        for i, (record, partial_hash) in enumerate(self._iter_parallel(to_hash, self._calculate_partial_hash,
+                                                                      partial_read_size)):
+            self._safe_progress_update(int((i + 1) / total_pending * 100),
+                                       f"正在预筛选: {os.path.basename(record.path)} ({i+1}/{total_pending})")
+            
+            self._read_stats['partial_read'] += 3 * PARTIAL_HASH_BLOCK_SIZE
+            if partial_hash is None:
+                continue
+            
+            partial_hashes[record.path] = partial_hash
+            index_writer.add(record.stat_key, partial_hash)
+        
+        index_writer.flush()
+        
+        if self._stop_flag:
+            return []
+        
+        # 摘要截成定长字节放进数组，和大小一起排序分组，不再按十六进制字符串建字典
+        digests = np.zeros((len(pending), DIGEST_SIZE), dtype=np.uint8)
+        hashed = np.zeros(len(pending), dtype=bool)
+        for position, record in enumerate(pending_files):
+            partial_hash = partial_hashes.get(record.path)
+            if partial_hash is None:
+                self._skipped_files += 1
+                continue
+            digests[position] = np.frombuffer(digest_bytes(partial_hash), dtype=np.uint8)
+            hashed[position] = True
+        
+        partial_groups, single_bytes = scan_table.group_indices(pending[hashed], digests[hashed])
+        self._read_stats['partial_skipped'] += single_bytes
+        filtered_groups.extend(partial_groups)
+        return filtered_groups
+    
+    def _group_by_full_hash(self, candidate_groups, accept_group=None, hash_func=None, index_kind=None, read_size=None):
+        candidate_groups = sorted(candidate_groups, key=wasted_bytes, reverse=True)
+        filtered_files = [record for records in candidate_groups for record in records]
+        duplicate_groups = []
+        # 自定义摘要（如图片内容摘要）与文件字节不等价，不能走逐字节比较
+        allow_byte_compare = hash_func is None
+        hash_func = hash_func or self._calculate_hash
+        index_kind = index_kind or self.hash_algorithm
+        read_size = read_size or (lambda record: record.size)
+        
+        indexed_hashes = self._hash_index.lookup_many((record.stat_key for record in filtered_files), index_kind)
+        if indexed_hashes:
+            logger.info(f"哈希索引命中 {len(indexed_hashes)}/{len(filtered_files)} 个文件")
+        index_writer = HashIndexWriter(self._hash_index, index_kind)
+        
+        bucket_hashes = [{} for _ in candidate_groups]
+        bucket_pending = [len(records) for records in candidate_groups]
+        bucket_of = {}
+        
+        def confirm(records):
+            if accept_group is not None:
+                records = accept_group(records)
+            if records:
+                duplicate_groups.append(records)
+                self._emit_group(records)
+        
+        def resolve(bucket, record, file_hash):
+            if file_hash is not None:
+                bucket_hashes[bucket].setdefault(file_hash, []).append(record)
+            bucket_pending[bucket] -= 1
+            if bucket_pending[bucket] == 0:
+                confirmed = [records for records in bucket_hashes[bucket].values() if len(records) > 1]
+                confirmed.sort(key=len, reverse=True)
+                for records in confirmed:
+                    confirm(records)
+                bucket_hashes[bucket] = None
+        
+        to_hash = []
+        compare_buckets = {}
+        for bucket, records in enumerate(candidate_groups):
+            if allow_byte_compare and self._should_compare_bytes(records, indexed_hashes):
+                bucket_of[records[0].path] = bucket
+                compare_buckets[records[0].path] = records
+                to_hash.append(records[0])
+                continue
+            
+            for record in records:
+                file_hash = indexed_hashes.get(record.path)
+                if file_hash is None:
+                    bucket_of[record.path] = bucket
+                    to_hash.append(record)
                 else:
-                    file_hashes[file_hash] = [file_path]
-            except Exception as e:
-                skipped_files += 1
-                logger.error(f"处理文件{file_path}时出错: {str(e)}")
+                    self._read_stats['index_skipped'] += read_size(record)
+                    resolve(bucket, record, file_hash)
         
-        if skipped_files > 0:
-            logger.warning(f"扫描过程中跳过了 {skipped_files} 个文件")
+        def process(record):
+            if record.path in compare_buckets:
+                return self._compare_bytes(compare_buckets[record.path])
+            return hash_func(record)
         
-        duplicate_groups = [files for files in file_hashes.values() if len(files) > 1]
+        def record_hash(record, file_hash):
+            if file_hash is None:
+                self._skipped_files += 1
+            else:
+                index_writer.add(record.stat_key, file_hash)
+                self._read_stats['full_read'] += read_size(record)
+            resolve(bucket_of[record.path], record, file_hash)
         
-        duplicate_groups.sort(key=len, reverse=True)
+        total_to_hash = len(to_hash)
+        fallback = []
+        for i, (record, result) in enumerate(self._iter_parallel(to_hash, process, read_size)):
+            self._safe_progress_update(int((i + 1) / total_to_hash * 100),
+                                       f"正在扫描: {os.path.basename(record.path)} ({i+1}/{total_to_hash})")
+            
+            if record.path in compare_buckets:
+                if result is None:
+                    # 逐字节比较出错时整组改为计算完整哈希，哈希也失败的文件再计入跳过
+                    members = compare_buckets.pop(record.path)
+                    logger.warning(f"逐字节比较失败，改为计算哈希: {record.path} 等 {len(members)} 个文件")
+                    for member in members:
+                        bucket_of[member.path] = bucket_of[record.path]
+                    fallback.extend(members)
+                    continue
+                if not result.completed:
+                    continue
+                self._skipped_files += len(result.failed)
+                self._read_stats['compare_read'] += result.bytes_read
+                self._read_stats['compare_skipped'] += (
+                    sum(member.size for member in compare_buckets[record.path]) - result.bytes_read
+                )
+                for records in result.groups:
+                    confirm(records)
+                continue
+            
+            record_hash(record, result)
+        
+        for record, file_hash in self._iter_parallel(fallback, hash_func, read_size):
+            record_hash(record, file_hash)
+        
+        index_writer.flush()
         
-        if len(duplicate_groups) == 0 and potential_duplicates > 0:
-            pass
+        if self._stop_flag:
+            return []
         
         return duplicate_groups
+    
+    def _should_compare_bytes(self, records, indexed_hashes):
+        # 参考库模式需要把参考库文件的摘要写入索引，逐字节比较不产生摘要
+        if (not self._byte_compare_fits or self.scan_mode == SCAN_MODE_REFERENCE
+                or len(records) > MAX_COMPARE_GROUP_SIZE):
+            return False
+        # 超大文件的逐字节比较只能顺序读取，分段哈希可以并发读取并缓存各段摘要
+        if records[0].size > TREE_HASH_MIN_SIZE:
+            return False
+        if any(is_archive_member_path(record.path) for record in records):
+            return False
+        for record in records:
+            if record.path in indexed_hashes:
+                return False
+            cached = self._file_cache.get(record.path)
+            if cached and cached['algorithm'] == self.hash_algorithm:
+                return False
+        return True
+    
+    def _compare_bytes(self, records):
+        return compare_files(records, stop_check=lambda: self._stop_flag,
+                             buffers=self._hash_engine.compare_buffers(MAX_COMPARE_GROUP_SIZE))
+    
+    def _calculate_perceptual_hash(self, record):
+        try:
+            return format_perceptual_hash(compute_dhash(record.path))
+        except Exception as e:
+            logger.warning(f"计算图片{record.path}的感知哈希失败: {str(e)}")
+            return None
+    
+    def _find_similar_images(self, scan_table, indices):
+        self._skipped_files = 0
+        image_files = self._records_with_extensions(scan_table, indices, PERCEPTUAL_HASH_EXTENSIONS)
+        self.progress_updated.emit(40, f"找到 {len(image_files)} 张可比较的图片")
+        
+        perceptual_hashes = self._hash_index.lookup_many((record.stat_key for record in image_files),
+                                                         PERCEPTUAL_HASH_INDEX_KIND)
+        if perceptual_hashes:
+            logger.info(f"感知哈希索引命中 {len(perceptual_hashes)}/{len(image_files)} 张图片")
+        index_writer = HashIndexWriter(self._hash_index, PERCEPTUAL_HASH_INDEX_KIND)
+        
+        to_hash = [record for record in image_files if record.path not in perceptual_hashes]
+        total_to_hash = len(to_hash)
+        for i, (record, perceptual_hash) in enumerate(self._iter_parallel(to_hash, self._calculate_perceptual_hash)):
+            self._safe_progress_update(int((i + 1) / total_to_hash * 100),
+                                       f"正在分析图片: {os.path.basename(record.path)} ({i+1}/{total_to_hash})")
+            
+            if perceptual_hash is None:
+                self._skipped_files += 1
+                continue
+            
+            perceptual_hashes[record.path] = perceptual_hash
+            index_writer.add(record.stat_key, perceptual_hash)
+        
+        index_writer.flush()
+        
+        if self._stop_flag:
+            self.error_occurred.emit("扫描已停止")
+            return []
+        
+        self.progress_updated.emit(90, "正在分组相似图片")
+        records_by_path = {record.path: record for record in image_files}
+        similar_groups = group_similar_hashes(
+            ((path, int(value, 16)) for path, value in perceptual_hashes.items() if path in records_by_path),
+            self.similarity_threshold
+        )
+        
+        duplicate_groups = []
+        for paths in similar_groups:
+            records = sorted((records_by_path[path] for path in paths), key=lambda record: record.size, reverse=True)
+            duplicate_groups.append(records)
+        duplicate_groups.sort(key=wasted_bytes, reverse=True)
+        
+        for records in duplicate_groups:
+            self._emit_group(records)
+        
+        if self._skipped_files > 0:
+            logger.warning(f"相似图片分析跳过了 {self._skipped_files} 个文件")
+        
+        self._read_stats = {}
+        self._emit_summary(len(indices), duplicate_groups)
+        
+        return [[record.path for record in records] for records in duplicate_groups]
+    
+    def _log_read_stats(self):
+        stats = self._read_stats
+        partial_saved = max(0, stats['partial_skipped'] - stats['partial_read'])
+        logger.info(
+            f"读取统计: 大小筛选避免读取 {format_file_size(stats['size_skipped'])}, "
+            f"部分哈希读取 {format_file_size(stats['partial_read'])} 并避免读取 {format_file_size(partial_saved)}, "
+            f"哈希索引避免读取 {format_file_size(stats['index_skipped'])}, "
+            f"完整哈希读取 {format_file_size(stats['full_read'])}, "
+            f"逐字节比较读取 {format_file_size(stats['compare_read'])} 并提前结束 {format_file_size(stats['compare_skipped'])}"
+        )
+        self.progress_updated.emit(
+            99, f"大小筛选节省 {format_file_size(stats['size_skipped'])}, 部分哈希节省 {format_file_size(partial_saved)}"
+        )
+
+class ReferenceLibraryThread(QtCore.QThread):
+    
+    progress_updated = QtCore.pyqtSignal(int, str)
+    build_completed = QtCore.pyqtSignal(int)
+    error_occurred = QtCore.pyqtSignal(str)
+    
+    def __init__(self, library_folders):
+        super().__init__()
+        self.library_folders = library_folders
+        self._stop_flag = False
+    
+    def stop(self):
+        self._stop_flag = True
+    
+    def run(self):
+        reference_library = ReferenceLibrary()
+        scan_snapshot = ScanSnapshot()
+        try:
+            total_indexed = 0
+            for folder_index, folder in enumerate(self.library_folders):
+                if self._stop_flag:
+                    break
+                
+                if not os.path.isdir(folder):
+                    logger.warning(f"参考库文件夹不存在: {folder}")
+                    self.error_occurred.emit(f"参考库文件夹不存在: {folder}")
+                    continue
+                
+                records = []
+                for record in scan_snapshot.iter_file_records(folder, stop_check=lambda: self._stop_flag):
+                    if record.size == 0:
+                        continue
+                    
+                    records.append(record)
+                    if len(records) % 5000 == 0:
+                        self.progress_updated.emit(int(folder_index / len(self.library_folders) * 100),
+                                                   f"正在索引参考库: {os.path.basename(folder)} ({len(records)})")
+                if self._stop_flag:
+                    break
+                
+                total_indexed += reference_library.replace_root(folder, records)
+                logger.info(f"参考库 {folder} 已索引 {len(records)} 个文件")
+            
+            self.progress_updated.emit(100, f"参考库索引完成: {total_indexed} 个文件")
+            self.build_completed.emit(total_indexed)
+        except Exception as e:
+            logger.error(f"建立参考库索引出错: {str(e)}")
+            self.error_occurred.emit(f"建立参考库索引出错: {str(e)}")
+        finally:
+            scan_snapshot.close()
+            reference_library.close()
+
+class ManifestExportThread(FileScanThread):
+    
+    export_completed = QtCore.pyqtSignal(int)
+    
+    def __init__(self, folder_path, manifest_path, hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                 filter_algorithm=DEFAULT_FILTER_ALGORITHM, incremental=True, **kwargs):
+        super().__init__(folder_path, hash_algorithm=hash_algorithm, filter_algorithm=filter_algorithm,
+                         incremental=incremental, **kwargs)
+        self.manifest_path = manifest_path
+    
+    def run(self):
+        writer = None
+        try:
+            self._stop_flag = False
+            self._skipped_files = 0
+            self._reset_read_stats()
+            
+            scan_table = ScanTable()
+            self._collect_files(self.folder_path, scan_table)
+            if self._stop_flag:
+                return
+            
+            indices = scan_table.all_indices()
+            self._total_files = len(indices)
+            if self._total_files > 50000:
+                self._progress_update_interval = 1.0
+            
+            writer = ManifestWriter(self.manifest_path, self.folder_path, self.hash_algorithm, self.filter_algorithm,
+                                    PARTIAL_HASH_BLOCK_SIZE)
+            # 按批计算并写出，清单大小与文件数无关地只占一批记录的内存
+            for start in range(0, len(indices), EXTERNAL_HASH_BATCH_SIZE):
+                if self._stop_flag:
+                    break
+                
+                records = scan_table.records(indices[start:start + EXTERNAL_HASH_BATCH_SIZE])
+                partial_hashes = self._hash_records([record for record in records
+                                                     if record.size >= PARTIAL_HASH_MIN_SIZE], full=False)
+                full_hashes = self._hash_records(records, full=True)
+                for record in records:
+                    file_hash = full_hashes.get(record.path)
+                    if file_hash is None:
+                        self._skipped_files += 1
+                        continue
+                    writer.add(record.path, record.size, record.mtime_ns, partial_hashes.get(record.path), file_hash)
+                
+                done = min(start + EXTERNAL_HASH_BATCH_SIZE, len(indices))
+                self.progress_updated.emit(int(done / len(indices) * 100), f"正在生成指纹清单: {done}/{len(indices)}")
+            
+            if self._stop_flag:
+                writer.abort()
+                self.error_occurred.emit("导出已停止")
+                return
+            
+            writer.commit()
+            if self._skipped_files > 0:
+                logger.warning(f"导出清单时跳过了 {self._skipped_files} 个无法读取的文件")
+            logger.info(f"指纹清单已导出: {self.manifest_path} ({writer.entry_count} 个文件)")
+            self.progress_updated.emit(100, f"指纹清单导出完成: {writer.entry_count} 个文件")
+            self.export_completed.emit(writer.entry_count)
+        except Exception as e:
+            if writer is not None:
+                writer.abort()
+            logger.error(f"导出指纹清单出错: {str(e)}")
+            self.error_occurred.emit(f"导出指纹清单出错: {str(e)}")
+        finally:
+            self._hash_index.close()
+            if self._scan_snapshot is not None:
+                self._scan_snapshot.close()
+
+class GroupVerifyThread(FileScanThread):
+
+    # (原始组, [(确认后的组, 可释放字节数), ...])，原始组里被排除的文件不再出现
+    verify_completed = QtCore.pyqtSignal(list)
+
+    def __init__(self, groups, hash_algorithm=DEFAULT_HASH_ALGORITHM, filter_algorithm=DEFAULT_FILTER_ALGORITHM,
+                 **kwargs):
+        super().__init__([], hash_algorithm=hash_algorithm, filter_algorithm=filter_algorithm, incremental=False,
+                         **kwargs)
+        self.groups = groups
+
+    def run(self):
+        try:
+            self._stop_flag = False
+            self._skipped_files = 0
+            self._reset_read_stats()
+
+            # 抽样指纹之后文件可能已被修改，重新 stat 并按当前大小分组，再对每组计算完整哈希
+            candidate_groups = []
+            group_of = {}
+            for group_index, group in enumerate(self.groups):
+                current = []
+                for file_path in group:
+                    try:
+                        current.append(FileRecord.from_path(file_path))
+                    except OSError:
+                        self._skipped_files += 1
+                for records in self._group_by_size(current).values():
+                    if len(records) > 1:
+                        candidate_groups.append(records)
+                        for record in records:
+                            group_of[record.path] = group_index
+
+            self.progress_updated.emit(5, f"正在验证 {len(self.groups)} 组, {len(group_of)} 个文件")
+            duplicate_groups = self._group_by_full_hash(candidate_groups)
+            if self._stop_flag:
+                self.error_occurred.emit("验证已停止")
+                return
+
+            verified = [[] for _ in self.groups]
+            for records in duplicate_groups:
+                verified[group_of[records[0].path]].append(([record.path for record in records],
+                                                            wasted_bytes(records)))
+
+            confirmed = sum(len(results) for results in verified)
+            logger.info(f"验证完成: {len(self.groups)} 组抽样结果确认为 {confirmed} 组, "
+                        f"完整哈希读取 {format_file_size(self._read_stats['full_read'])}, "
+                        f"逐字节比较读取 {format_file_size(self._read_stats['compare_read'])}")
+            self.progress_updated.emit(100, f"验证完成: 确认 {confirmed} 组")
+            self.verify_completed.emit(list(zip(self.groups, verified)))
+        except Exception as e:
+            logger.error(f"验证重复文件组出错: {str(e)}")
+            self.error_occurred.emit(f"验证重复文件组出错: {str(e)}")
+        finally:
+            self._hash_index.close()
+
+class KeepPolicyThread(QtCore.QThread):
+    
+    progress_updated = QtCore.pyqtSignal(int, str)
+    selection_ready = QtCore.pyqtSignal(list)
+    error_occurred = QtCore.pyqtSignal(str)
+    
+    def __init__(self, duplicate_groups, rules, reference_folders=(), keep_first=False):
+        super().__init__()
+        self.duplicate_groups = duplicate_groups
+        self.policy = KeepPolicy(rules, reference_folders)
+        self.keep_first = keep_first
+        self._stop_flag = False
+        self._hash_index = HashIndex()
+        self._records = {}
+        self._attribute_cache = {}
+        self._max_workers = min(16, (os.cpu_count() or 2) * 2)
+    
+    def stop(self):
+        self._stop_flag = True
+    
+    def run(self):
+        try:
+            start_time = time.time()
+            removals = self.policy.select_removals(self.duplicate_groups, self._fetch_attribute,
+                                                   stop_check=lambda: self._stop_flag, keep_first=self.keep_first)
+            if self._stop_flag:
+                return
+            
+            logger.info(f"按规则 {self.policy.rules} 处理 {len(self.duplicate_groups)} 组, "
+                        f"选择 {len(removals)} 个文件, 用时 {time.time() - start_time:.2f}s")
+            self.progress_updated.emit(100, f"已按规则选择 {len(removals)} 个文件")
+            self.selection_ready.emit(removals)
+        except Exception as e:
+            logger.error(f"按规则选择文件出错: {str(e)}")
+            self.error_occurred.emit(f"按规则选择文件出错: {str(e)}")
+        finally:
+            self._hash_index.close()
+    
+    def _map_batches(self, func, items, status_text):
+        # 文件头读取和 stat 都是 I/O 等待，分批并发执行；每个任务处理一小段，避免逐个文件提交的调度开销
+        results = []
+        chunk = lambda part: [func(item) for item in part]
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='dedup-keep') as executor:
+            for start in range(0, len(items), KEEP_ATTRIBUTE_BATCH_SIZE):
+                if self._stop_flag:
+                    break
+                batch = items[start:start + KEEP_ATTRIBUTE_BATCH_SIZE]
+                parts = [batch[offset:offset + KEEP_ATTRIBUTE_CHUNK_SIZE]
+                         for offset in range(0, len(batch), KEEP_ATTRIBUTE_CHUNK_SIZE)]
+                for part, part_results in zip(parts, executor.map(chunk, parts)):
+                    results.extend(zip(part, part_results))
+                done = start + len(batch)
+                self.progress_updated.emit(int(done / len(items) * 100), f"{status_text} ({done}/{len(items)})")
+        return results
+    
+    @staticmethod
+    def _stat_path(file_path):
+        try:
+            return FileRecord.from_path(file_path)
+        except OSError:
+            return None
+    
+    def _ensure_records(self, paths):
+        missing = [file_path for file_path in paths if file_path not in self._records]
+        for file_path, record in self._map_batches(self._stat_path, missing, "正在读取文件信息"):
+            self._records[file_path] = record
+    
+    @staticmethod
+    def _read_attribute(attribute, record):
+        try:
+            if attribute == ATTRIBUTE_RESOLUTION:
+                return read_image_resolution(record.path)
+            return count_exif_tags(record.path)
+        except Exception as e:
+            logger.debug(f"读取图片{record.path}的属性失败: {str(e)}")
+            return None
+    
+    def _fetch_attribute(self, attribute, paths):
+        cache = self._attribute_cache.setdefault(attribute, {})
+        pending = [file_path for file_path in paths if file_path not in cache]
+        self._ensure_records(pending)
+        
+        if attribute == ATTRIBUTE_MTIME:
+            for file_path in pending:
+                record = self._records.get(file_path)
+                cache[file_path] = record.mtime_ns if record else None
+            return cache
+        
+        records = []
+        for file_path in pending:
+            record = self._records.get(file_path)
+            if record is None or os.path.splitext(file_path)[1].lower() not in PERCEPTUAL_HASH_EXTENSIONS:
+                cache[file_path] = None
+            else:
+                records.append(record)
+        
+        # 读出的属性以文件状态为键存进哈希索引，下次选择时不必再打开文件
+        index_kind = f"attr:{attribute}"
+        indexed = self._hash_index.lookup_many((record.stat_key for record in records), index_kind)
+        for file_path, value in indexed.items():
+            cache[file_path] = int(value)
+        
+        to_read = [record for record in records if record.path not in indexed]
+        index_writer = HashIndexWriter(self._hash_index, index_kind)
+        read_attribute = lambda record: self._read_attribute(attribute, record)
+        for record, value in self._map_batches(read_attribute, to_read, "正在读取图片信息"):
+            cache[record.path] = value
+            if value is not None:
+                index_writer.add(record.stat_key, str(value))
+        index_writer.flush()
+        return cache
+
+class QuarantineRestoreThread(QtCore.QThread):
+    
+    progress_updated = QtCore.pyqtSignal(int, str)
+    restore_completed = QtCore.pyqtSignal(list, list)
+    error_occurred = QtCore.pyqtSignal(str)
+    
+    def __init__(self, batch_id):
+        super().__init__()
+        self.batch_id = batch_id
+    
+    def run(self):
+        try:
+            restored, failed = Quarantine().restore_batch(
+                self.batch_id,
+                progress_callback=lambda completed, total: self.progress_updated.emit(
+                    int(completed / total * 100), f"正在恢复: {completed}/{total}"))
+            for file_path, error in failed:
+                logger.error(f"恢复文件失败: {file_path} ({error})")
+            logger.info(f"撤销删除完成: 恢复 {len(restored)} 个文件, 失败 {len(failed)} 个文件")
+            self.restore_completed.emit(restored, [file_path for file_path, _ in failed])
+        except Exception as e:
+            logger.error(f"撤销删除出错: {str(e)}")
+            self.error_occurred.emit(f"撤销删除出错: {str(e)}")
+
+class QuarantinePurgeThread(QtCore.QThread):
+    
+    progress_updated = QtCore.pyqtSignal(int, str)
+    purge_completed = QtCore.pyqtSignal(int, list)
+    error_occurred = QtCore.pyqtSignal(str)
+    
+    def run(self):
+        try:
+            quarantine = Quarantine()
+            purged_count = 0
+            failed_paths = []
+            for batch in quarantine.list_batches():
+                purged, failed = quarantine.purge_batch(
+                    batch.batch_id,
+                    progress_callback=lambda completed, total: self.progress_updated.emit(
+                        int(completed / total * 100), f"正在永久删除: {completed}/{total}"))
+                purged_count += len(purged)
+                for file_path, error in failed:
+                    logger.error(f"永久删除隔离文件失败: {file_path} ({error})")
+                    failed_paths.append(file_path)
+            logger.info(f"清空隔离区完成: 删除 {purged_count} 个文件, 失败 {len(failed_paths)} 个文件")
+            self.purge_completed.emit(purged_count, failed_paths)
+        except Exception as e:
+            logger.error(f"清空隔离区出错: {str(e)}")
+            self.error_occurred.emit(f"清空隔离区出错: {str(e)}")
 
 class FileDeduplicateThread(QtCore.QThread):
     
     progress_updated = QtCore.pyqtSignal(int, str)
+    files_processed = QtCore.pyqtSignal(list, list)
     deduplicate_completed = QtCore.pyqtSignal(int, int)
     error_occurred = QtCore.pyqtSignal(str)
     
-    def __init__(self, duplicate_groups, delete_list=None):
+    def __init__(self, duplicate_groups, delete_list=None, action=DEDUP_ACTION_DELETE):
         super().__init__()
         self.duplicate_groups = duplicate_groups
         self.delete_list = delete_list or []
+        self.action = action
+        self.quarantine_batch_id = None
         self._stop_flag = False
     
     def stop(self):
         self._stop_flag = True
     
+    def _link_targets(self):
+        selected = set(self.delete_list)
+        targets = {}
+        for group in self.duplicate_groups:
+            # 链接只能指向磁盘上的独立文件
+            keepers = [file_path for file_path in group if file_path not in selected and not is_virtual_path(file_path)]
+            if not keepers:
+                if any(file_path in selected for file_path in group):
+                    logger.warning(f"重复文件组中没有未选中的本地文件，无法创建链接: {group[0]}")
+                continue
+            for file_path in group:
+                if file_path in selected:
+                    targets[file_path] = keepers[0]
+        return targets
+    
+    def _trash_files(self, file_list, processed_paths, failed_paths):
+        def report(completed, total):
+            self.progress_updated.emit(int(completed / total * 100), f"正在移到回收站: {completed}/{total}")
+        
+        quarantine = Quarantine()
+        self.quarantine_batch_id, moved_paths, failed = quarantine.trash_files(
+            file_list, stop_check=lambda: self._stop_flag, progress_callback=report)
+        processed_paths.extend(moved_paths)
+        for file_path, error in failed:
+            logger.error(f"移到回收站失败: {file_path} ({error})")
+            failed_paths.append(file_path)
+    
+    def _remove_file(self, file_path, link_targets):
+        target_path = link_targets.get(file_path)
+        if target_path is None:
+            raise ValueError("没有可保留的同组文件")
+        target = FileRecord.from_path(target_path)
+        current = FileRecord.from_path(file_path)
+        if target.size != current.size:
+            raise ValueError(f"文件大小与保留文件不一致: {target_path}")
+        # 扫描之后任何一方都可能被修改过，替换为链接会丢掉原文件的数据，替换前逐字节确认内容仍然相同
+        result = compare_files([target, current], stop_check=lambda: self._stop_flag)
+        if not result.completed:
+            raise ValueError("已停止")
+        if result.failed or len(result.groups) != 1:
+            raise ValueError(f"文件内容与保留文件不一致: {target_path}")
+        
+        if self.action == DEDUP_ACTION_HARDLINK:
+            replace_with_hardlink(target_path, file_path)
+        else:
+            replace_with_reflink(target_path, file_path)
+    
     def run(self):        
+        processed_paths = []
+        failed_paths = []
         try:
-            total_deleted = 0
             total_files = 0
-            failed_deletions = 0
+            action_name = DEDUP_ACTION_NAMES[self.action]
             
-            total_to_process = len(self.delete_list) if self.delete_list else sum(len(group) - 1 for group in self.duplicate_groups)
-                        
             if self.delete_list:
-                for i, file_path in enumerate(self.delete_list):
-                    if self._stop_flag:
-                        logger.info("去重已停止")
-                        self.error_occurred.emit("去重已停止")
-                        return
-                    
-                    try:
-                        progress = int((i + 1) / total_to_process * 100)
-                        file_name = os.path.basename(file_path)
-                        self.progress_updated.emit(progress, f"正在删除: {file_name}")
-                        
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            total_deleted += 1
-                        else:
-                            logger.warning(f"文件不存在: {file_path}")
-                            failed_deletions += 1
-                        
-                        total_files += 1
-                        
-                    except PermissionError:
-                        failed_deletions += 1
-                        logger.error(f"无权限删除文件: {file_path}")
-                    except Exception as e:
-                        failed_deletions += 1
-                        logger.error(f"删除文件{file_path}失败: {str(e)}")
+                file_list = self.delete_list
             else:
-                for group_idx, file_group in enumerate(self.duplicate_groups):
-                    for file_idx, file_path in enumerate(file_group):
-                        if file_idx == 0:
-                            continue
-                        
-                        if self._stop_flag:
-                            logger.info("去重已停止")
-                            self.error_occurred.emit("去重已停止")
-                            return
-                        
-                        try:
-                            progress = int((total_files / total_to_process) * 100)
-                            file_name = os.path.basename(file_path)
-                            
-                            if os.path.exists(file_path):
-                                os.remove(file_path)
-                                total_deleted += 1
-                            else:
-                                logger.warning(f"文件不存在: {file_path}")
-                                failed_deletions += 1
-                            
-                        except PermissionError:
-                            failed_deletions += 1
-                            logger.error(f"无权限删除文件: {file_path}")
-                        except Exception as e:
-                            failed_deletions += 1
-                            logger.error(f"删除文件{file_path}失败: {str(e)}")
-                        
-                        total_files += 1
-            
-            logger.info(f"去重完成: 成功删除 {total_deleted} 个文件, 失败 {failed_deletions} 个文件, 共处理 {total_files} 个文件")
+                file_list = [file_path for group in self.duplicate_groups for file_path in group[1:]]
+            total_to_process = len(file_list)
+            
+            if self.action == DEDUP_ACTION_DELETE:
+                self._trash_files(file_list, processed_paths, failed_paths)
+                if self._stop_flag:
+                    logger.info("去重已停止")
+                    self.files_processed.emit(processed_paths, failed_paths)
+                    self.error_occurred.emit("去重已停止")
+                    return
+                total_files = total_to_process
+                file_list = []
+            
+            link_targets = self._link_targets() if self.action != DEDUP_ACTION_DELETE else {}
+            for i, file_path in enumerate(file_list):
+                if self._stop_flag:
+                    logger.info("去重已停止")
+                    self.files_processed.emit(processed_paths, failed_paths)
+                    self.error_occurred.emit("去重已停止")
+                    return
+                
+                try:
+                    progress = int((i + 1) / total_to_process * 100)
+                    file_name = os.path.basename(file_path)
+                    self.progress_updated.emit(progress, f"正在{action_name}: {file_name}")
+                    
+                    if os.path.exists(file_path):
+                        self._remove_file(file_path, link_targets)
+                        processed_paths.append(file_path)
+                    else:
+                        logger.warning(f"文件不存在: {file_path}")
+                        failed_paths.append(file_path)
+                    
+                except PermissionError:
+                    failed_paths.append(file_path)
+                    logger.error(f"无权限{action_name}文件: {file_path}")
+                except Exception as e:
+                    failed_paths.append(file_path)
+                    logger.error(f"{action_name}文件{file_path}失败: {str(e)}")
+                
+                total_files += 1
+            
+            logger.info(f"去重完成: 成功{action_name} {len(processed_paths)} 个文件, 失败 {len(failed_paths)} 个文件, 共处理 {total_files} 个文件")
             logger.info(f"="*3+f"LeafSort © {datetime.now().year} Yangshengzhou.All Rights Reserved"+"="*3)
             
-            self.deduplicate_completed.emit(total_deleted, total_files)
+            self.files_processed.emit(processed_paths, failed_paths)
+            self.deduplicate_completed.emit(len(processed_paths), total_files)
             
         except Exception as e:
+            self.files_processed.emit(processed_paths, failed_paths)
             logger.error(f"执行文件去重时出错: {str(e)}")
-            self.error_occurred.emit(f"去重出错: {str(e)}")
\ No newline at end of file
+            self.error_occurred.emit(f"去重出错: {str(e)}")
@@ -13,6 +13,7 @@ import exifread
 import pillow_heif
 from core.common import get_resource_path, get_file_type, get_current_time_str
 from core.config_manager import config_manager, logger
+from core.io_limits import AdaptiveIOPool, file_size_or_zero
 
 _geo_data_cache = {
     'city_data': None,
@@ -78,6 +79,9 @@ class SmartArrangeThread(QtCore.QThread):
         self.fail_count = 0
         self.city_data, self.province_data = _load_geographic_data_once()
         self.log_signal = parent.log_signal if parent and hasattr(parent, 'log_signal') else self.log_signal
+        self._io_pool = AdaptiveIOPool("智能整理", min(16, (os.cpu_count() or 2) * 2), thread_name_prefix='arrange')
+        self._reserved_paths = set()
+        self._target_locks = {}
 
     def calculate_total_files(self) -> int:
         try:
@@ -184,35 +188,40 @@ class SmartArrangeThread(QtCore.QThread):
         folder_path = Path(folder_info['path'])
         
         if folder_info.get('include_sub', 0):
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    if self._stop_flag:
-                        self.log("WARNING", "您已经取消了当前文件夹的处理")
-                        return
-                    full_file_path = Path(root) / file
-                    if self.destination_root:
-                        self.process_single_file(full_file_path)
-                    else:
-                        self.process_single_file(full_file_path, base_folder=folder_path)
-                    self.processed_files += 1
-                    if self.total_files > 0:
-                        percent_complete = int((self.processed_files / self.total_files) * 100)
-                        self.progress_signal.emit(min(percent_complete, 99))
-        else:
-            for file in os.listdir(folder_path):
+            base_folder = None if self.destination_root else folder_path
+            files = []
+            for root, _, names in os.walk(folder_path):
                 if self._stop_flag:
-                    self.log("WARNING", "文件夹处理被用户中断")
-                    return
-                full_file_path = folder_path / file
-                if full_file_path.is_file():
-                    if self.destination_root:
-                        self.process_single_file(full_file_path)
-                    else:
-                        self.process_single_file(full_file_path)
-                    self.processed_files += 1
-                    if self.total_files > 0:
-                        percent_complete = int((self.processed_files / self.total_files) * 100)
-                        self.progress_signal.emit(min(percent_complete, 99))
+                    break
+                files.extend(Path(root) / name for name in names)
+        else:
+            base_folder = None
+            files = [folder_path / name for name in os.listdir(folder_path) if (folder_path / name).is_file()]
+        
+        def handler(file_path):
+            self.process_single_file(file_path, base_folder=base_folder)
+        
+        if not self._process_files(files, handler):
+            self.log("WARNING", "您已经取消了当前文件夹的处理")
+    
+    def _process_files(self, files, handler):
+        # 读取元数据和复制移动在后台线程并发进行，同一设备上的并发数由 I/O 调节器按实测吞吐调整
+        results = self._io_pool.map(files, handler, self._io_pool.path_device, file_size_or_zero,
+                                    stop_check=lambda: self._stop_flag)
+        for file_path, _, error in results:
+            if error is not None:
+                self.log("ERROR", f"处理文件 {file_path} 时出错: {str(error)}")
+                with self._lock:
+                    self.fail_count += 1
+            self.processed_files += 1
+            if self.total_files > 0:
+                percent_complete = int((self.processed_files / self.total_files) * 100)
+                self.progress_signal.emit(min(percent_complete, 99))
+        return not self._stop_flag
+    
+    def _target_lock(self, target_path):
+        with self._lock:
+            return self._target_locks.setdefault(target_path, threading.Lock())
 
 
     def _truncate_filename(self, filename, max_length=50):
@@ -223,40 +232,39 @@ class SmartArrangeThread(QtCore.QThread):
     def organize_without_classification(self, folder_path):
         folder_path = Path(folder_path)
         
-        for root, dirs, files in os.walk(folder_path):
+        files = []
+        for root, dirs, names in os.walk(folder_path):
             if self._stop_flag:
-                self.log("WARNING", "文件提取操作被用户中断")
                 break
-            
-            for file in files:
-                if self._stop_flag:
-                    self.log("WARNING", "您已经取消了文件提取操作")
-                    break
-                
-                file_path = Path(root) / file
-                
+            files.extend(Path(root) / name for name in names)
+        
+        if not self._process_files(files, lambda file_path: self._extract_file(file_path, folder_path)):
+            self.log("WARNING", "您已经取消了文件提取操作")
+    
+    def _extract_file(self, file_path, folder_path):
+        if self.destination_root:
+            target_path = Path(self.destination_root) / file_path.name
+        else:
+            target_path = folder_path / file_path.name
+        
+        if file_path == target_path:
+            return
+        
+        # 同名文件提取到同一位置时后到的覆盖先到的，并发时逐个进行，避免两个写入交错
+        try:
+            with self._target_lock(target_path):
                 if self.destination_root:
-                    target_path = Path(self.destination_root) / file_path.name
+                    shutil.copy2(file_path, target_path)
                 else:
-                    target_path = folder_path / file_path.name
-                
-                if file_path != target_path:
-                    try:
-                        if self.destination_root:
-                            shutil.copy2(file_path, target_path)
-                        else:
-                            shutil.move(file_path, target_path)
-                        
-                        self.success_count += 1
-                        
-                        self.processed_files += 1
-                        if self.total_files > 0:
-                            percent_complete = int((self.processed_files / self.total_files) * 100)
-                            self.progress_signal.emit(min(percent_complete, 99))
-                    except Exception as e:
-                        filename = os.path.basename(file_path)
-                        self.log("ERROR", f"处理文件时出错: {filename}, 错误: {str(e)}")
-                        self.fail_count += 1
+                    shutil.move(file_path, target_path)
+            
+            with self._lock:
+                self.success_count += 1
+        except Exception as e:
+            filename = os.path.basename(file_path)
+            self.log("ERROR", f"处理文件时出错: {filename}, 错误: {str(e)}")
+            with self._lock:
+                self.fail_count += 1
 
     def delete_empty_folders(self):
         deleted_count = 0
@@ -1372,9 +1380,12 @@ class SmartArrangeThread(QtCore.QThread):
             counter = 1
             unique_path = full_target_path
             
-            while unique_path.exists():
-                unique_path = full_target_path.parent / f"{base_name}_{counter}{ext}"
-                counter += 1
+            # 多个文件同时整理时，目标名在复制完成前先占住，避免两个文件选中同一个名字
+            with self._lock:
+                while unique_path.exists() or unique_path in self._reserved_paths:
+                    unique_path = full_target_path.parent / f"{base_name}_{counter}{ext}"
+                    counter += 1
+                self._reserved_paths.add(unique_path)
             
             try:
                 old_name = os.path.basename(file_path)
@@ -1387,16 +1398,19 @@ class SmartArrangeThread(QtCore.QThread):
                 else:
                     shutil.move(file_path, unique_path)
                 
-                self.success_count += 1
+                with self._lock:
+                    self.success_count += 1
                 
             except Exception as e:
                 filename = os.path.basename(file_path)
                 self.log("ERROR", f"处理文件时出错: {filename}, 错误: {str(e)}")
-                self.fail_count += 1
+                with self._lock:
+                    self.fail_count += 1
             
         except Exception as e:
             self.log("ERROR", f"处理文件 {file_path} 时出错: {str(e)}")
-            self.fail_count += 1
+            with self._lock:
+                self.fail_count += 1
 
     def get_file_name_part(self, tag, file_path, file_time, original_name, exif_data=None):
         if isinstance(tag, dict) and 'tag' in tag and 'content' in tag:
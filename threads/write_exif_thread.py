@@ -11,6 +11,7 @@ from PIL import Image, PngImagePlugin
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from core.common import get_resource_path, get_current_time_str, RAW_EXTENSIONS, EXIF_IMAGE_EXTENSIONS, EXIF_VIDEO_EXTENSIONS
+from core.io_limits import AdaptiveIOPool, file_size_or_zero
 
 logger = logging.getLogger(__name__)
 
@@ -75,8 +76,12 @@ class WriteExifThread(QThread):
         self.target_folder = target_folder or os.path.expanduser("~/Desktop/Processed_Images")
         self.lat, self.lon = None, None
         
-        self._requires_exiftool_lens_update = False
-        self._exiftool_lens_data = {}
+        # 镜头信息只取决于配置，所有文件共用；多个文件并发处理时不能在处理过程中改写
+        lens_brand = self.exif_config.get('lens_brand')
+        lens_model = self.exif_config.get('lens_model')
+        self._requires_exiftool_lens_update = bool(lens_brand or lens_model)
+        self._exiftool_lens_data = {'lens_brand': lens_brand, 'lens_model': lens_model}
+        self._io_pool = AdaptiveIOPool("写入EXIF", min(16, (os.cpu_count() or 2) * 2), thread_name_prefix='exif')
         
         position = self.exif_config.get('position', '')
         if position and ',' in position:
@@ -136,20 +141,19 @@ class WriteExifThread(QThread):
         
         processed_count = 0
         
-        for path in valid_paths:
-            if self.isInterruptionRequested():
-                break
-                
-            try:
-                result = self.process_image(path)
+        # 多个文件并发处理，同一设备上的并发数由 I/O 调节器按实测吞吐调整
+        results = self._io_pool.map(valid_paths, self.process_image, self._io_pool.path_device, file_size_or_zero,
+                                    stop_check=self.isInterruptionRequested)
+        for path, result, error in results:
+            if error is None:
                 if result == 'success':
                     success_count += 1
                 elif result == 'skipped':
                     error_count += 1
                 elif result == 'failed':
                     error_count += 1
-            except (IOError, ValueError, TypeError, TimeoutError) as e:
-                self.log("ERROR", f"处理文件 {os.path.basename(path)} 时出错: {str(e)}")
+            else:
+                self.log("ERROR", f"处理文件 {os.path.basename(path)} 时出错: {str(error)}")
                 error_count += 1
             
             processed_count += 1
@@ -269,8 +273,7 @@ class WriteExifThread(QThread):
             target_path = self._get_target_path(source_path)
             target_dir = os.path.dirname(target_path)
             
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
+            os.makedirs(target_dir, exist_ok=True)
             
             shutil.copy2(source_path, target_path)
             return target_path
@@ -320,9 +323,6 @@ class WriteExifThread(QThread):
             if not self._check_exif_support(image_path):
                 logger.warning("EXIF check failed, attempting to continue processing")
             
-            self._requires_exiftool_lens_update = False
-            self._exiftool_lens_data = {}
-            
             self._update_basic_fields(exif_dict, updated_fields)
             
             self._update_special_fields(exif_dict, image_path, updated_fields)
@@ -385,12 +385,6 @@ class WriteExifThread(QThread):
                 exif_dict["Exif"][piexif.ExifIFD.LensModel] = lens_model.encode('utf-8')
                 updated_fields.append(f"镜头型号: {lens_model}")
             
-            self._requires_exiftool_lens_update = True
-            self._exiftool_lens_data = {
-                'lens_brand': lens_brand,
-                'lens_model': lens_model
-            }
-            
         except Exception as e:
             logger.error(f"Failed to write basic lens information: {str(e)}")
             self.log("ERROR", f"Failed to write lens information: {str(e)}")
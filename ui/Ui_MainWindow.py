@@ -2846,8 +2846,8 @@ class Ui_MainWindow(object):
         self.deduplicationViewerContentLayout.setContentsMargins(0, 0, 0, 0)
         self.deduplicationViewerContentLayout.setSpacing(0)
         self.deduplicationViewerContentLayout.setObjectName("deduplicationViewerContentLayout")
-        self.duplicateItemsListWidget = QtWidgets.QListWidget(parent=self.deduplicationViewerFrame)
-        self.duplicateItemsListWidget.setStyleSheet("QListWidget {\n"
+        self.duplicateGroupsListView = QtWidgets.QListView(parent=self.deduplicationViewerFrame)
+        self.duplicateGroupsListView.setStyleSheet("QListView {\n"
                                                     "    background-color: rgba(255, 255, 255, 0.8);\n"
                                                     "    border: none;\n"
                                                     "    border-radius: 2px;\n"
@@ -2855,7 +2855,7 @@ class Ui_MainWindow(object):
                                                     "    font-family: \'Microsoft YaHei UI Light\';\n"
                                                     "}\n"
                                                     "\n"
-                                                    "QListWidget::item {\n"
+                                                    "QListView::item {\n"
                                                     "    background-color: transparent;\n"
                                                     "    padding: 8px 12px;\n"
                                                     "    margin: 2px 4px;\n"
@@ -2866,13 +2866,13 @@ class Ui_MainWindow(object):
                                                     "    transition: all 0.2s ease;\n"
                                                     "}\n"
                                                     "\n"
-                                                    "QListWidget::item:hover {\n"
+                                                    "QListView::item:hover {\n"
                                                     "    background-color: #f3f4f6;\n"
                                                     "    border-color: #e5e7eb;\n"
                                                     "    box-shadow: 0 2px 6px rgba(0, 0, 0, 0.05);\n"
                                                     "}\n"
                                                     "\n"
-                                                    "QListWidget::item:selected {\n"
+                                                    "QListView::item:selected {\n"
                                                     "    background: qlineargradient(\n"
                                                     "        spread:pad, x1:0, y1:0, x2:1, y2:0,\n"
                                                     "        stop:0 rgba(139, 92, 246, 0.15),\n"
@@ -2901,8 +2901,8 @@ class Ui_MainWindow(object):
                                                     "QScrollBar::handle:vertical:hover {\n"
                                                     "    background: #94a3b8;\n"
                                                     "}")
-        self.duplicateItemsListWidget.setObjectName("duplicateItemsListWidget")
-        self.deduplicationViewerContentLayout.addWidget(self.duplicateItemsListWidget)
+        self.duplicateGroupsListView.setObjectName("duplicateGroupsListView")
+        self.deduplicationViewerContentLayout.addWidget(self.duplicateGroupsListView)
         self.deduplicationViewerLayout.addWidget(self.deduplicationViewerFrame)
         self.deduplicationViewerLayout.setStretch(1, 3)
         self.deduplicationLayout.addWidget(self.deduplicationViewerWidget)
@@ -2914,8 +2914,8 @@ class Ui_MainWindow(object):
         self.deduplicationLayout.addWidget(self.verticalDividerDeduplication)
         self.deduplicationTableLayout = QtWidgets.QVBoxLayout()
         self.deduplicationTableLayout.setObjectName("deduplicationTableLayout")
-        self.duplicateFilesTableWidget = QtWidgets.QTableWidget(parent=self.deduplicationPage)
-        self.duplicateFilesTableWidget.setStyleSheet("QTableWidget {\n"
+        self.duplicateFilesTableView = QtWidgets.QTableView(parent=self.deduplicationPage)
+        self.duplicateFilesTableView.setStyleSheet("QTableView {\n"
                                                      "    background-color: rgba(255, 255, 255, 0.95);\n"
                                                      "    border: none;\n"
                                                      "    border-radius: 0px;\n"
@@ -2925,7 +2925,7 @@ class Ui_MainWindow(object):
                                                      "    font-weight: 300;\n"
                                                      "}\n"
                                                      "\n"
-                                                     "QTableWidget::item {\n"
+                                                     "QTableView::item {\n"
                                                      "    padding: 4px 8px;\n"
                                                      "    border: none;\n"
                                                      "    color: #374151;\n"
@@ -2971,10 +2971,8 @@ class Ui_MainWindow(object):
                                                      "QScrollBar::handle:horizontal:hover {\n"
                                                      "    background: #94a3b8;\n"
                                                      "}")
-        self.duplicateFilesTableWidget.setObjectName("duplicateFilesTableWidget")
-        self.duplicateFilesTableWidget.setColumnCount(0)
-        self.duplicateFilesTableWidget.setRowCount(0)
-        self.deduplicationTableLayout.addWidget(self.duplicateFilesTableWidget)
+        self.duplicateFilesTableView.setObjectName("duplicateFilesTableView")
+        self.deduplicationTableLayout.addWidget(self.duplicateFilesTableView)
         self.deduplicationActionsLayout = QtWidgets.QHBoxLayout()
         self.deduplicationActionsLayout.setContentsMargins(-1, 0, -1, -1)
         self.deduplicationActionsLayout.setObjectName("deduplicationActionsLayout")